@@ -1,8 +1,26 @@
 # IN SPACE FURNITURE - COMPLETE WORKING APP
 import streamlit as st
-import time
+import uuid
 from datetime import datetime
 
+from cutting import leftover_boards, recovered_boards, species_of
+from designs import all_compositions
+from flow import InvalidTransition, advance
+from inventory import ReclaimedInventory, Stock, StockTaken
+from jobs import FAILED, PENDING, RUNNING, JobExecutor, JobQueueFull, ai_analyze_damage
+from layout import EXISTING_FURNITURE, layout_image, plan_layout, walking_verdict
+from lineage import LineageStore
+from locations import load_location_index, recommend_wood
+from memo import RESULTS
+from metrics import Metrics
+from orders import CONFIRMED, FAILED as ORDER_FAILED, QUEUED, UNKNOWN as ORDER_UNKNOWN, OrderIntake
+from photos import PhotoStore
+from preview import LIGHTING_ORDER, ORBIT_STEP, PERSPECTIVE, TOP_DOWN, FrameCache, Scene, preview_frame, spot_count
+from pricing import OTHER, price_matrix, quote
+from refresh import full_reload, live_refresh
+from risk import RiskHistory, RiskTable
+from session import AppState, SessionSpill, SessionStore
+
 # ========== PAGE CONFIG ==========
 st.set_page_config(
     page_title="IN SPACE FURNITURE",
@@ -46,492 +64,852 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# ========== SHARED RESOURCES ==========
+@st.cache_resource
+def run_metrics():
+    # Off unless INSPACE_METRICS / INSPACE_METRICS_PORT / INSPACE_PROFILE is set
+    metrics = Metrics.from_env()
+    metrics.register("results", RESULTS.stats)
+    return metrics
+
+@st.cache_resource
+def location_index():
+    # Built once per process and shared by every session
+    return load_location_index()
+
+@st.cache_resource
+def risk_table():
+    # Rolling location risk; new history is folded in in the background
+    return RiskTable(RiskHistory()).watch(every=60)
+
+@st.cache_resource
+def design_compositions():
+    # All 256 Step 4 selections, composed once per process
+    return all_compositions()
+
+@st.cache_resource
+def job_executor():
+    # One bounded pool per process for the AI damage analysis in step 7
+    return JobExecutor(max_workers=4, max_pending=32, on_finish=run_metrics().observe_ai)
+
+@st.cache_resource
+def lineage_store():
+    # Wood lineage outlives sessions; one writer thread per process
+    return LineageStore()
+
+@st.cache_resource
+def reclaimed_inventory():
+    # Boards left over from Step 8, offered to Step 6 orders nearby
+    inventory = ReclaimedInventory()
+    run_metrics().register("reclaimed", inventory.stats)
+    return inventory
+
+@st.cache_resource
+def order_intake():
+    # Orders are confirmed once on disk; one writer and one fulfilment thread per process
+    intake = OrderIntake()
+    run_metrics().register("orders", intake.stats)
+    return intake
+
+@st.cache_resource
+def photo_store():
+    # Step 7 photos on disk by content hash; thumbnails and analysis copies made in the background
+    store = PhotoStore()
+    run_metrics().register("photos", store.stats)
+    return store
+
+@st.cache_resource
+def frame_cache():
+    # Rendered AR previews, shared so popular rooms are only drawn once
+    cache = FrameCache(max_bytes=32 * 1024 * 1024)
+    run_metrics().register("frame_cache", cache.stats)
+    return cache
+
+@st.cache_resource
+def session_spill():
+    # Idle sessions are moved to disk until their customer comes back
+    spill = SessionSpill(idle_after=600, store=session_store())
+    run_metrics().register("sessions", spill.stats)
+    return spill
+
+@st.cache_resource
+def session_store():
+    # Every journey in a store all workers share, so it survives restarts
+    # and can continue on any worker; None with INSPACE_SESSION_STORE=off
+    store = SessionStore.from_env()
+    if store is not None:
+        run_metrics().register("session_store", store.stats)
+    return store
+
+def current_piece():
+    # The lineage node for the furniture this customer owns right now
+    if not st.session_state.app_state.get('piece_id'):
+        st.session_state.app_state['piece_id'] = lineage_store().add_piece(
+            st.session_state.app_state['selected_product'],
+            st.session_state.app_state['recommended_wood']
+        )
+    return st.session_state.app_state['piece_id']
+
 # ========== SESSION STATE ==========
+# Keyed widgets and the field each one edits, with its first value for a
+# new journey. Streamlit counts a widget's default in its identity, so the
+# value is seeded into the key rather than passed in as the default.
+WIDGET_FIELDS = {
+    'city_input': ('user_location', "Chennai"),
+    'room_width_input': ('room_width', None),
+    'room_length_input': ('room_length', None),
+    'existing_input': ('existing_furniture', None),
+}
+
+def seed_widgets():
+    # Widgets start from the journey when it is restored; one that was not
+    # drawn last run has lost its state and starts from the journey again
+    for key, (field, first) in WIDGET_FIELDS.items():
+        if key not in st.session_state:
+            value = st.session_state.app_state[field]
+            value = first if value is None else value
+            # A copy, so the widget never edits the journey's own list
+            st.session_state[key] = list(value) if isinstance(value, list) else value
+
 if 'app_state' not in st.session_state:
-    st.session_state.app_state = {
-        'current_step': 1,
-        'selected_product': None,
-        'user_location': None,
-        'recommended_wood': None,
-        'room_width': 15,
-        'room_length': 12,
-        'selected_designs': [],
-        'ai_transformation': None,
-        'order_placed': False,
-        'damage_percentage': 0,
-        'good_wood_left': 0,
-        'product_history': [],
-        'current_design': None
-    }
+    # The session id travels in the URL, so a reconnect to a new or restarted
+    # worker finds the journey in the shared store
+    session_id = st.experimental_get_query_params().get('session', [None])[0]
+    restored = session_store().load(session_id) if session_store() is not None else None
+    st.session_state.app_state = restored or AppState(session_id=uuid.uuid4().hex)
+    st.experimental_set_query_params(session=st.session_state.app_state.session_id)
+    st.session_state.setdefault('rerun_trigger', "first_load")
+session_spill().touch(st.session_state.app_state)
+seed_widgets()
 
-# ========== SIDEBAR ==========
-with st.sidebar:
-    st.markdown("# 🪑 IN SPACE")
-    st.markdown("**Furniture That Lives Forever**")
-    st.markdown("---")
+# ========== BACKGROUND JOBS ==========
+JOB_KEYS = ('damage_job',)
+
+def jobs_in_flight():
+    return any(st.session_state.app_state.get(key) for key in JOB_KEYS) or order_pending()
+
+def order_pending():
+    key = st.session_state.app_state['order_key']
+    return bool(key) and not st.session_state.app_state['order_placed'] and order_intake().status(key) == QUEUED
+
+def submit_job(key, kind, fn, *args):
+    try:
+        st.session_state.app_state[key] = job_executor().submit(
+            kind, fn, *args, session_id=st.session_state.app_state['session_id']
+        )
+        return True
+    except JobQueueFull:
+        st.warning("⏳ **AI is busy right now** - please try again in a moment")
+        return False
+
+def collect_job(key):
+    # Merge a finished job's result into app_state; None if nothing was submitted
+    job_id = st.session_state.app_state.get(key)
+    if not job_id:
+        return None
+    status = job_executor().poll(job_id)
+    if status.state not in (PENDING, RUNNING):
+        st.session_state.app_state[key] = None
+        job_executor().forget(job_id)
+        if status.result:
+            st.session_state.app_state.update(status.result)
+    return status
+
+# ========== NAVIGATION ==========
+# Buttons act through on_click callbacks, which Streamlit runs before the
+# script: one click is one script run, already showing the new state.
+def triggered_by(name):
+    st.session_state.rerun_trigger = name
+
+def go(action, **updates):
+    # `updates` are written only if the move is allowed
+    triggered_by(action)
+    try:
+        advance(st.session_state.app_state, action, updates)
+    except InvalidTransition as ex:
+        st.warning(f"⚠️ {ex}")
+
+def set_state(**updates):
+    triggered_by("set_" + "_".join(updates))
+    st.session_state.app_state.update(updates)
+
+def sync_widget(key):
+    field = WIDGET_FIELDS[key][0]
+    triggered_by("set_" + field)
+    value = st.session_state[key]
+    st.session_state.app_state[field] = list(value) if isinstance(value, list) else value
+
+def release_reclaimed():
+    # Boards claimed for an order that never reached disk go back into stock
+    reclaimed = st.session_state.app_state['order_reclaimed']
+    st.session_state.app_state['order_reclaimed'] = None
+    if reclaimed:
+        reclaimed_inventory().insert([board for board in reclaimed.boards if isinstance(board, Stock)])
+
+def reset_app():
+    job_executor().cancel_session(st.session_state.app_state['session_id'])
+    if (st.session_state.app_state['order_key'] and not st.session_state.app_state['order_placed']
+            and order_intake().status(st.session_state.app_state['order_key']) in (ORDER_FAILED, ORDER_UNKNOWN)):
+        release_reclaimed()
+    if session_store() is not None:
+        session_store().forget(st.session_state.app_state['session_id'])
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    triggered_by("reset_app")
+
+def add_design(name):
+    triggered_by("add_design")
+    if name not in st.session_state.app_state['selected_designs']:
+        st.session_state.app_state['selected_designs'].append(name)
+        st.session_state.app_state['ai_transformation'] = None
+
+def apply_design():
+    triggered_by("apply_design")
+    with run_metrics().ai_call("design"):
+        composition = design_compositions()[frozenset(st.session_state.app_state['selected_designs'])]
+    st.session_state.app_state['ai_transformation'] = True
+    st.session_state.app_state['current_design'] = composition.title
+
+def place_order(total, reclaimed=None):
+    # The order key is made once per order, so a double click or a rerun
+    # can never place it twice; a failed save starts over with a new one
+    triggered_by("place_order")
+    if not st.session_state.app_state['order_key']:
+        if reclaimed:
+            try:
+                reclaimed_inventory().take(board.board_id for board in reclaimed.boards)
+            except StockTaken:
+                st.warning("♻️ That reclaimed wood was just taken by another order - please check the new price")
+                return
+            st.session_state.app_state['order_reclaimed'] = reclaimed
+        st.session_state.app_state['order_total'] = total
+        st.session_state.app_state['order_key'] = uuid.uuid4().hex
+    reclaimed = st.session_state.app_state['order_reclaimed']
+    order_intake().submit(st.session_state.app_state['order_key'], {
+        'session_id': st.session_state.app_state['session_id'],
+        'product': st.session_state.app_state['selected_product'],
+        'wood': st.session_state.app_state['recommended_wood'],
+        'design': st.session_state.app_state.get('current_design'),
+        'total': st.session_state.app_state['order_total'],
+        'reclaimed': reclaimed._replace(boards=[board.board_id for board in reclaimed.boards])._asdict()
+                     if reclaimed else None,
+    })
+
+def collect_order():
+    # Marks the order placed once it is on disk; the order status if one was submitted
+    if not st.session_state.app_state['order_key'] or st.session_state.app_state['order_placed']:
+        return None
+    status = order_intake().status(st.session_state.app_state['order_key'])
+    if status in (ORDER_FAILED, ORDER_UNKNOWN):
+        # Nothing was saved (FAILED is reported once, then it is UNKNOWN):
+        # free the boards and start the next attempt afresh
+        release_reclaimed()
+        st.session_state.app_state['order_key'] = None
+    elif status == CONFIRMED:
+        st.session_state.app_state['order_placed'] = True
+        st.session_state.app_state['order_date'] = datetime.now().strftime("%Y-%m-%d")
+        st.session_state.app_state['piece_id'] = None
+        current_piece()
+        st.balloons()
+    return status
+
+def analyze_damage():
+    triggered_by("analyze_damage")
+    submit_job('damage_job', "damage", ai_analyze_damage, photo_store(),
+               dict(st.session_state.app_state['damage_photos']),
+               st.session_state.app_state['selected_product'],
+               st.session_state.app_state['recommended_wood'])
+
+def request_reload():
+    # The reload itself is a component, so it is drawn by the run this click starts
+    triggered_by("full_reload")
+    st.session_state.reload_requested = True
+
+def store_photo(angle, key):
+    # Uploads go to the photo store as they arrive; the session keeps the hash
+    triggered_by("store_photo")
+    image = st.session_state.get(key)
+    if image is not None:
+        st.session_state.app_state['damage_photos'][angle] = photo_store().put(image)
+
+def show_photos(photos, width):
+    thumbs = [(photo_store().thumbnail(digest), angle) for angle, digest in photos.items()]
+    thumbs = [(path, angle) for path, angle in thumbs if path]
+    if thumbs:
+        st.image([path for path, _ in thumbs], caption=[angle for _, angle in thumbs], width=width)
+
+def create_product(new_product):
+    # Record every new piece in the lineage store; the customer keeps the first
+    triggered_by("create_product")
+    good_wood = st.session_state.app_state['good_wood_left']
+    old_product = st.session_state.app_state['selected_product']
+    plan = st.session_state.app_state['reuse_plans'].get(new_product, [new_product])
+    parent_id = current_piece()
+    design = f"Adapted {st.session_state.app_state.get('current_design') or 'original'} design"
+    for extra in plan[1:]:
+        lineage_store().add_transition(parent_id, extra, good_wood, design, wait=False)
+    st.session_state.app_state['piece_id'] = lineage_store().add_transition(
+        parent_id, plan[0], good_wood, design
+    )
+    # Whatever the new products do not need goes into reclaimed stock
+    coords = location_index().coords(st.session_state.app_state['user_location'])
+    if coords:
+        wood = st.session_state.app_state['recommended_wood']
+        boards = leftover_boards(recovered_boards(old_product, good_wood, wood), plan)
+        reclaimed_inventory().add(boards, good_wood, *coords, source=parent_id)
+    st.session_state.app_state['selected_product'] = plan[0]
+    st.session_state.app_state['last_created'] = (old_product, new_product)
+    st.balloons()
+
+# Callbacks name the button that caused this run; anything else is a widget
+rerun = run_metrics().start_rerun(st.session_state.app_state.session_id,
+                                  st.session_state.pop('rerun_trigger', "widget"))
+# A run cut short by a newer one (RerunException) or st.stop() is still
+# saved and recorded, and its profile stopped
+try:
+    # ========== SIDEBAR ==========
+    with st.sidebar:
+        st.markdown("# 🪑 IN SPACE")
+        st.markdown("**Furniture That Lives Forever**")
+        st.markdown("---")
+    
+        # Progress tracker
+        progress = st.session_state.app_state['current_step'] / 8
+        st.progress(progress)
+        st.caption(f"Step {st.session_state.app_state['current_step']} of 8")
+    
+        st.markdown("---")
+    
+        # Navigation buttons
+        st.button("🏠 **RESET APP**", use_container_width=True, on_click=reset_app)
+    
+        st.button("🔁 **RELOAD PAGE**", use_container_width=True, on_click=request_reload)
+        if st.session_state.pop('reload_requested', False):
+            full_reload()
+    
+        st.markdown("---")
+        results = RESULTS.stats()
+        st.caption(f"**Shared results:** {results['hit_rate']:.0%} hits, {results['entries']} cached")
+        st.caption("**Status:** ✅ All features working")
+        st.caption("**Deployment:** Streamlit Cloud")
+
+    # ========== MAIN APP ==========
+    st.markdown('<div class="main-header">IN SPACE FURNITURE</div>', unsafe_allow_html=True)
+    st.markdown('<div style="text-align: center; font-size: 1.2rem; color: #666; margin-bottom: 2rem;">One Wood → Multiple Products → Until Wood Dies</div>', unsafe_allow_html=True)
+
+    rerun.block(st.session_state.app_state['current_step'])
+
+    # ========== STEP 1: PRODUCT SELECTION ==========
+    if st.session_state.app_state['current_step'] == 1:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown("## 📱 **STEP 1: CHOOSE YOUR PRODUCT**")
     
-    # Progress tracker
-    progress = st.session_state.app_state['current_step'] / 8
-    st.progress(progress)
-    st.caption(f"Step {st.session_state.app_state['current_step']} of 8")
+        col1, col2, col3, col4 = st.columns(4)
     
-    st.markdown("---")
+        with col1:
+            st.button("**🛋️ SOFA**", use_container_width=True,
+                      on_click=go, args=("choose_product",), kwargs={'selected_product': "Sofa"})
+    
+        with col2:
+            st.button("**🪑 CHAIR**", use_container_width=True,
+                      on_click=go, args=("choose_product",), kwargs={'selected_product': "Chair"})
     
-    # Navigation buttons
-    if st.button("🏠 **RESET APP**", use_container_width=True):
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        st.rerun()
+        with col3:
+            st.button("**🛏️ BED**", use_container_width=True,
+                      on_click=go, args=("choose_product",), kwargs={'selected_product': "Bed"})
     
-    st.markdown("---")
-    st.caption("**Status:** ✅ All features working")
-    st.caption("**Deployment:** Streamlit Cloud")
-
-# ========== MAIN APP ==========
-st.markdown('<div class="main-header">IN SPACE FURNITURE</div>', unsafe_allow_html=True)
-st.markdown('<div style="text-align: center; font-size: 1.2rem; color: #666; margin-bottom: 2rem;">One Wood → Multiple Products → Until Wood Dies</div>', unsafe_allow_html=True)
-
-# ========== STEP 1: PRODUCT SELECTION ==========
-if st.session_state.app_state['current_step'] == 1:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown("## 📱 **STEP 1: CHOOSE YOUR PRODUCT**")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        if st.button("**🛋️ SOFA**", use_container_width=True):
-            st.session_state.app_state['selected_product'] = "Sofa"
-            st.session_state.app_state['current_step'] = 2
-            st.rerun()
-    
-    with col2:
-        if st.button("**🪑 CHAIR**", use_container_width=True):
-            st.session_state.app_state['selected_product'] = "Chair"
-            st.session_state.app_state['current_step'] = 2
-            st.rerun()
-    
-    with col3:
-        if st.button("**🛏️ BED**", use_container_width=True):
-            st.session_state.app_state['selected_product'] = "Bed"
-            st.session_state.app_state['current_step'] = 2
-            st.rerun()
-    
-    with col4:
-        if st.button("**🗄️ TABLE**", use_container_width=True):
-            st.session_state.app_state['selected_product'] = "Table"
-            st.session_state.app_state['current_step'] = 2
-            st.rerun()
-    
-    st.markdown("</div>", unsafe_allow_html=True)
-
-# ========== STEP 2: LOCATION ANALYSIS ==========
-elif st.session_state.app_state['current_step'] == 2:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown(f"## 📍 **STEP 2: LOCATION ANALYSIS FOR {st.session_state.app_state['selected_product'].upper()}**")
-    
-    st.write("**App checks your location's history for:**")
-    st.write("- 🐛 Bed bug reports")
-    st.write("- 💧 Humidity levels")
-    st.write("- 🐜 Termite history")
-    st.write("- 🌡️ Temperature extremes")
-    
-    location = st.text_input("**Enter your city:**", "Chennai")
-    
-    if location:
-        # Location-based recommendations
-        location_data = {
-            "chennai": {"issues": ["High humidity (78%)", "Termite common"], "wood": "**Treated Teak**", "reason": "Water-resistant, termite-proof"},
-            "mumbai": {"issues": ["Bed bugs reported", "High humidity"], "wood": "**Bug-resistant Teak**", "reason": "Special coating prevents bugs"},
-            "delhi": {"issues": ["Dry conditions", "Termites"], "wood": "**Termite-proof Mango**", "reason": "Dense wood, natural resistance"},
-            "bangalore": {"issues": ["Moderate humidity"], "wood": "**Mango Wood**", "reason": "Sustainable, beautiful grain"}
-        }
+        with col4:
+            st.button("**🗄️ TABLE**", use_container_width=True,
+                      on_click=go, args=("choose_product",), kwargs={'selected_product': "Table"})
+    
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # ========== STEP 2: LOCATION ANALYSIS ==========
+    elif st.session_state.app_state['current_step'] == 2:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown(f"## 📍 **STEP 2: LOCATION ANALYSIS FOR {st.session_state.app_state['selected_product'].upper()}**")
+    
+        st.write("**App checks your location's history for:**")
+        st.write("- 🐛 Bed bug reports")
+        st.write("- 💧 Humidity levels")
+        st.write("- 🐜 Termite history")
+        st.write("- 🌡️ Temperature extremes")
+    
+        location = st.text_input("**Enter your city:**", key='city_input',
+                                 on_change=sync_widget, args=('city_input',))
+    
+        if location:
+            # Location-based recommendations
+            city, wood, match = recommend_wood(location_index(), location, risk_table())
+            st.session_state.app_state['user_location'] = city
+            st.session_state.app_state['recommended_wood'] = wood
         
-        loc_key = location.lower()
-        if loc_key in location_data:
-            data = location_data[loc_key]
-            st.session_state.app_state['user_location'] = location
-            st.session_state.app_state['recommended_wood'] = data['wood']
+            if match and match.profile:
+                data = match.profile
             
-            st.success(f"### 🌍 **LOCATION:** {location.upper()}")
-            st.warning(f"**Past issues found:** {', '.join(data['issues'])}")
-            st.info(f"### 🪵 **RECOMMENDED WOOD:** {data['wood']}")
-            st.write(f"**Why:** {data['reason']}")
-        else:
-            st.session_state.app_state['user_location'] = location
-            st.session_state.app_state['recommended_wood'] = "**Mango Wood**"
-            st.info(f"### 🪵 **RECOMMENDED:** Mango Wood (default for new locations)")
+                st.success(f"### 🌍 **LOCATION:** {match.city.upper()}")
+                if match.kind != "exact":
+                    st.caption(f"Showing results for **{match.city}** (you typed \"{location}\")")
+                st.warning(f"**Past issues found:** {', '.join(data['issues'])}")
+                if data.get('scores'):
+                    risk_cols = st.columns(len(data['scores']))
+                    for risk_col, (hazard, score) in zip(risk_cols, data['scores'].items()):
+                        risk_col.metric(f"{hazard.replace('_', ' ').title()} risk", f"{score:.0%}")
+                    st.caption(f"Rolling risk from local history up to {data['as_of']}")
+                st.info(f"### 🪵 **RECOMMENDED WOOD:** {data['wood']}")
+                st.write(f"**Why:** {data['reason']}")
+            else:
+                st.info(f"### 🪵 **RECOMMENDED:** Mango Wood (default for new locations)")
+                # st.text_input only reruns on Enter or when it loses focus, so
+                # these show after the city is submitted, not as it is typed
+                suggestions = location_index().complete(location)
+                if suggestions:
+                    st.caption(f"**Did you mean:** {', '.join(suggestions)}")
         
-        if st.button("**👉 NEXT: SCAN ROOM**", type="primary", use_container_width=True):
-            st.session_state.app_state['current_step'] = 3
-            st.rerun()
+            st.button("**👉 NEXT: SCAN ROOM**", type="primary", use_container_width=True,
+                      on_click=go, args=("scan_room",))
     
-    st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("</div>", unsafe_allow_html=True)
 
-# ========== STEP 3: ROOM SCANNING ==========
-elif st.session_state.app_state['current_step'] == 3:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown(f"## 📏 **STEP 3: SCAN YOUR ROOM FOR {st.session_state.app_state['selected_product'].upper()}**")
+    # ========== STEP 3: ROOM SCANNING ==========
+    elif st.session_state.app_state['current_step'] == 3:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown(f"## 📏 **STEP 3: SCAN YOUR ROOM FOR {st.session_state.app_state['selected_product'].upper()}**")
     
-    st.write("**📱 Camera opens - Point to where furniture should go**")
+        st.write("**📱 Camera opens - Point to where furniture should go**")
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.session_state.app_state['room_width'] = st.slider(
-            "**Room Width (feet):**", 8, 30, 15
-        )
+        with col1:
+            st.slider("**Room Width (feet):**", 8, 30, key='room_width_input',
+                      on_change=sync_widget, args=('room_width_input',))
     
-    with col2:
-        st.session_state.app_state['room_length'] = st.slider(
-            "**Room Length (feet):**", 8, 30, 12
+        with col2:
+            st.slider("**Room Length (feet):**", 8, 30, key='room_length_input',
+                      on_change=sync_widget, args=('room_length_input',))
+    
+        st.multiselect("**Already in the room:**", EXISTING_FURNITURE, key='existing_input',
+                       on_change=sync_widget, args=('existing_input',))
+    
+        # Lay the room out and measure the walking space that is left
+        layout = plan_layout(
+            st.session_state.app_state['room_width'],
+            st.session_state.app_state['room_length'],
+            st.session_state.app_state['selected_product'],
+            tuple(sorted(st.session_state.app_state['existing_furniture']))
         )
+        walking_space = layout.walking_space
+    
+        st.image(layout_image(layout), caption="Top view - new piece in green", width=320)
+        st.metric("**Walking Space Available**", f"{walking_space} feet")
+    
+        for space, spot in layout.options:
+            turn = "turned" if spot.rotated else "lengthwise"
+            st.write(f"• Against the **{spot.wall}** wall, {turn} ({spot.width:g} × {spot.length:g} ft): {space} ft to walk")
+        if layout.unplaced:
+            st.caption(f"No room left for: {', '.join(layout.unplaced)}")
+    
+        verdict = walking_verdict(walking_space)
+        if verdict == "perfect":
+            st.success("✅ **Perfect!** Good walking space maintained")
+        elif verdict == "limited":
+            st.warning("⚠️ **Limited space** - Consider smaller furniture")
+        else:
+            st.error("❌ **Too cramped** - Choose different placement")
     
-    # Calculate walking space
-    furniture_sizes = {"Sofa": 8, "Chair": 2, "Bed": 7, "Table": 4}
-    furniture_size = furniture_sizes.get(st.session_state.app_state['selected_product'], 5)
-    
-    walking_space = min(
-        st.session_state.app_state['room_width'] - furniture_size,
-        st.session_state.app_state['room_length'] - furniture_size
-    )
-    
-    st.metric("**Walking Space Available**", f"{walking_space} feet")
-    
-    if walking_space >= 4:
-        st.success("✅ **Perfect!** Good walking space maintained")
-    elif walking_space >= 2:
-        st.warning("⚠️ **Limited space** - Consider smaller furniture")
-    else:
-        st.error("❌ **Too cramped** - Choose different placement")
-    
-    if st.button("**👉 NEXT: DESIGN YOUR FURNITURE**", type="primary", use_container_width=True):
-        st.session_state.app_state['current_step'] = 4
-        st.rerun()
-    
-    st.markdown("</div>", unsafe_allow_html=True)
-
-# ========== STEP 4: DESIGN STUDIO ==========
-elif st.session_state.app_state['current_step'] == 4:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown(f"## 🎨 **STEP 4: DESIGN YOUR {st.session_state.app_state['selected_product'].upper()}**")
-    
-    st.markdown('<div class="design-preview">', unsafe_allow_html=True)
-    st.markdown(f"### ✨ [EMPTY {st.session_state.app_state['selected_product'].upper()}]")
-    st.markdown("*(Design elements will appear here)*")
-    st.markdown("</div>", unsafe_allow_html=True)
-    
-    st.write("### 🎨 **CHOOSE DESIGN ELEMENTS:**")
-    
-    design_options = [
-        ("🦚", "Peacock"),
-        ("🦁", "Lion"), 
-        ("🌸", "Flowers"),
-        ("🌳", "Tree"),
-        ("✨", "Geometric"),
-        ("🐦", "Birds"),
-        ("🌙", "Moon & Stars"),
-        ("🌊", "Waves")
-    ]
-    
-    # Display design options
-    cols = st.columns(4)
-    selected_designs = []
-    
-    for idx, (icon, name) in enumerate(design_options):
-        col_idx = idx % 4
-        with cols[col_idx]:
-            if st.button(f"{icon} {name}", key=f"design_{idx}", use_container_width=True):
-                if name not in st.session_state.app_state['selected_designs']:
-                    st.session_state.app_state['selected_designs'].append(name)
-                st.rerun()
-    
-    # Show selected designs
-    if st.session_state.app_state['selected_designs']:
-        st.success(f"**Selected:** {', '.join(st.session_state.app_state['selected_designs'])}")
-        
-        # AI Transformation for Peacock + Lion
-        if "Peacock" in st.session_state.app_state['selected_designs'] and "Lion" in st.session_state.app_state['selected_designs']:
-            if st.button("**✨ AI TRANSFORM DESIGN**", type="primary", use_container_width=True):
-                with st.spinner("AI is creating a natural scene..."):
-                    time.sleep(2)
-                    st.session_state.app_state['ai_transformation'] = True
-                    st.session_state.app_state['current_design'] = "Lion under Peacock-Tree"
-                    st.rerun()
-        
-        if st.session_state.app_state.get('ai_transformation'):
-            st.markdown("### 🧠 **AI TRANSFORMATION COMPLETE!**")
-            st.write("**Before:** Peacock + Lion randomly placed")
-            st.write("**After:** 🦁 Lion sitting under 🌳 tree made from peacock feathers")
-            st.write("**Scene:** Peaceful jungle setting with harmonious colors")
-            
-            st.markdown('<div class="design-preview">', unsafe_allow_html=True)
-            st.markdown("### 🏞️ **AI DESIGN PREVIEW**")
-            st.markdown("🦁 Lion resting under tree<br>🌳 Tree from peacock feathers<br>🌸 Harmonious natural scene")
-            st.markdown("</div>", unsafe_allow_html=True)
-    
-    if st.button("**👉 NEXT: AR PREVIEW**", type="primary", use_container_width=True):
-        st.session_state.app_state['current_step'] = 5
-        st.rerun()
+        st.button("**👉 NEXT: DESIGN YOUR FURNITURE**", type="primary", use_container_width=True,
+                  on_click=go, args=("design",))
     
-    st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("</div>", unsafe_allow_html=True)
 
-# ========== STEP 5: AR PREVIEW ==========
-elif st.session_state.app_state['current_step'] == 5:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown("## 👁️ **STEP 5: AR VIRTUAL PREVIEW**")
-    
-    st.write("**📱 Your actual room with furniture in Augmented Reality**")
+    # ========== STEP 4: DESIGN STUDIO ==========
+    elif st.session_state.app_state['current_step'] == 4:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown(f"## 🎨 **STEP 4: DESIGN YOUR {st.session_state.app_state['selected_product'].upper()}**")
     
-    # AR Simulation
-    col1, col2 = st.columns(2)
+        # Every selection was composed at startup; this is a dictionary lookup
+        composition = design_compositions()[frozenset(st.session_state.app_state['selected_designs'])]
     
-    with col1:
-        st.markdown("### **YOUR ROOM**")
-        st.write(f"Size: {st.session_state.app_state['room_width']}×{st.session_state.app_state['room_length']} ft")
-        st.write(f"Location: {st.session_state.app_state['user_location']}")
-        st.write(f"Furniture: {st.session_state.app_state['selected_product']}")
-    
-    with col2:
-        st.markdown("### **AR FEATURES**")
-        st.write("• 🔄 360° rotation")
-        st.write("• 👣 Walk around virtually")
-        st.write("• 🌞 Real lighting simulation")
-        st.write("• 📐 Exact scale (1:1)")
-        st.write("• 🎨 See your design in context")
+        st.markdown('<div class="design-preview">', unsafe_allow_html=True)
+        if composition.names:
+            st.markdown(f"### ✨ {composition.title.upper()}")
+            st.image(composition.svg, use_column_width=True)
+        else:
+            st.markdown(f"### ✨ [EMPTY {st.session_state.app_state['selected_product'].upper()}]")
+            st.markdown("*(Design elements will appear here)*")
+        st.markdown("</div>", unsafe_allow_html=True)
     
-    # AR Controls
-    st.write("### 🎮 **AR CONTROLS**")
-    c1, c2, c3, c4 = st.columns(4)
+        st.write("### 🎨 **CHOOSE DESIGN ELEMENTS:**")
     
-    with c1:
-        if st.button("🔄 Rotate", use_container_width=True):
-            st.info("Rotating furniture 360°")
+        design_options = [
+            ("🦚", "Peacock"),
+            ("🦁", "Lion"), 
+            ("🌸", "Flowers"),
+            ("🌳", "Tree"),
+            ("✨", "Geometric"),
+            ("🐦", "Birds"),
+            ("🌙", "Moon & Stars"),
+            ("🌊", "Waves")
+        ]
     
-    with c2:
-        if st.button("👣 Walk Around", use_container_width=True):
-            st.info("Walking around furniture view")
+        # Display design options
+        cols = st.columns(4)
+        selected_designs = []
     
-    with c3:
-        if st.button("🌞 Change Light", use_container_width=True):
-            st.info("Lighting: Morning → Afternoon → Evening")
+        for idx, (icon, name) in enumerate(design_options):
+            col_idx = idx % 4
+            with cols[col_idx]:
+                st.button(f"{icon} {name}", key=f"design_{idx}", use_container_width=True,
+                          on_click=add_design, args=(name,))
+    
+        # Show selected designs
+        if st.session_state.app_state['selected_designs']:
+            st.success(f"**Selected:** {', '.join(st.session_state.app_state['selected_designs'])}")
+            st.metric("**Design Harmony**", f"{composition.score}/100")
+            for first, second in composition.clashes:
+                st.caption(f"💡 {first} and {second} have little in common - try one or the other")
+        
+            if not st.session_state.app_state.get('ai_transformation'):
+                st.button("**✨ TRANSFORM DESIGN**", type="primary", use_container_width=True, on_click=apply_design)
+        
+            if st.session_state.app_state.get('ai_transformation'):
+                st.markdown("### 🧠 **TRANSFORMATION COMPLETE!**")
+                st.write(f"**Before:** {' + '.join(composition.names)} randomly placed")
+                st.write(f"**After:** {composition.title}")
+                st.write(f"**Scene:** {composition.setting} setting with harmonious colors")
+            
+                st.markdown('<div class="design-preview">', unsafe_allow_html=True)
+                st.markdown("### 🏞️ **DESIGN PREVIEW**")
+                st.markdown("<br>".join(composition.story), unsafe_allow_html=True)
+                st.markdown("</div>", unsafe_allow_html=True)
     
-    with c4:
-        if st.button("📏 Adjust", use_container_width=True):
-            st.info("Adjusting position in room")
+        st.button("**👉 NEXT: AR PREVIEW**", type="primary", use_container_width=True,
+                  on_click=go, args=("preview",))
     
-    st.success("### ✅ **PERFECT FIT CONFIRMED!**")
-    st.write("Furniture fits perfectly with good walking space")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # ========== STEP 5: AR PREVIEW ==========
+    elif st.session_state.app_state['current_step'] == 5:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown("## 👁️ **STEP 5: AR VIRTUAL PREVIEW**")
     
-    if st.button("**👉 NEXT: ORDER**", type="primary", use_container_width=True):
-        st.session_state.app_state['current_step'] = 6
-        st.rerun()
+        st.write("**📱 Your actual room with furniture in Augmented Reality**")
     
-    st.markdown("</div>", unsafe_allow_html=True)
-
-# ========== STEP 6: ORDER ==========
-elif st.session_state.app_state['current_step'] == 6:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown("## 💰 **STEP 6: ORDER & DELIVERY**")
+        # AR Simulation
+        col1, col2 = st.columns(2)
     
-    # Calculate price
-    base_prices = {"Sofa": 800, "Chair": 300, "Bed": 1200, "Table": 500}
-    wood_premium = {"**Treated Teak**": 400, "**Bug-resistant Teak**": 450, "**Termite-proof Mango**": 350, "**Mango Wood**": 300}
-    design_premium = 200 if st.session_state.app_state.get('ai_transformation') else 100
+        with col1:
+            st.markdown("### **YOUR ROOM**")
+            st.write(f"Size: {st.session_state.app_state['room_width']}×{st.session_state.app_state['room_length']} ft")
+            st.write(f"Location: {st.session_state.app_state['user_location']}")
+            st.write(f"Furniture: {st.session_state.app_state['selected_product']}")
     
-    base_price = base_prices.get(st.session_state.app_state['selected_product'], 600)
-    wood_price = wood_premium.get(st.session_state.app_state['recommended_wood'], 300)
+        with col2:
+            st.markdown("### **AR FEATURES**")
+            st.write("• 🔄 360° rotation")
+            st.write("• 👣 Walk around virtually")
+            st.write("• 🌞 Real lighting simulation")
+            st.write("• 📐 Exact scale (1:1)")
+            st.write("• 🎨 See your design in context")
+    
+        # AR Controls - counters wrap like the orbit angle, so the frame cache
+        # sees one key per distinct picture
+        existing = tuple(sorted(st.session_state.app_state['existing_furniture']))
+        spots = spot_count(st.session_state.app_state['room_width'], st.session_state.app_state['room_length'],
+                           st.session_state.app_state['selected_product'], existing)
+        turned = st.session_state.app_state['ar_turned'] % 2
+        spot = st.session_state.app_state['ar_spot'] % spots
+    
+        st.write("### 🎮 **AR CONTROLS**")
+        c1, c2, c3, c4 = st.columns(4)
+    
+        with c1:
+            st.button("🔄 Rotate", use_container_width=True,
+                      on_click=set_state, kwargs={'ar_turned': (turned + 1) % 2})
+    
+        with c2:
+            st.button("👣 Walk Around", use_container_width=True,
+                      on_click=set_state, kwargs={'ar_angle': (st.session_state.app_state['ar_angle'] + ORBIT_STEP) % 360})
+    
+        with c3:
+            light = LIGHTING_ORDER.index(st.session_state.app_state['ar_lighting'])
+            st.button("🌞 Change Light", use_container_width=True,
+                      on_click=set_state, kwargs={'ar_lighting': LIGHTING_ORDER[(light + 1) % len(LIGHTING_ORDER)]})
+    
+        with c4:
+            st.button("📏 Adjust", use_container_width=True,
+                      on_click=set_state, kwargs={'ar_spot': (spot + 1) % spots})
+    
+        scene = Scene(
+            st.session_state.app_state['room_width'],
+            st.session_state.app_state['room_length'],
+            existing,
+            st.session_state.app_state['selected_product'],
+            st.session_state.app_state['recommended_wood'],
+            tuple(sorted(st.session_state.app_state['selected_designs'])),
+            PERSPECTIVE,
+            st.session_state.app_state['ar_angle'],
+            st.session_state.app_state['ar_lighting'],
+            turned,
+            spot
+        )
+        v1, v2 = st.columns(2)
+        with v1:
+            st.image(preview_frame(frame_cache(), scene), caption=f"{st.session_state.app_state['ar_lighting']} light", use_column_width=True)
+        with v2:
+            st.image(preview_frame(frame_cache(), scene._replace(view=TOP_DOWN, angle=0)), caption="From above", use_column_width=True)
     
-    total = base_price + wood_price + design_premium + 150  # Circular service
+        stats = frame_cache().stats()
+        st.caption(f"Preview cache: {stats['hit_rate']:.0%} hits, {stats['frames']} frames, {stats['bytes'] / 1024:.0f} KB")
     
-    st.markdown("### 📦 **ORDER SUMMARY**")
+        st.success("### ✅ **PERFECT FIT CONFIRMED!**")
+        st.write("Furniture fits perfectly with good walking space")
     
-    order_items = [
-        [f"Custom {st.session_state.app_state['selected_product']}", f"${base_price}"],
-        [f"Wood: {st.session_state.app_state['recommended_wood']}", f"${wood_price}"],
-        ["AI Design Transformation", f"${design_premium}"],
-        ["Circular Service Package", "$150"],
-        ["**TOTAL**", f"**${total}**"]
-    ]
+        st.button("**👉 NEXT: ORDER**", type="primary", use_container_width=True,
+                  on_click=go, args=("order",))
     
-    for item, price in order_items:
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.write(item)
-        with col2:
-            st.write(price)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # ========== STEP 6: ORDER ==========
+    elif st.session_state.app_state['current_step'] == 6:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown("## 💰 **STEP 6: ORDER & DELIVERY**")
+    
+        order_status = collect_order()
+    
+        # Reclaimed stock near the customer that can make the whole piece
+        reclaimed = st.session_state.app_state['order_reclaimed']
+        coords = location_index().coords(st.session_state.app_state['user_location'])
+        if coords and not st.session_state.app_state['order_key']:
+            reclaimed = reclaimed_inventory().match(
+                st.session_state.app_state['selected_product'],
+                species_of(st.session_state.app_state['recommended_wood']),
+                *coords
+            )
+        if reclaimed and not st.session_state.app_state['order_key']:
+            st.info(f"♻️ **Reclaimed {species_of(st.session_state.app_state['recommended_wood'])} available** - "
+                    f"{len(reclaimed.boards)} boards within {reclaimed.distance_km:.0f} km")
+            if not st.checkbox("Make it from reclaimed wood", value=True):
+                reclaimed = None
+    
+        # Calculate price
+        price = quote(
+            st.session_state.app_state['selected_product'],
+            st.session_state.app_state['recommended_wood'],
+            st.session_state.app_state.get('ai_transformation'),
+            reclaimed
+        )
+        total = price.total
+    
+        st.markdown("### 📦 **ORDER SUMMARY**")
+    
+        order_items = [[item, f"${amount}"] for item, amount in price.items]
+        order_items.append(["**TOTAL**", f"**${total}**"])
+    
+        for item, price in order_items:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(item)
+            with col2:
+                st.write(price)
+    
+        # Every product and wood side by side, read from the shared price matrix
+        with st.expander("🔍 **COMPARE OPTIONS**"):
+            matrix = price_matrix()
+            transformed = bool(st.session_state.app_state.get('ai_transformation'))
+            design = st.radio("**Design:**", ["Standard design", "AI Design Transformation"],
+                              index=int(transformed), horizontal=True, key="compare_design")
+            totals = matrix.totals[:, :, matrix.designs.index(design != "Standard design"), 0]
+            grid = {"Wood": [wood.strip("*") for wood in matrix.woods if wood != OTHER]}
+            for row, product in enumerate(matrix.products):
+                if product != OTHER:
+                    label = f"✅ {product}" if product == st.session_state.app_state['selected_product'] else product
+                    grid[label] = [f"${totals[row, w]}" for w, wood in enumerate(matrix.woods) if wood != OTHER]
+            st.dataframe(grid, hide_index=True, use_container_width=True)
+            st.caption("Totals with the circular service package, before any reclaimed wood saving")
+    
+        if order_status == QUEUED:
+            st.info("⏳ **Confirming your order...**")
+            st.button("🔄 Check order status", key="order_status", use_container_width=True,
+                      on_click=triggered_by, args=("check_order",))
+        elif not st.session_state.app_state['order_placed']:
+            if order_status in (ORDER_FAILED, ORDER_UNKNOWN):
+                st.error("Your order could not be saved - please try again")
+            st.button("**🚀 PLACE ORDER**", type="primary", use_container_width=True,
+                      on_click=place_order, args=(total, reclaimed))
+        else:
+            st.success("### ✅ **ORDER CONFIRMED!**")
+            st.write("**Delivery:** 3-4 weeks")
+            st.write("**Included:** Circular service warranty (repair/upcycle)")
+            st.write("**Next:** Furniture will be crafted and delivered")
+        
+            st.button("**👉 CONTINUE TO CIRCULAR SERVICE**", type="primary", use_container_width=True,
+                      on_click=go, args=("circular_service",))
     
-    if st.button("**🚀 PLACE ORDER**", type="primary", use_container_width=True):
-        st.session_state.app_state['order_placed'] = True
-        st.session_state.app_state['order_date'] = datetime.now().strftime("%Y-%m-%d")
-        st.session_state.app_state['order_total'] = total
-        st.balloons()
-        st.success("### ✅ **ORDER CONFIRMED!**")
-        st.write("**Delivery:** 3-4 weeks")
-        st.write("**Included:** Circular service warranty (repair/upcycle)")
-        st.write("**Next:** Furniture will be crafted and delivered")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # ========== STEP 7: DAMAGE REPORT ==========
+    elif st.session_state.app_state['current_step'] == 7:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown("## ⚡ **STEP 7: YEARS LATER - DAMAGE REPORT**")
+    
+        if not st.session_state.app_state.get('order_placed'):
+            st.warning("Please place an order first!")
+            st.button("Go Back to Order", use_container_width=True, on_click=go, args=("back_to_order",))
+        else:
+            st.write(f"**Purchase History:** {st.session_state.app_state['selected_product']} ordered on {st.session_state.app_state['order_date']}")
         
-        if st.button("**👉 CONTINUE TO CIRCULAR SERVICE**", type="primary", use_container_width=True):
-            st.session_state.app_state['current_step'] = 7
-            time.sleep(1)
-            st.rerun()
-    
-    st.markdown("</div>", unsafe_allow_html=True)
-
-# ========== STEP 7: DAMAGE REPORT ==========
-elif st.session_state.app_state['current_step'] == 7:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown("## ⚡ **STEP 7: YEARS LATER - DAMAGE REPORT**")
-    
-    if not st.session_state.app_state.get('order_placed'):
-        st.warning("Please place an order first!")
-        if st.button("Go Back to Order", use_container_width=True):
-            st.session_state.app_state['current_step'] = 6
-            st.rerun()
-    else:
-        st.write(f"**Purchase History:** {st.session_state.app_state['selected_product']} ordered on {st.session_state.app_state['order_date']}")
+            st.markdown("### 📸 **TAKE PHOTOS OF DAMAGE**")
+            st.write("Take photos from all angles:")
         
-        st.markdown("### 📸 **TAKE PHOTOS OF DAMAGE**")
-        st.write("Take photos from all angles:")
+            angles = ["Front", "Back", "Left Side", "Right Side", "Top", "Close-up", "Inside", "Underneath"]
         
-        angles = ["Front", "Back", "Left Side", "Right Side", "Top", "Close-up", "Inside", "Underneath"]
+            photos = st.session_state.app_state.setdefault('damage_photos', {})
+            # Sessions saved before photos were stored on disk hold the bytes
+            for angle, photo in list(photos.items()):
+                if isinstance(photo, bytes):
+                    photos[angle] = photo_store().put(photo)
+            cols = st.columns(4)
+            for idx, angle in enumerate(angles):
+                col_idx = idx % 4
+                with cols[col_idx]:
+                    icon = "✅" if angle in photos else "📷"
+                    st.button(f"{icon} {angle}", key=f"angle_{idx}", use_container_width=True,
+                              on_click=set_state, kwargs={'photo_angle': angle})
         
-        selected_angles = []
-        cols = st.columns(4)
-        for idx, angle in enumerate(angles):
-            col_idx = idx % 4
-            with cols[col_idx]:
-                if st.button(f"📷 {angle}", key=f"angle_{idx}", use_container_width=True):
-                    selected_angles.append(angle)
+            active_angle = st.session_state.app_state.get('photo_angle')
+            if active_angle:
+                idx = angles.index(active_angle)
+                st.file_uploader(f"**Upload the {active_angle} photo:**", type=["jpg", "jpeg", "png", "webp"], key=f"photo_upload_{idx}",
+                                 on_change=store_photo, args=(active_angle, f"photo_upload_{idx}"))
+                st.camera_input(f"**...or take the {active_angle} photo now:**", key=f"photo_camera_{idx}",
+                                on_change=store_photo, args=(active_angle, f"photo_camera_{idx}"))
+        
+            if photos:
+                st.info(f"Photos taken from: {', '.join(photos)}")
+                show_photos(photos, width=120)
+            
+                analysis = collect_job('damage_job')
+                if analysis and analysis.state == FAILED:
+                    st.error(f"Damage analysis failed: {analysis.error}")
+            
+                if not st.session_state.app_state.get('damage_job'):
+                    st.button("**🔍 AI ANALYZE DAMAGE**", type="primary", use_container_width=True,
+                              on_click=analyze_damage)
+            
+                if st.session_state.app_state.get('damage_job'):
+                    st.info("🔍 **AI analyzing damage percentage...**")
+                    st.button("🔄 Check AI status", key="damage_status", use_container_width=True,
+                          on_click=triggered_by, args=("check_damage",))
         
-        if selected_angles:
-            st.info(f"Photos taken from: {', '.join(selected_angles)}")
+            good_wood = st.session_state.app_state.get('good_wood_left', 0)
+            if good_wood > 0:
+                damaged = st.session_state.app_state['damage_percentage']
+                possible = st.session_state.app_state.get('possible_products') or []
             
-            if st.button("**🔍 AI ANALYZE DAMAGE**", type="primary", use_container_width=True):
-                with st.spinner("AI analyzing damage percentage..."):
-                    time.sleep(2)
-                    
-                    # Generate random damage analysis
-                    import random
-                    good_wood = random.randint(30, 70)
-                    damaged = 100 - good_wood
-                    
-                    st.session_state.app_state['damage_percentage'] = damaged
-                    st.session_state.app_state['good_wood_left'] = good_wood
-                    
-                    st.markdown('<div class="damage-card">', unsafe_allow_html=True)
-                    st.markdown("### ⚡ **DAMAGE ANALYSIS REPORT**")
-                    st.metric("Good Wood Remaining", f"{good_wood}%")
-                    st.metric("Damaged Wood", f"{damaged}%")
-                    
-                    if good_wood >= 60:
-                        st.write("**Can make:** 2 chairs + small table")
-                        possible = ["2 Chairs + Table", "Bookshelf + Stool", "New smaller sofa"]
-                    elif good_wood >= 40:
-                        st.write("**Can make:** 1 chair + stool")
-                        possible = ["1 Chair + Stool", "Coffee Table", "Wall Shelf"]
-                    elif good_wood >= 20:
-                        st.write("**Can make:** Small items")
-                        possible = ["Picture Frame", "Small Stool", "Decorative Items"]
-                    else:
-                        st.write("**Can make:** Very small items")
-                        possible = ["Jewelry Box", "Small Frame", "Art Pieces"]
-                    
-                    st.session_state.app_state['possible_products'] = possible
-                    st.markdown("</div>", unsafe_allow_html=True)
+                st.markdown('<div class="damage-card">', unsafe_allow_html=True)
+                st.markdown("### ⚡ **DAMAGE ANALYSIS REPORT**")
+                st.metric("Good Wood Remaining", f"{good_wood}%")
+                st.metric("Damaged Wood", f"{damaged}%")
+                breakdown = st.session_state.app_state.get('damage_breakdown', {})
+                if breakdown:
+                    st.write(" · ".join(f"**{name.title()}:** {share}%" for name, share in breakdown.items()))
+                if possible:
+                    st.write(f"**Can make:** {possible[0]}")
+                else:
+                    st.write("**Can make:** Nothing - this wood has reached the end of its life")
+                st.markdown("</div>", unsafe_allow_html=True)
         
-        if st.session_state.app_state.get('good_wood_left', 0) > 0:
-            if st.button("**👉 TRANSFORM INTO NEW PRODUCT**", type="primary", use_container_width=True):
-                st.session_state.app_state['current_step'] = 8
-                st.rerun()
+            if good_wood > 0 and st.session_state.app_state.get('possible_products'):
+                st.button("**👉 TRANSFORM INTO NEW PRODUCT**", type="primary", use_container_width=True,
+                          on_click=go, args=("transform",))
     
-    st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("</div>", unsafe_allow_html=True)
 
-# ========== STEP 8: TRANSFORM PRODUCT ==========
-elif st.session_state.app_state['current_step'] == 8:
-    st.markdown('<div class="step-box">', unsafe_allow_html=True)
-    st.markdown("## 🔄 **STEP 8: TRANSFORM OLD → NEW**")
-    
-    good_wood = st.session_state.app_state.get('good_wood_left', 0)
-    old_product = st.session_state.app_state['selected_product']
-    
-    st.markdown(f"### ♻️ **FROM:** {old_product} ({good_wood}% good wood left)")
-    st.markdown("### 🔄 **TO:** New product from remaining wood")
-    
-    if st.session_state.app_state.get('possible_products'):
-        new_product = st.selectbox(
-            "**Choose what to make:**",
-            st.session_state.app_state['possible_products']
-        )
+    # ========== STEP 8: TRANSFORM PRODUCT ==========
+    elif st.session_state.app_state['current_step'] == 8:
+        st.markdown('<div class="step-box">', unsafe_allow_html=True)
+        st.markdown("## 🔄 **STEP 8: TRANSFORM OLD → NEW**")
+    
+        good_wood = st.session_state.app_state.get('good_wood_left', 0)
+        created = st.session_state.app_state['last_created']
+        old_product = created[0] if created else st.session_state.app_state['selected_product']
+    
+        st.markdown(f"### ♻️ **FROM:** {old_product} ({good_wood}% good wood left)")
+        if st.session_state.app_state['damage_photos']:
+            show_photos(st.session_state.app_state['damage_photos'], width=90)
+        st.markdown("### 🔄 **TO:** New product from remaining wood")
+    
+        if st.session_state.app_state.get('possible_products'):
+            new_product = st.selectbox(
+                "**Choose what to make:**",
+                st.session_state.app_state['possible_products']
+            )
         
-        st.markdown('<div class="design-preview">', unsafe_allow_html=True)
-        st.markdown(f"### ✨ [EMPTY {new_product.upper()}]")
-        st.markdown("*(Will be made from remaining wood)*")
-        st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown('<div class="design-preview">', unsafe_allow_html=True)
+            st.markdown(f"### ✨ [EMPTY {new_product.upper()}]")
+            st.markdown("*(Will be made from remaining wood)*")
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        # Design inheritance
-        st.write("### 🎨 **DESIGN OPTIONS:**")
+            # Design inheritance
+            st.write("### 🎨 **DESIGN OPTIONS:**")
         
-        col1, col2 = st.columns(2)
+            col1, col2 = st.columns(2)
         
-        with col1:
-            if st.checkbox("Keep original design (peacock + lion)", value=True):
-                st.write("Design will be adapted to new shape")
+            with col1:
+                if st.checkbox(f"Keep original design ({st.session_state.app_state.get('current_design') or 'plain'})", value=True):
+                    st.write("Design will be adapted to new shape")
         
-        with col2:
-            if st.checkbox("Add new design elements"):
-                new_elements = st.multiselect("Add:", ["Geometric", "Floral", "Minimalist", "Traditional"])
+            with col2:
+                if st.checkbox("Add new design elements"):
+                    new_elements = st.multiselect("Add:", ["Geometric", "Floral", "Minimalist", "Traditional"])
         
-        if st.button("**🚀 CREATE NEW PRODUCT**", type="primary", use_container_width=True):
-            # Update product history
-            history_entry = {
-                'date': datetime.now().strftime("%Y-%m-%d"),
-                'from': old_product,
-                'to': new_product,
-                'wood_used': f"{good_wood}%",
-                'design': "Adapted peacock-lion design"
-            }
-            
-            if 'product_history' not in st.session_state.app_state:
-                st.session_state.app_state['product_history'] = []
+            if not created:
+                st.button("**🚀 CREATE NEW PRODUCT**", type="primary", use_container_width=True,
+                          on_click=create_product, args=(new_product,))
+            else:
+                st.success(f"### ✅ **{created[1].upper()} CREATED!**")
+                st.write(f"**From old {created[0]} → New {created[1]}**")
+                st.write(f"**Wood life extended by 5+ years**")
             
-            st.session_state.app_state['product_history'].append(history_entry)
-            st.session_state.app_state['selected_product'] = new_product.split()[0] if ' ' in new_product else new_product
+                # Show journey
+                st.markdown("### 🌳 **WOOD'S JOURNEY:**")
+                for entry in lineage_store().ancestry(st.session_state.app_state['piece_id']):
+                    st.write(f"- {entry['date'][:10]}: {entry['from']} → {entry['to']} ({entry['wood_used']}% wood)")
             
-            st.balloons()
-            st.success(f"### ✅ **{new_product.upper()} CREATED!**")
-            st.write(f"**From old {old_product} → New {new_product}**")
-            st.write(f"**Wood life extended by 5+ years**")
+                st.markdown("---")
+                st.markdown("### ♻️ **CORE PHILOSOPHY:**")
+                st.markdown("**\"Until the wood dies, we keep making new products from it.\"**")
             
-            # Show journey
-            st.markdown("### 🌳 **WOOD'S JOURNEY:**")
-            for entry in st.session_state.app_state['product_history']:
-                st.write(f"- {entry['date']}: {entry['from']} → {entry['to']} ({entry['wood_used']} wood)")
-            
-            st.markdown("---")
-            st.markdown("### ♻️ **CORE PHILOSOPHY:**")
-            st.markdown("**\"Until the wood dies, we keep making new products from it.\"**")
-            
-            # Restart option
-            if st.button("**🔄 START NEW JOURNEY**", type="primary", use_container_width=True):
-                st.session_state.app_state['current_step'] = 1
-                st.session_state.app_state['selected_product'] = None
-                st.session_state.app_state['good_wood_left'] = 0
-                st.rerun()
+                # Restart option
+                st.button("**🔄 START NEW JOURNEY**", type="primary", use_container_width=True,
+                          on_click=go, args=("restart",))
     
-    st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("</div>", unsafe_allow_html=True)
 
-# ========== FOOTER ==========
-st.markdown("---")
-footer_col1, footer_col2, footer_col3 = st.columns([2, 1, 1])
+    # ========== FOOTER ==========
+    st.markdown("---")
+    footer_col1, footer_col2, footer_col3 = st.columns([2, 1, 1])
 
-with footer_col1:
-    st.caption("🪑 **IN SPACE FURNITURE** | Complete Working App | No Errors")
+    with footer_col1:
+        st.caption("🪑 **IN SPACE FURNITURE** | Complete Working App | No Errors")
 
-with footer_col2:
-    st.caption("✅ **All Features Working**")
+    with footer_col2:
+        st.caption("✅ **All Features Working**")
 
-with footer_col3:
-    st.caption("🚀 **Ready for Investors**")
+    with footer_col3:
+        st.caption("🚀 **Ready for Investors**")
 
-# Add auto-refresh for smooth experience
-st.markdown("<script>setTimeout(function(){window.location.reload();}, 30000);</script>", unsafe_allow_html=True)
+    # Live refresh while AI jobs run - reruns over the open connection, keeps app_state
+    if jobs_in_flight():
+        live_refresh()
+        # The next run is most likely the refresh tick
+        triggered_by("live_refresh")
+finally:
+    if session_store() is not None:
+        session_id = st.session_state.app_state.session_id
+        session_store().save(st.session_state.app_state)
+        if st.session_state.app_state.session_id != session_id:
+            # Another tab moved this journey on meanwhile; this one carries on under its own id
+            st.experimental_set_query_params(session=st.session_state.app_state.session_id)
+    rerun.finish(st.session_state.app_state)
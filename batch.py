@@ -0,0 +1,232 @@
+# IN SPACE FURNITURE - BATCH SCENARIOS
+#
+# Runs customer journeys without the UI, through the same logic as steps
+# 2-8: wood recommendation, room layout, design, price, damage and reuse.
+# One JSON scenario per input line, one JSON result per output line, in the
+# same order:
+#
+#   {"id": "a1", "product": "Sofa", "city": "Madras", "room_width": 14,
+#    "room_length": 11, "existing": ["Bed"], "designs": ["Peacock", "Lion"],
+#    "good_wood": 70}
+#
+# Damage comes from `good_wood` (percent) or from `photos` ({angle: path to
+# image}), which are analyzed like Step 7 uploads; `make` picks one of the
+# reuse options by label (default: the one using the most wood).
+#
+# Input is read and output written a chunk at a time, with a bounded number
+# of chunks in flight across the worker processes, so files of any size run
+# in constant memory:
+#
+#   python batch.py scenarios.jsonl -o results.jsonl --workers 8
+#   cat scenarios.jsonl | python batch.py - > results.jsonl
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from cutting import plan_for_product
+from damage import estimate_damage
+from designs import compose
+from layout import plan_layout, walking_verdict
+from locations import load_location_index, recommend_wood
+from pricing import BASE_PRICES, quote
+from risk import RiskHistory, RiskTable
+
+_index = None
+_risks = None
+
+
+def _location_index():
+    # One index per worker process, built on first use
+    global _index
+    if _index is None:
+        _index = load_location_index()
+    return _index
+
+
+def _risk_table():
+    # History as it stood when the worker started
+    global _risks
+    if _risks is None:
+        _risks = RiskTable(RiskHistory())
+        _risks.refresh()
+    return _risks
+
+
+def _number(scenario, key, default, low, high):
+    value = scenario.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        raise ValueError(f"{key} must be a number from {low} to {high}")
+    return value
+
+
+def _text(scenario, key):
+    value = scenario.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{key} must be a string")
+    return value
+
+
+def _names(scenario, key):
+    # A list of strings; a bare string is not read as its letters
+    value = scenario.get(key) or []
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError(f"{key} must be a list of names")
+    return value
+
+
+def _photos(scenario):
+    value = scenario.get("photos") or {}
+    if not isinstance(value, dict) or not all(isinstance(path, str) for path in value.values()):
+        raise ValueError("photos must map angles to image paths")
+    return value
+
+
+def run_scenario(scenario):
+    product = scenario.get("product")
+    if not isinstance(product, str) or product not in BASE_PRICES:
+        raise ValueError(f"product must be one of {', '.join(BASE_PRICES)}")
+    room_width = _number(scenario, "room_width", 15, 8, 30)
+    room_length = _number(scenario, "room_length", 12, 8, 30)
+    existing = _names(scenario, "existing")
+    designs = _names(scenario, "designs")
+    photos = _photos(scenario)
+    make = _text(scenario, "make")
+
+    # Step 2
+    city, wood, _ = recommend_wood(_location_index(), _text(scenario, "city") or "Chennai", _risk_table())
+
+    # Step 3
+    layout = plan_layout(room_width, room_length, product, tuple(sorted(existing)))
+
+    # Steps 4 and 6
+    composition = compose(designs)
+    transformed = bool(composition.names)
+    price = quote(product, wood, transformed)
+
+    result = {
+        'id': scenario.get("id"),
+        'product': product,
+        'location': city,
+        'wood': wood.strip("*"),
+        'walking_space': layout.walking_space,
+        'walking_verdict': walking_verdict(layout.walking_space),
+        'unplaced': list(layout.unplaced),
+        'design': composition.title if transformed else None,
+        'design_harmony': composition.score if transformed else None,
+        'price': {line.replace("*", ""): amount for line, amount in price.items},
+        'total': price.total,
+    }
+
+    # Steps 7 and 8
+    if photos:
+        # Paths go straight to the decoder; no photo is read into memory whole
+        report = estimate_damage(list(photos.values()), list(photos))
+        good_wood = report['good_wood_left']
+        result['damage_breakdown'] = report['damage_breakdown']
+    elif "good_wood" in scenario:
+        good_wood = _number(scenario, "good_wood", 0, 0, 100)
+    else:
+        return result
+
+    plans = plan_for_product(product, int(good_wood), wood)
+    result['good_wood'] = good_wood
+    result['reuse_options'] = [
+        {'label': plan.label, 'products': list(plan.products), 'wood_used': plan.wood_used,
+         'utilisation': plan.utilisation}
+        for plan in plans
+    ]
+    chosen = next((plan for plan in plans if plan.label == make), plans[0] if plans else None)
+    if make and (chosen is None or chosen.label != make):
+        raise ValueError(f"cannot make {make} from {good_wood}% good wood")
+    result['transformed_into'] = list(chosen.products) if chosen else []
+    return result
+
+
+def run_lines(lines):
+    # Worker entry point: raw JSON lines in, (JSON lines out, error count).
+    # A bad scenario becomes an error line instead of failing the chunk.
+    out = []
+    errors = 0
+    for line in lines:
+        scenario = None
+        try:
+            scenario = json.loads(line)
+            if not isinstance(scenario, dict):
+                raise ValueError("scenario must be a JSON object")
+            out.append(json.dumps(run_scenario(scenario), ensure_ascii=False))
+        except (ValueError, OSError) as ex:
+            errors += 1
+            ident = scenario.get("id") if isinstance(scenario, dict) else None
+            out.append(json.dumps({'id': ident, 'error': str(ex)}, ensure_ascii=False))
+    return out, errors
+
+
+def _chunks(stream, size):
+    lines = (line for line in stream if line.strip())
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(stream, out, workers=None, chunk_size=256, in_flight=None):
+    # Returns (scenarios, errors). Output keeps input order.
+    workers = workers or os.cpu_count() or 1
+    in_flight = in_flight or workers * 2
+    total = errors = 0
+
+    def write(done):
+        nonlocal total, errors
+        lines, failed = done
+        total += len(lines)
+        errors += failed
+        out.write("\n".join(lines) + "\n")
+
+    if workers <= 1:
+        for chunk in _chunks(stream, chunk_size):
+            write(run_lines(chunk))
+        return total, errors
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in _chunks(stream, chunk_size):
+            pending.append(pool.submit(run_lines, chunk))
+            if len(pending) >= in_flight:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    return total, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run IN SPACE customer scenarios from JSONL without the UI")
+    parser.add_argument("input", help="scenario JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="result JSONL file, or - for stdout (default)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (1 = run inline)")
+    parser.add_argument("--chunk", type=int, default=256, help="scenarios per task sent to a worker")
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started = time.perf_counter()
+    try:
+        total, errors = run_batch(stream, out, args.workers, args.chunk)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"{total} scenarios ({errors} errors) in {elapsed:.1f}s - {total / max(elapsed, 1e-9):.0f}/s",
+          file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,498 @@
+# IN SPACE FURNITURE - LOAD SIMULATION BENCHMARK
+#
+# Drives many simulated customers through steps 1-8 of app.py headless
+# (Streamlit's AppTest harness) and reports per-step rerun latency,
+# reruns per user action and memory per session.
+#
+#   python benchmark.py --users 200 --workers 4 --out bench_results.json
+#   python benchmark.py --baseline bench_baseline.json --tolerance 0.25
+#
+# Every worker process keeps all of its sessions resident and advances them
+# one action at a time, round-robin, so the numbers reflect many customers
+# sharing one Streamlit worker rather than one customer at a time.
+import argparse
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib import parse
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+PRODUCTS = ["SOFA", "CHAIR", "BED", "TABLE"]
+CITIES = ["Chennai", "Mumbai", "Delhi", "Bangalore", "Pune", "Kolkata"]
+DESIGNS = ["Peacock", "Lion", "Flowers", "Tree", "Geometric", "Birds", "Moon & Stars", "Waves"]
+AR_CONTROLS = ["Rotate", "Walk Around", "Change Light", "Adjust"]
+ROOM_FURNITURE = ["Sofa", "Bed", "Table", "Chair", "Wardrobe", "Desk", "TV Unit"]
+ANGLES = ["Front", "Back", "Left Side", "Right Side", "Top", "Close-up", "Inside", "Underneath"]
+
+# Metrics compared against a baseline file; lower is better for all of them.
+REGRESSION_METRICS = ["p95_ms", "reruns_per_action"]
+
+# A single user action that keeps calling st.rerun() past this many script
+# executions, or outlives --timeout, is stopped and reported as a runaway
+# instead of hanging the run.
+MAX_RERUNS_PER_ACTION = 25
+
+# How often a customer waiting on a background AI job re-checks its status
+JOB_POLL_INTERVAL = 0.25
+
+
+# ========== TIMED SCRIPT RUNNER ==========
+def _install_timed_runner():
+    # AppTest polls its runner every 100 ms, which would swamp the numbers we
+    # care about. Swap in a runner that times each script execution from its
+    # own events and wakes up as soon as the script thread shuts down. The
+    # bytecode cache is shared across sessions, as it is in a real server.
+    from streamlit.runtime.scriptrunner import RerunData, ScriptRunnerEvent
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.element_tree import parse_tree_from_messages
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    stop_events = (
+        ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+        ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR,
+        ScriptRunnerEvent.SCRIPT_STOPPED_FOR_RERUN,
+    )
+
+    script_cache = ScriptCache()
+
+    class TimedScriptRunner(LocalScriptRunner):
+        last_run_times = []
+        last_runaway = False
+
+        def __init__(self, script_path, session_state):
+            super().__init__(script_path, session_state)
+            self._script_cache = script_cache
+            self.run_times = []
+            self.runaway = False
+            self._started_at = None
+            self._shutdown = threading.Event()
+            self.on_event.connect(self._time_event, weak=False)
+
+        def _time_event(self, sender, event, **kwargs):
+            now = time.perf_counter()
+            if event == ScriptRunnerEvent.SCRIPT_STARTED:
+                self._started_at = now
+                if len(self.run_times) >= MAX_RERUNS_PER_ACTION:
+                    self.runaway = True
+                    self.request_stop()
+            elif event in stop_events and self._started_at is not None:
+                self.run_times.append(now - self._started_at)
+                self._started_at = None
+            elif event == ScriptRunnerEvent.SHUTDOWN:
+                self._shutdown.set()
+
+        def run(self, widget_state=None, query_params=None, timeout=3):
+            query_string = parse.urlencode(query_params, doseq=True) if query_params else ""
+            self.request_rerun(RerunData(widget_states=widget_state, query_string=query_string))
+            if not self._script_thread:
+                self.start()
+            if not self._shutdown.wait(timeout):
+                # Same treatment as a rerun loop: the action never settled
+                self.runaway = True
+                self.request_stop()
+                self.join()
+            TimedScriptRunner.last_run_times = self.run_times
+            TimedScriptRunner.last_runaway = self.runaway
+            return parse_tree_from_messages(self.forward_msgs())
+
+    app_test.LocalScriptRunner = TimedScriptRunner
+    return TimedScriptRunner
+
+
+def _sample_photo(seed, width=1600, height=1200):
+    # A phone-sized JPEG of wood grain with some dark damage marks
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y = np.arange(height)[:, None]
+    x = np.arange(width)[None, :]
+    grain = 0.08 * np.sin(y / 9 + np.sin(x / 120) * 3) + rng.normal(0, 0.02, (height, width))
+    pixels = np.stack([0.62 + grain, 0.42 + grain * 0.8, 0.24 + grain * 0.6], axis=-1)
+    for cx, cy in rng.integers(0, [width, height], size=(rng.integers(20, 400), 2)):
+        pixels[max(cy - 6, 0):cy + 6, max(cx - 6, 0):cx + 6] = 0.06
+    image = Image.fromarray((np.clip(pixels, 0, 1) * 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=88)
+    return buffer.getvalue()
+
+
+def _rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        # ru_maxrss is a high-water mark, but it is the best we get off Linux
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss // 1024 if sys.platform == "darwin" else rss
+
+
+# ========== SIMULATED CUSTOMER ==========
+class SimulatedCustomer:
+    def __init__(self, user_id, app_path, timeout, runner, photos):
+        from streamlit.testing.v1 import AppTest
+
+        self.user_id = user_id
+        self.rng = random.Random(user_id)
+        self.at = AppTest.from_file(app_path, default_timeout=timeout)
+        self.runner = runner
+        self.photos = photos
+        self.records = []
+        self.last_poll = 0.0
+        self.unreachable = []
+        self.errors = []
+
+    @property
+    def app_state(self):
+        if "app_state" not in self.at.session_state:
+            return {}
+        return self.at.session_state["app_state"]
+
+    def current_step(self):
+        return self.app_state.get("current_step", 1)
+
+    def _record(self, action, step, fn):
+        started = time.perf_counter()
+        fn()
+        wall = time.perf_counter() - started
+        self.records.append({
+            "step": step,
+            "action": action,
+            "reruns": len(self.runner.last_run_times),
+            "latencies": list(self.runner.last_run_times),
+            "wall": wall,
+            "runaway": self.runner.last_runaway,
+        })
+        if self.runner.last_runaway:
+            # The stopped run left an empty page behind; redraw it untimed
+            self.at.run()
+        if self.at.exception:
+            self.errors.append(f"{action}: {self.at.exception[0].value}")
+
+    def load(self):
+        self._record("load", 1, self.at.run)
+
+    def find_button(self, label):
+        return next((b for b in self.at.button if label in b.label), None)
+
+    def click(self, action, label):
+        button = self.find_button(label)
+        if button is None:
+            self.unreachable.append(action)
+            return False
+        self._record(action, self.current_step(), lambda: button.click().run())
+        return True
+
+    def type_text(self, action, value):
+        widget = self.at.text_input[0]
+        self._record(action, self.current_step(), lambda: widget.input(value).run())
+
+    def set_slider(self, action, index, value):
+        widget = self.at.slider[index]
+        self._record(action, self.current_step(), lambda: widget.set_value(value).run())
+
+    def pick_many(self, action, index, values):
+        widget = self.at.multiselect[index]
+        self._record(action, self.current_step(), lambda: widget.set_value(values).run())
+
+    def select(self, action, index, value):
+        widget = self.at.selectbox[index]
+        self._record(action, self.current_step(), lambda: widget.select(value).run())
+
+    def advance(self, action, label, to_step):
+        # Click a navigation button; if the app did not actually move on
+        # (missing or nested button), record it and force the transition.
+        self.click(action, label)
+        if self.current_step() != to_step:
+            if action not in self.unreachable:
+                self.unreachable.append(action)
+            self.force(current_step=to_step)
+
+    def upload_photo(self, action, angle, data):
+        # AppTest cannot drive st.file_uploader, so the photo's hash is put
+        # where the Step 7 upload callback would have stored it
+        def upload():
+            self.app_state.setdefault("damage_photos", {})[angle] = data
+            self.at.run()
+        self._record(action, self.current_step(), upload)
+
+    def force(self, **updates):
+        # Transitions the app cannot reach on its own are patched in directly
+        # so the rest of the journey still gets measured. They are reported
+        # as unreachable rather than timed.
+        self.app_state.update(updates)
+        self.at.run()
+
+    def state_bytes(self):
+        return len(pickle.dumps(self.app_state))
+
+
+def await_job(customer, action, label="Check AI status"):
+    # Background AI jobs and order confirmations are polled with their status
+    # button, at most every JOB_POLL_INTERVAL seconds, while other customers
+    # keep taking turns
+    while customer.find_button(label):
+        if time.monotonic() - customer.last_poll >= JOB_POLL_INTERVAL:
+            customer.last_poll = time.monotonic()
+            customer.click(action, label)
+        else:
+            time.sleep(0.01)
+        yield
+
+
+def journey(customer):
+    rng = customer.rng
+
+    customer.load()
+    yield
+    customer.click("step1:product", rng.choice(PRODUCTS))
+    yield
+
+    customer.type_text("step2:city", rng.choice(CITIES))
+    yield
+    customer.advance("step2:next", "NEXT: SCAN ROOM", 3)
+    yield
+
+    customer.set_slider("step3:width", 0, rng.randint(8, 30))
+    yield
+    customer.set_slider("step3:length", 1, rng.randint(8, 30))
+    yield
+    customer.pick_many("step3:furniture", 0, rng.sample(ROOM_FURNITURE, rng.randint(0, 3)))
+    yield
+    customer.advance("step3:next", "NEXT: DESIGN", 4)
+    yield
+
+    for name in ["Peacock", "Lion"] + rng.sample(DESIGNS[2:], rng.randint(0, 2)):
+        customer.click("step4:design", name)
+        yield
+    customer.click("step4:transform", "TRANSFORM DESIGN")
+    yield
+    customer.advance("step4:next", "NEXT: AR PREVIEW", 5)
+    yield
+
+    for control in AR_CONTROLS:
+        customer.click("step5:control", control)
+        yield
+    customer.advance("step5:next", "NEXT: ORDER", 6)
+    yield
+
+    customer.click("step6:place_order", "PLACE ORDER")
+    yield
+    yield from await_job(customer, "step6:poll", "Check order status")
+    customer.advance("step6:continue", "CONTINUE TO CIRCULAR SERVICE", 7)
+    yield
+
+    for angle in rng.sample(ANGLES, rng.randint(1, len(ANGLES))):
+        customer.click("step7:photo", angle)
+        yield
+        customer.upload_photo("step7:upload", angle, customer.photos[rng.randrange(len(customer.photos))])
+        yield
+    customer.click("step7:analyze", "AI ANALYZE DAMAGE")
+    yield
+    yield from await_job(customer, "step7:poll")
+    if not customer.app_state.get("good_wood_left"):
+        customer.unreachable.append("step7:analysis_result")
+        customer.force(good_wood_left=50, damage_percentage=50,
+                       possible_products=["1 Chair + Stool", "Coffee Table", "Wall Shelf"])
+    customer.advance("step7:next", "TRANSFORM INTO NEW PRODUCT", 8)
+    yield
+
+    if customer.at.selectbox:
+        options = customer.at.selectbox[0].options
+        customer.select("step8:choose", 0, rng.choice(options))
+        yield
+    customer.click("step8:create", "CREATE NEW PRODUCT")
+    yield
+    customer.advance("step8:restart", "START NEW JOURNEY", 1)
+
+
+def run_worker(user_ids, app_path, timeout):
+    runner = _install_timed_runner()
+
+    rss_before = _rss_kb()
+    from photos import PhotoStore
+    store = PhotoStore()
+    photos = [store.put(_sample_photo(seed)) for seed in range(4)]
+    customers = [SimulatedCustomer(uid, app_path, timeout, runner, photos) for uid in user_ids]
+    journeys = [(c, journey(c)) for c in customers]
+
+    active = journeys
+    while active:
+        still_running = []
+        for customer, steps in active:
+            try:
+                next(steps)
+            except StopIteration:
+                continue
+            except Exception as ex:
+                customer.errors.append(f"{type(ex).__name__}: {ex}")
+                continue
+            still_running.append((customer, steps))
+        active = still_running
+    rss_after = _rss_kb()
+
+    return {
+        "sessions": len(customers),
+        "rss_delta_kb": rss_after - rss_before,
+        "records": [r for c in customers for r in c.records],
+        "unreachable": [a for c in customers for a in c.unreachable],
+        "errors": [e for c in customers for e in c.errors],
+        "state_bytes": [c.state_bytes() for c in customers],
+    }
+
+
+# ========== AGGREGATION ==========
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _summarize(records):
+    latencies = [lat * 1000 for r in records for lat in r["latencies"]]
+    reruns = sum(r["reruns"] for r in records)
+    return {
+        "actions": len(records),
+        "reruns": reruns,
+        "reruns_per_action": round(reruns / len(records), 3) if records else 0.0,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+    }
+
+
+def aggregate(results, users, workers, wall):
+    records = [r for res in results for r in res["records"]]
+    by_step = {}
+    by_action = {}
+    for r in records:
+        by_step.setdefault(str(r["step"]), []).append(r)
+        by_action.setdefault(r["action"], []).append(r)
+
+    unreachable = {}
+    for res in results:
+        for action in res["unreachable"]:
+            unreachable[action] = unreachable.get(action, 0) + 1
+    runaway = {}
+    for r in records:
+        if r["runaway"]:
+            runaway[r["action"]] = runaway.get(r["action"], 0) + 1
+
+    sessions = sum(res["sessions"] for res in results)
+    state_bytes = [b for res in results for b in res["state_bytes"]]
+    errors = [e for res in results for e in res["errors"]]
+
+    return {
+        "meta": {
+            "app": os.path.basename(APP_PATH),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "users": users,
+            "workers": workers,
+            "wall_s": round(wall, 3),
+            "actions_per_s": round(len(records) / wall, 2) if wall else 0.0,
+            "python": platform.python_version(),
+        },
+        "overall": _summarize(records),
+        "steps": {k: _summarize(v) for k, v in sorted(by_step.items(), key=lambda kv: int(kv[0]))},
+        "actions": {k: _summarize(v) for k, v in sorted(by_action.items())},
+        "memory": {
+            "rss_per_session_kb": round(sum(res["rss_delta_kb"] for res in results) / sessions, 2) if sessions else 0.0,
+            "state_bytes_p50": _percentile(state_bytes, 50),
+            "state_bytes_p95": _percentile(state_bytes, 95),
+        },
+        "unreachable": unreachable,
+        "runaway": runaway,
+        "errors": {"count": len(errors), "samples": errors[:10]},
+    }
+
+
+def find_regressions(report, baseline, tolerance, floor_ms=1.0):
+    regressions = []
+    for step, base in baseline.get("steps", {}).items():
+        current = report["steps"].get(step)
+        if current is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            limit = base[metric] * (1 + tolerance)
+            if metric.endswith("_ms"):
+                # Sub-millisecond steps are all noise; only flag real slowdowns
+                limit = max(limit, base[metric] + floor_ms)
+            if current[metric] > limit:
+                regressions.append(f"step {step} {metric}: {current[metric]} > {round(limit, 3)} (baseline {base[metric]})")
+    if report["errors"]["count"] > baseline.get("errors", {}).get("count", 0):
+        regressions.append(f"errors: {report['errors']['count']} > {baseline['errors']['count']}")
+    return regressions
+
+
+# ========== CLI ==========
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-session load simulation for app.py")
+    parser.add_argument("--users", type=int, default=100, help="simulated customers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-run script timeout (s)")
+    parser.add_argument("--app", default=APP_PATH, help="Streamlit script to drive")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="previous report; regressions fail the run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    # Simulated customers must not end up in the real lineage, sessions, stock,
+    # orders, photos or risk history
+    scratch = tempfile.mkdtemp(prefix="inspace-bench-")
+    os.environ.setdefault("INSPACE_LINEAGE_DB", os.path.join(scratch, "lineage.db"))
+    os.environ.setdefault("INSPACE_SESSION_DIR", os.path.join(scratch, "sessions"))
+    os.environ.setdefault("INSPACE_INVENTORY_DB", os.path.join(scratch, "inventory.db"))
+    os.environ.setdefault("INSPACE_ORDERS_DB", os.path.join(scratch, "orders.db"))
+    os.environ.setdefault("INSPACE_PHOTO_DIR", os.path.join(scratch, "photos"))
+    os.environ.setdefault("INSPACE_SESSION_STORE", "sqlite:" + os.path.join(scratch, "sessions.db"))
+    os.environ.setdefault("INSPACE_RISK_DIR", os.path.join(scratch, "risk"))
+
+    workers = max(1, min(args.workers, args.users))
+    shards = [list(range(i, args.users, workers)) for i in range(workers)]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_worker, shards, [args.app] * workers, [args.timeout] * workers))
+    report = aggregate(results, args.users, workers, time.perf_counter() - started)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.users} users / {workers} workers in {report['meta']['wall_s']}s -> {args.out}")
+    for step, s in report["steps"].items():
+        print(f"  step {step}: p50 {s['p50_ms']}ms  p95 {s['p95_ms']}ms  p99 {s['p99_ms']}ms  "
+              f"reruns/action {s['reruns_per_action']}")
+    print(f"  memory: {report['memory']['rss_per_session_kb']} KB RSS/session, "
+          f"state p95 {report['memory']['state_bytes_p95']} B")
+    if report["unreachable"]:
+        print(f"  unreachable: {report['unreachable']}")
+    if report["runaway"]:
+        print(f"  runaway reruns: {report['runaway']}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
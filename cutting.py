@@ -0,0 +1,275 @@
+# IN SPACE FURNITURE - CUTTING-STOCK OPTIMIZER
+#
+# Works out which new products can be cut from the boards recovered from a
+# returned piece. Every product is a cut-list of solid strips; a strip can be
+# cut from a board that is at least as wide and as thick, and each cut costs
+# a saw kerf of board length - except the last strip of a board, which is
+# whatever is left of it and needs no cut. A board reused whole therefore
+# holds a strip exactly as long. A product is never made from mixed species.
+#
+# Combinations are grown one product at a time in catalog order. A
+# combination that does not fit is never extended (adding products cannot
+# make it fit), and the packing check for each (boards, strips) pair is
+# memoized, so identical inventories across customers cost nothing twice.
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+
+from memo import memoize
+
+KERF = 0.3          # cm of board length lost per cut
+MIN_OFFCUT = 10     # recovered boards shorter than this (cm) are firewood
+MAX_ITEMS = 4       # most products suggested from one returned piece
+PACKING_BUDGET = 500
+
+Board = namedtuple("Board", ["length", "width", "thickness", "species"])
+Part = namedtuple("Part", ["length", "width", "thickness"])
+ReusePlan = namedtuple("ReusePlan", ["label", "products", "wood_used", "utilisation"])
+
+# (length, width, thickness, quantity) in cm. Read-only: CATALOG and the
+# packing caches are built from them once, at import
+FURNITURE_BOARDS = MappingProxyType({
+    "Sofa": ((200, 10, 4, 2), (80, 10, 4, 4), (15, 6, 6, 6), (190, 12, 2, 3), (80, 9, 2, 8)),
+    "Chair": ((90, 5, 5, 2), (45, 5, 5, 2), (45, 9, 2, 5), (40, 5, 3, 4), (40, 6, 2, 3)),
+    "Bed": ((200, 15, 4, 2), (160, 15, 4, 2), (40, 8, 8, 4), (160, 9, 2, 12), (160, 20, 2, 3)),
+    "Table": ((150, 15, 3, 6), (130, 10, 3, 2), (70, 10, 3, 2), (72, 7, 7, 4)),
+})
+
+PRODUCT_CUT_LISTS = MappingProxyType({
+    "Small Sofa": ((140, 10, 4, 2), (70, 10, 4, 4), (15, 6, 6, 4), (70, 9, 2, 8), (130, 12, 2, 2)),
+    "Table": ((110, 15, 3, 5), (90, 8, 3, 2), (50, 8, 3, 2), (72, 6, 6, 4)),
+    "Bookshelf": ((150, 12, 2, 4), (70, 12, 2, 10)),
+    "Chair": ((90, 4, 4, 2), (45, 4, 4, 2), (45, 9, 2, 5), (40, 4, 2, 4), (40, 6, 2, 3)),
+    "Coffee Table": ((90, 12, 2, 5), (40, 6, 6, 4), (70, 8, 2, 2), (40, 8, 2, 2)),
+    "Stool": ((35, 9, 2, 4), (45, 4, 4, 4), (30, 4, 2, 4)),
+    "Wall Shelf": ((80, 12, 2, 2), (20, 8, 2, 4)),
+    "Small Stool": ((28, 9, 2, 3), (25, 4, 4, 3)),
+    "Picture Frame": ((40, 4, 2, 2), (30, 4, 2, 2)),
+    "Jewelry Box": ((25, 8, 1, 6),),
+    "Small Frame": ((20, 3, 1, 4),),
+    "Art Piece": ((15, 5, 1, 4),),
+})
+
+
+def _expand(rows):
+    return [Part(length, width, thickness) for length, width, thickness, qty in rows for _ in range(qty)]
+
+
+CATALOG = {name: tuple(sorted(_expand(rows), reverse=True)) for name, rows in PRODUCT_CUT_LISTS.items()}
+
+
+def cut_list(product):
+    # The strips a new piece is made of, largest first
+    rows = FURNITURE_BOARDS.get(product) or PRODUCT_CUT_LISTS.get(product) or FURNITURE_BOARDS["Chair"]
+    return tuple(sorted(_expand(rows), reverse=True))
+
+
+def species_of(wood):
+    # "**Treated Teak**" -> "Treated Teak"
+    return (wood or "Mango Wood").strip("* ")
+
+
+def recovered_boards(product, good_wood, wood=None):
+    # Damage is cut away from each board of the original piece; whatever is
+    # left of a board in proportion to the good wood is kept if long enough.
+    # Products made from reclaimed wood are taken apart along their cut-list.
+    species = species_of(wood)
+    rows = FURNITURE_BOARDS.get(product) or PRODUCT_CUT_LISTS.get(product) or FURNITURE_BOARDS["Chair"]
+    boards = []
+    for length, width, thickness, qty in rows:
+        usable = int(length * good_wood / 100)
+        if usable >= MIN_OFFCUT:
+            boards.extend([Board(usable, width, thickness, species)] * qty)
+    return boards
+
+
+def _volume(parts):
+    return sum(p.length * p.width * p.thickness for p in parts)
+
+
+def _capacity_ok(stock, parts):
+    # For every strip size, the strips needing at least that width and
+    # thickness must fit in the total length of boards that wide and thick
+    # (plus the kerf each board's last strip does not need). Cheap, and it
+    # rejects most combinations that cannot work.
+    for width, thickness in {(p.width, p.thickness) for p in parts}:
+        needed = sum(p.length + KERF for p in parts if p.width >= width and p.thickness >= thickness)
+        available = sum(s[0] + KERF for s in stock if s[1] >= width and s[2] >= thickness)
+        if needed > available:
+            return False
+    return True
+
+
+@lru_cache(maxsize=65536)
+def _fits(stock, parts):
+    # stock: ((length, width, thickness), ...) longest first
+    # parts: (Part, ...) largest first
+    if not _capacity_ok(stock, parts):
+        return False
+
+    compatible = {part: [idx for idx, (_, width, thickness) in enumerate(stock)
+                         if part.width <= width and part.thickness <= thickness]
+                  for part in set(parts)}
+
+    # Best-fit decreasing settles almost every case without searching
+    remaining = [s[0] for s in stock]
+    for part in parts:
+        options = [idx for idx in compatible[part] if part.length <= remaining[idx]]
+        if not options:
+            break
+        idx = min(options, key=remaining.__getitem__)
+        remaining[idx] -= part.length + KERF
+    else:
+        return True
+
+    # Exact search with a node budget; running out counts as "does not fit"
+    budget = [PACKING_BUDGET]
+    remaining = [s[0] for s in stock]
+
+    def place(i, first_board):
+        if i == len(parts):
+            return True
+        budget[0] -= 1
+        if budget[0] < 0:
+            return False
+        part = parts[i]
+        cut = part.length + KERF
+        tried = set()
+        for idx in compatible[part]:
+            if idx < first_board or part.length > remaining[idx]:
+                continue
+            state = (remaining[idx], stock[idx][1], stock[idx][2])
+            if state in tried:
+                continue
+            tried.add(state)
+            remaining[idx] -= cut
+            # Identical strips are interchangeable: keep them in board order
+            same_next = i + 1 < len(parts) and parts[i + 1] == part
+            if place(i + 1, idx if same_next else 0):
+                return True
+            remaining[idx] += cut
+        return False
+
+    return place(0, 0)
+
+
+def can_cut(boards, parts):
+    # Whether every part can be cut from `boards` (anything with a length,
+    # width and thickness; one species). A strip fits while the board has its
+    # length left; the kerf of the cut comes off what remains after it.
+    stock = tuple(sorted(((board.length, board.width, board.thickness) for board in boards), reverse=True))
+    return _fits(stock, tuple(sorted(parts, reverse=True)))
+
+
+def _group_stock(boards):
+    groups = {}
+    for board in boards:
+        groups.setdefault(board.species, []).append((board.length, board.width, board.thickness))
+    return tuple(sorted((species, tuple(sorted(stock, reverse=True))) for species, stock in groups.items()))
+
+
+@lru_cache(maxsize=65536)
+def _combination_fits(groups, products):
+    # groups: ((species, stock), ...); each product goes to one species group
+    stocks = dict(groups)
+    species = list(stocks)
+
+    def assign(i, chosen):
+        if i == len(products):
+            for name in species:
+                parts = [p for product, home in zip(products, chosen) if home == name for p in CATALOG[product]]
+                if parts and not _fits(stocks[name], tuple(sorted(parts, reverse=True))):
+                    return False
+            return True
+        for name in species:
+            chosen.append(name)
+            if assign(i + 1, chosen):
+                return True
+            chosen.pop()
+        return False
+
+    return assign(0, [])
+
+
+def _plural(name):
+    if name.endswith("lf"):
+        return name[:-1] + "ves"
+    return name + "es" if name.endswith(("x", "s", "ch")) else name + "s"
+
+
+def _label(products):
+    counts = {}
+    for product in products:
+        counts[product] = counts.get(product, 0) + 1
+    names = [f"{count} {_plural(name)}" if count > 1 else name for name, count in counts.items()]
+    return " + ".join(names)
+
+
+def plan_reuse(boards, limit=3, catalog=None):
+    # Best combinations of catalog products that fit in `boards`, most wood
+    # used first. Only maximal combinations are returned - if "Chair + Stool"
+    # fits, plain "Chair" is not listed as well.
+    names = list(catalog or CATALOG)
+    groups = _group_stock(boards)
+    total = _volume(boards) if boards else 0
+    if not groups:
+        return []
+
+    maximal = []
+
+    def grow(combo, start):
+        extended = False
+        if len(combo) < MAX_ITEMS:
+            for idx in range(start, len(names)):
+                candidate = combo + [names[idx]]
+                if _combination_fits(groups, tuple(candidate)):
+                    extended = True
+                    grow(candidate, idx)
+        if combo and not extended:
+            maximal.append(tuple(combo))
+
+    grow([], 0)
+
+    plans = []
+    for combo in maximal:
+        used = sum(_volume(CATALOG[product]) for product in combo)
+        plans.append(ReusePlan(_label(combo), combo, used, round(100 * used / total)))
+    plans.sort(key=lambda plan: (-plan.wood_used, plan.label))
+    return plans[:limit]
+
+
+@memoize()
+def plan_for_product(product, good_wood, wood=None, limit=3):
+    return tuple(plan_reuse(recovered_boards(product, good_wood, wood), limit))
+
+
+def leftover_boards(boards, products):
+    # What is left of `boards` once `products` are cut from them, placed best
+    # fit decreasing like the first pass of _fits. Offcuts too short to use
+    # again are dropped.
+    remaining = [list(board) for board in sorted(boards, reverse=True)]
+    parts = sorted((part for product in products for part in CATALOG[product]), reverse=True)
+    for part in parts:
+        options = [board for board in remaining
+                   if part.width <= board[1] and part.thickness <= board[2] and part.length <= board[0]]
+        if options:
+            min(options, key=lambda board: board[0])[0] -= part.length + KERF
+    return [Board(round(board[0], 1), *board[1:]) for board in remaining if board[0] >= MIN_OFFCUT]
+
+
+def _plan_one(item):
+    boards, limit = item
+    return plan_reuse(boards, limit)
+
+
+def plan_batch(inventories, limit=3, workers=None):
+    # Plans for many returned pieces at once. With `workers` the inventories
+    # are spread over that many processes; otherwise they share this
+    # process's packing cache, which pays off when many pieces look alike.
+    items = [(list(boards), limit) for boards in inventories]
+    if not workers or workers <= 1:
+        return [_plan_one(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return list(pool.map(_plan_one, items, chunksize=max(1, len(items) // (workers * 4))))
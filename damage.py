@@ -0,0 +1,113 @@
+# IN SPACE FURNITURE - DAMAGE ESTIMATION ENGINE
+#
+# Turns the Step 7 photos (one per angle) into "good wood remaining".
+# Every photo is decoded straight at analysis size, the whole set is stacked
+# into one array and each 16x16 tile is classified as sound, stained, cracked
+# or infested - or as background when it is not wood at all. Decoding runs on
+# a small thread pool (Pillow releases the GIL), the rest is vectorized NumPy
+# over the full batch.
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+
+ANALYSIS_SIZE = 256
+TILE = 16
+
+SOUND, STAINED, CRACKED, INFESTED, BACKGROUND = range(5)
+DAMAGE_CLASSES = {STAINED: "stained", CRACKED: "cracked", INFESTED: "infested"}
+
+_decoder = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="photo-decode")
+
+
+class NoWoodVisible(ValueError):
+    pass
+
+
+def load_photo(data, size=ANALYSIS_SIZE):
+    # data: encoded bytes, a file path, or a photo already decoded at
+    # analysis size (photos.PhotoStore.analysis)
+    if isinstance(data, np.ndarray):
+        return data
+    image = Image.open(data if isinstance(data, str) else io.BytesIO(data))
+    # JPEGs decode at 1/2, 1/4 or 1/8 scale straight away - far cheaper than
+    # decoding a phone-camera frame in full and shrinking it afterwards
+    image.draft("RGB", (size, size))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    return np.asarray(image.resize((size, size), Image.BOX), dtype=np.uint8)
+
+
+def load_batch(photos):
+    return np.stack(list(_decoder.map(load_photo, photos)))
+
+
+def _tile_mean(values):
+    n, h, w = values.shape
+    return values.reshape(n, h // TILE, TILE, w // TILE, TILE).mean(axis=(2, 4))
+
+
+def classify_tiles(batch):
+    # batch: (N, H, W, 3) uint8 -> (N, H/TILE, W/TILE) array of class ids
+    rgb = batch.astype(np.float32) / 255.0
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    value = rgb.max(axis=-1)
+    saturation = (value - rgb.min(axis=-1)) / np.maximum(value, 1e-6)
+
+    # Darkness is judged against each photo's own typical brightness, so a
+    # dim garage shot is not mistaken for one big stain
+    median = np.median(value.reshape(len(batch), -1), axis=1)[:, None, None]
+    dark = value < 0.6 * median
+
+    grad_x = np.abs(np.diff(value, axis=2, append=value[:, :, -1:]))
+    grad_y = np.abs(np.diff(value, axis=1, append=value[:, -1:, :]))
+    # Dark pixels on a sharp edge: the rims of cracks and bore holes
+    mark = dark & ((grad_x + grad_y) > 0.1)
+
+    # Wood is warm (red >= green >= blue) and at least a little saturated;
+    # dark pixels count too since damage rarely keeps its colour
+    woody = ((red >= green) & (green >= blue * 0.9) & (saturation > 0.12)) | dark
+
+    wood_share = _tile_mean(woody.astype(np.float32))
+    dark_share = _tile_mean(dark.astype(np.float32))
+    mark_share = _tile_mean(mark.astype(np.float32))
+    # Cracks run one way, so their edges are strongly directional; the rims
+    # of bore holes point every way
+    edge_x = _tile_mean(grad_x * mark)
+    edge_y = _tile_mean(grad_y * mark)
+    anisotropy = np.abs(edge_x - edge_y) / np.maximum(edge_x + edge_y, 1e-6)
+
+    labels = np.full(wood_share.shape, SOUND, dtype=np.uint8)
+    labels[dark_share >= 0.45] = STAINED
+    marked = (mark_share >= 3 / TILE ** 2) & (dark_share < 0.45)
+    labels[marked & (anisotropy >= 0.35)] = CRACKED
+    labels[marked & (anisotropy < 0.35)] = INFESTED
+    labels[wood_share < 0.5] = BACKGROUND
+    return labels
+
+
+def estimate_damage(photos, angles=None):
+    # photos: list of encoded images (bytes); angles: matching labels
+    if not photos:
+        raise NoWoodVisible("no photos to analyze")
+    labels = classify_tiles(load_batch(photos))
+
+    counts = np.stack([(labels == cls).sum(axis=(1, 2)) for cls in range(BACKGROUND)], axis=1)
+    wood_tiles = int(counts.sum())
+    if wood_tiles == 0:
+        raise NoWoodVisible("no wood found in the photos")
+
+    totals = counts.sum(axis=0)
+    good_wood = int(round(100 * totals[SOUND] / wood_tiles))
+    per_angle = {}
+    for idx, angle in enumerate(angles or range(len(photos))):
+        wood_here = counts[idx].sum()
+        per_angle[angle] = int(round(100 * counts[idx, SOUND] / wood_here)) if wood_here else None
+
+    return {
+        'good_wood_left': good_wood,
+        'damage_percentage': 100 - good_wood,
+        'damage_breakdown': {name: int(round(100 * totals[cls] / wood_tiles)) for cls, name in DAMAGE_CLASSES.items()},
+        'good_wood_by_angle': per_angle
+    }
@@ -0,0 +1,163 @@
+# IN SPACE FURNITURE - DESIGN COMPOSITION ENGINE
+#
+# Step 4 turns any set of the eight design elements into one scene: a
+# harmony score from how well the elements go together, an arrangement that
+# gives every element its place (sky, backdrop, foreground, ground, water,
+# border) and an SVG preview of the result. Some pairs make a motif of their
+# own - the lion resting under a tree of peacock feathers is the classic.
+#
+# There are only 2^8 selections, so every composition is worked out once per
+# process and looked up by the frozen selection afterwards.
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations
+
+Element = namedtuple("Element", ["icon", "layer", "themes", "colour"])
+Placed = namedtuple("Placed", ["name", "icon", "x", "y", "size"])
+Composition = namedtuple("Composition", ["names", "title", "story", "setting", "score", "clashes", "placed", "svg"])
+
+ELEMENTS = {
+    "Peacock": Element("🦚", "figure", {"nature", "bird", "royal"}, "#1b7f8c"),
+    "Lion": Element("🦁", "figure", {"nature", "jungle", "royal"}, "#c8962a"),
+    "Flowers": Element("🌸", "ground", {"nature", "garden"}, "#d0507a"),
+    "Tree": Element("🌳", "backdrop", {"nature", "jungle", "garden"}, "#3c783c"),
+    "Geometric": Element("✨", "border", {"modern"}, "#5a5a6e"),
+    "Birds": Element("🐦", "sky", {"nature", "bird", "sky"}, "#6ea0c8"),
+    "Moon & Stars": Element("🌙", "sky", {"night", "sky"}, "#e6dc96"),
+    "Waves": Element("🌊", "water", {"water", "night"}, "#285aaa"),
+}
+DESIGN_NAMES = list(ELEMENTS)
+
+# Pairs that become one motif: (title, what the customer sees)
+MOTIFS = [
+    ({"Peacock", "Lion"}, "Lion under Peacock-Tree", "🦁 Lion sitting under 🌳 tree made from peacock feathers"),
+    ({"Birds", "Tree"}, "Birds Nesting in the Tree", "🐦 Birds nesting in the branches of the 🌳 tree"),
+    ({"Moon & Stars", "Waves"}, "Moonlit Sea", "🌙 Moon rising over the 🌊 waves"),
+    ({"Peacock", "Flowers"}, "Peacock in Bloom", "🦚 Peacock strutting through 🌸 flowers"),
+    ({"Lion", "Tree"}, "Jungle King", "🦁 Lion resting in the shade of the 🌳 jungle"),
+    ({"Birds", "Waves"}, "Gulls over the Sea", "🐦 Birds gliding over the 🌊 waves"),
+]
+MOTIF_BONUS = 0.3
+CLASH_BELOW = 0.5
+
+WIDTH, HEIGHT = 400, 240
+
+
+def _pair_score(a, b):
+    # 0..1: shared themes make elements belong together, a known motif even
+    # more so; elements with nothing in common (modern vs nature) sit apart
+    first, second = ELEMENTS[a], ELEMENTS[b]
+    shared = len(first.themes & second.themes) / len(first.themes | second.themes)
+    score = 0.45 + 0.55 * shared
+    if any({a, b} == pair for pair, _, _ in MOTIFS):
+        score += MOTIF_BONUS
+    return min(1.0, score)
+
+
+PAIR_SCORES = {frozenset(pair): _pair_score(*pair) for pair in combinations(DESIGN_NAMES, 2)}
+
+
+def _setting(names):
+    if "Moon & Stars" in names:
+        return "Night"
+    if "Waves" in names:
+        return "Seaside"
+    if {"Lion", "Tree"} & set(names):
+        return "Jungle"
+    if {"Flowers", "Peacock"} & set(names):
+        return "Garden"
+    return "Open sky" if names else "Plain"
+
+
+def _arrange(names, motifs):
+    # Every element gets a slot on its layer; a motif pulls its pair together
+    placed = []
+    peacock_tree = "Lion under Peacock-Tree" in motifs
+    sky = [n for n in names if ELEMENTS[n].layer == "sky"]
+    for idx, name in enumerate(sky):
+        placed.append(Placed(name, ELEMENTS[name].icon, 70 + idx * 260 / max(1, len(sky)), 50, 34))
+    if "Tree" in names or peacock_tree:
+        placed.append(Placed("Tree", ELEMENTS["Tree"].icon, 200, 105, 80))
+    figures = [n for n in names if ELEMENTS[n].layer == "figure" and not (peacock_tree and n == "Peacock")]
+    slots = [200] if len(figures) == 1 or peacock_tree else [135, 265]
+    for name, x in zip(figures, slots):
+        placed.append(Placed(name, ELEMENTS[name].icon, x, 165, 48))
+    if "Flowers" in names:
+        for x in (60, 130, 270, 340):
+            placed.append(Placed("Flowers", ELEMENTS["Flowers"].icon, x, 205, 24))
+    return tuple(placed)
+
+
+def _svg(names, setting, placed, peacock_tree):
+    night = setting == "Night"
+    sky_top, sky_bottom = ("#1d2545", "#3b3f6b") if night else ("#bfe3f5", "#f6efe0")
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" width="{WIDTH}" height="{HEIGHT}">',
+        f'<defs><linearGradient id="sky" x1="0" y1="0" x2="0" y2="1"><stop offset="0" stop-color="{sky_top}"/>'
+        f'<stop offset="1" stop-color="{sky_bottom}"/></linearGradient></defs>',
+        f'<rect width="{WIDTH}" height="{HEIGHT}" fill="url(#sky)"/>',
+    ]
+    if "Waves" in names:
+        crest = " ".join("q 25 -14 50 0 t 50 0" for _ in range(WIDTH // 100 + 1))
+        parts.append(f'<path d="M0 200 {crest} V{HEIGHT} H0 Z" fill="{ELEMENTS["Waves"].colour}" opacity="0.85"/>')
+    else:
+        parts.append(f'<rect y="195" width="{WIDTH}" height="45" fill="#8fb573" opacity="0.6"/>')
+    if night:
+        for x, y in ((40, 30), (120, 60), (300, 25), (360, 70), (250, 45)):
+            parts.append(f'<circle cx="{x}" cy="{y}" r="1.8" fill="#fff8d0"/>')
+    for item in placed:
+        if item.name == "Tree":
+            canopy = ELEMENTS["Peacock"].colour if peacock_tree else ELEMENTS["Tree"].colour
+            parts.append(f'<rect x="{item.x - 8}" y="{item.y + 20}" width="16" height="60" fill="#7a5230"/>')
+            parts.append(f'<circle cx="{item.x}" cy="{item.y}" r="48" fill="{canopy}"/>')
+            if peacock_tree:
+                # Feather eyes in the canopy
+                for dx, dy in ((-25, -15), (20, -25), (0, 10), (28, 12), (-30, 18)):
+                    parts.append(f'<circle cx="{item.x + dx}" cy="{item.y + dy}" r="7" fill="#2a9d8f"/>'
+                                 f'<circle cx="{item.x + dx}" cy="{item.y + dy}" r="3" fill="#14213d"/>')
+            continue
+        parts.append(f'<ellipse cx="{item.x:.0f}" cy="{item.y + item.size * 0.45:.0f}" rx="{item.size * 0.45:.0f}" '
+                     f'ry="{item.size * 0.1:.0f}" fill="#000" opacity="0.15"/>')
+        parts.append(f'<text x="{item.x:.0f}" y="{item.y:.0f}" font-size="{item.size}" text-anchor="middle" '
+                     f'dominant-baseline="middle">{item.icon}</text>')
+    if "Geometric" in names:
+        colour = ELEMENTS["Geometric"].colour
+        for x in range(0, WIDTH, 20):
+            parts.append(f'<path d="M{x} 0 l10 10 l10 -10 Z M{x} {HEIGHT} l10 -10 l10 10 Z" fill="{colour}"/>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def _compose(selection):
+    names = tuple(name for name in DESIGN_NAMES if name in selection)
+    matched = [(pair, title, story) for pair, title, story in MOTIFS if pair <= set(names)]
+    pairs = [PAIR_SCORES[frozenset(pair)] for pair in combinations(names, 2)]
+    score = round(100 * sum(pairs) / len(pairs)) if pairs else (100 if names else 0)
+    clashes = tuple(pair for pair in combinations(names, 2) if PAIR_SCORES[frozenset(pair)] < CLASH_BELOW)
+
+    if matched:
+        title = " & ".join(title for _, title, _ in matched[:2])
+    else:
+        title = " + ".join(names) or "Plain"
+    # Motifs first, then whatever is not part of one
+    in_motif = set().union(*(pair for pair, _, _ in matched))
+    story = tuple(story for _, _, story in matched) + tuple(f"{ELEMENTS[n].icon} {n}" for n in names if n not in in_motif)
+    setting = _setting(names)
+    titles = [title for _, title, _ in matched]
+    placed = _arrange(names, titles)
+    svg = _svg(names, setting, placed, "Lion under Peacock-Tree" in titles)
+    return Composition(names, title, story, setting, score, clashes, placed, svg)
+
+
+@lru_cache(maxsize=1)
+def all_compositions():
+    # Every one of the 256 selections, keyed by frozenset of element names
+    compositions = {}
+    for size in range(len(DESIGN_NAMES) + 1):
+        for names in combinations(DESIGN_NAMES, size):
+            compositions[frozenset(names)] = _compose(frozenset(names))
+    return compositions
+
+
+def compose(selection):
+    return all_compositions()[frozenset(name for name in selection if name in ELEMENTS)]
@@ -0,0 +1,94 @@
+# IN SPACE FURNITURE - STEP FLOW
+#
+# The eight steps as an explicit state machine. Navigation buttons name an
+# action instead of setting `current_step` themselves; the action is checked
+# against the step the customer is on, and against its guard, before it
+# moves them on. The app runs actions as on_click callbacks, which Streamlit
+# calls before the script - so a click costs exactly one script run and no
+# st.rerun() is needed. Fields an action sets are checked together with it
+# and only written once the move is allowed, so a refused click changes
+# nothing.
+from collections import ChainMap, namedtuple
+
+STEP_NAMES = {
+    1: "Choose product",
+    2: "Location analysis",
+    3: "Scan room",
+    4: "Design studio",
+    5: "AR preview",
+    6: "Order",
+    7: "Damage report",
+    8: "Transform",
+}
+
+# guard(state) returns why the move is not allowed yet, or None
+Transition = namedtuple("Transition", ["source", "target", "guard"])
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def _product_chosen(state):
+    return None if state['selected_product'] else "Choose a product first"
+
+
+def _wood_recommended(state):
+    return None if state['recommended_wood'] else "Enter your city first"
+
+
+def _order_placed(state):
+    return None if state['order_placed'] else "Please place an order first"
+
+
+def _wood_left(state):
+    if state['good_wood_left'] > 0 and state['possible_products']:
+        return None
+    return "Analyze the damage first"
+
+
+TRANSITIONS = {
+    'choose_product': Transition(1, 2, _product_chosen),
+    'scan_room': Transition(2, 3, _wood_recommended),
+    'design': Transition(3, 4, None),
+    'preview': Transition(4, 5, None),
+    'order': Transition(5, 6, None),
+    'circular_service': Transition(6, 7, _order_placed),
+    'back_to_order': Transition(7, 6, None),
+    'transform': Transition(7, 8, _wood_left),
+    'restart': Transition(8, 1, None),
+}
+
+# Fields a transition clears as the customer moves on
+RESETS = {
+    'restart': ('selected_product', 'selected_designs', 'ai_transformation', 'current_design',
+                'order_placed', 'order_date', 'order_total', 'order_reclaimed', 'order_key',
+                'damage_percentage', 'good_wood_left', 'damage_breakdown', 'good_wood_by_angle',
+                'possible_products', 'reuse_plans', 'damage_photos', 'photo_angle', 'last_created'),
+}
+
+
+def check(state, action, updates=None):
+    # The transition for `action` as if `updates` were applied; raises
+    # InvalidTransition without touching `state`
+    transition = TRANSITIONS.get(action)
+    if transition is None:
+        raise InvalidTransition(f"Unknown action: {action}")
+    view = ChainMap(updates or {}, state)
+    if view['current_step'] != transition.source:
+        raise InvalidTransition(
+            f"Cannot {action.replace('_', ' ')} from step {view['current_step']} "
+            f"({STEP_NAMES.get(view['current_step'], '?')})"
+        )
+    problem = transition.guard(view) if transition.guard else None
+    if problem:
+        raise InvalidTransition(problem)
+    return transition
+
+
+def advance(state, action, updates=None):
+    transition = check(state, action, updates)
+    state.update(updates or {})
+    state.reset(*RESETS.get(action, ()))
+    state['current_step'] = transition.target
+    return transition.target
@@ -0,0 +1,249 @@
+# IN SPACE FURNITURE - RECLAIMED WOOD INVENTORY
+#
+# Boards recovered in steps 7-8 that nobody used go into stock, with their
+# species, size, condition (good wood of the piece they came from) and where
+# they are. Step 6 asks for the nearest stock that can fill a whole order in
+# the customer's wood; the order is then priced with the reclaimed premium.
+#
+# Stock lives in SQLite (one row per board) and, for searching, in a
+# geo-grid held in memory: half-degree lat/lon cells, each holding a dict
+# per species. Adding or removing a board is O(1); a search walks rings of
+# cells outward from the customer and stops at the first ring that cannot
+# hold anything nearer than the boards it already has.
+#
+# Taking boards for an order is a single DELETE that must remove all of
+# them, so two orders can never get the same board even across processes.
+#
+#   python inventory.py import boards.csv   (species,length,width,thickness,condition,lat,lon)
+import argparse
+import csv
+import math
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from cutting import KERF, MIN_OFFCUT, can_cut, cut_list
+
+INVENTORY_DB_ENV = "INSPACE_INVENTORY_DB"
+DEFAULT_INVENTORY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "inventory.db")
+
+CELL_DEG = 0.5
+KM_PER_DEG = 111.2
+MAX_KM = 300  # stock further away costs more to move than it saves
+MIN_CONDITION = 60  # % good wood of the piece a board came from
+MAX_BOARDS = 40  # most boards one order is made from
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reclaimed (
+    board_id TEXT PRIMARY KEY,
+    species TEXT NOT NULL,
+    length REAL NOT NULL,
+    width REAL NOT NULL,
+    thickness REAL NOT NULL,
+    condition INTEGER NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    source TEXT,
+    added TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Sizes in cm, like cutting.Board; source is the lineage piece it came from
+Stock = namedtuple("Stock", ["board_id", "species", "length", "width", "thickness", "condition", "lat", "lon", "source"])
+# boards nearest first; distance_km is how far the furthest one is
+StockMatch = namedtuple("StockMatch", ["boards", "distance_km", "volume"])
+
+
+class StockTaken(Exception):
+    pass
+
+
+def _cell(lat, lon):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+class ReclaimedInventory:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(INVENTORY_DB_ENV) or DEFAULT_INVENTORY_DB
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._boards = {}  # board id -> Stock
+        self._grid = {}  # (cell, species) -> {board id: Stock}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        for row in self._conn.execute("SELECT " + ", ".join(Stock._fields) + " FROM reclaimed"):
+            self._index(Stock(*row))
+
+    def __len__(self):
+        return len(self._boards)
+
+    def _index(self, board):
+        self._boards[board.board_id] = board
+        self._grid.setdefault((_cell(board.lat, board.lon), board.species), {})[board.board_id] = board
+
+    def _unindex(self, board_id):
+        board = self._boards.pop(board_id, None)
+        if board is not None:
+            key = (_cell(board.lat, board.lon), board.species)
+            cell = self._grid[key]
+            del cell[board_id]
+            if not cell:
+                del self._grid[key]
+
+    # ========== CHANGES ==========
+    def add(self, boards, condition, lat, lon, source=None):
+        # boards: cutting.Board list; returns the new board ids
+        stock = [Stock(uuid.uuid4().hex, board.species, board.length, board.width, board.thickness,
+                       int(condition), lat, lon, source)
+                 for board in boards if board.length >= MIN_OFFCUT]
+        self.insert(stock)
+        return [board.board_id for board in stock]
+
+    def insert(self, stock):
+        added = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO reclaimed VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [board + (added,) for board in stock]
+                )
+            for board in stock:
+                self._index(board)
+
+    def take(self, board_ids):
+        # All or nothing: StockTaken if any board is already gone
+        board_ids = list(board_ids)
+        with self._lock:
+            with self._conn:
+                marks = ", ".join("?" * len(board_ids))
+                removed = self._conn.execute(f"DELETE FROM reclaimed WHERE board_id IN ({marks})", board_ids).rowcount
+                if removed != len(board_ids):
+                    # Someone else got there first: put the rest back and
+                    # forget what is no longer there
+                    self._conn.rollback()
+                    still_there = {row[0] for row in self._conn.execute(
+                        f"SELECT board_id FROM reclaimed WHERE board_id IN ({marks})", board_ids)}
+                    for board_id in board_ids:
+                        if board_id not in still_there:
+                            self._unindex(board_id)
+                    raise StockTaken(f"{len(board_ids) - removed} of {len(board_ids)} boards already taken")
+            for board_id in board_ids:
+                self._unindex(board_id)
+
+    # ========== SEARCH ==========
+    def nearest(self, species, lat, lon, fits=None, min_condition=MIN_CONDITION, max_km=MAX_KM):
+        # Boards of `species` in condition, nearest first, as far as max_km.
+        # Ring k of cells is searched before ring k + 1; once a ring is done,
+        # everything not yet seen is at least `bound` away.
+        center = _cell(lat, lon)
+        # A degree of longitude is shortest at the highest latitude reached
+        lon_km = KM_PER_DEG * math.cos(math.radians(min(89.0, abs(lat) + max_km / KM_PER_DEG)))
+        rings = math.ceil(max_km / (CELL_DEG * lon_km))
+        waiting = []
+        for ring in range(rings + 1):
+            for cell in _ring(center, ring):
+                for board in self._grid.get((cell, species), {}).values():
+                    if board.condition >= min_condition and (fits is None or fits(board)):
+                        distance = distance_km(lat, lon, board.lat, board.lon)
+                        if distance <= max_km:
+                            waiting.append((distance, board))
+            bound = ring * CELL_DEG * lon_km
+            waiting.sort(key=lambda item: item[0])
+            ready = 0
+            while ready < len(waiting) and waiting[ready][0] <= bound:
+                ready += 1
+            for item in waiting[:ready]:
+                yield item
+            del waiting[:ready]
+        yield from waiting
+
+    def match(self, product, species, lat, lon, min_condition=MIN_CONDITION, max_km=MAX_KM):
+        # Nearest boards that can fill the whole cut list of `product`, or None.
+        # A board is only taken while some strip size it could hold still
+        # lacks board length (the capacity test of cutting._capacity_ok), so
+        # nearby scraps do not crowd out the long boards an order needs. Like
+        # cutting.can_cut, a board holds a strip exactly as long as itself.
+        parts = cut_list(product)
+        shapes = set(parts)
+        needed = {(part.width, part.thickness): sum(p.length + KERF for p in parts
+                                                    if p.width >= part.width and p.thickness >= part.thickness)
+                  for part in shapes}
+        supplied = dict.fromkeys(needed, 0)
+
+        def holds_a_part(board):
+            return any(part.length <= board.length and part.width <= board.width
+                       and part.thickness <= board.thickness for part in shapes)
+
+        with self._lock:
+            chosen = []
+            for distance, board in self.nearest(species, lat, lon, holds_a_part, min_condition, max_km):
+                short = [size for size in needed if supplied[size] < needed[size]
+                         and board.width >= size[0] and board.thickness >= size[1]]
+                if not short and any(supplied[size] < needed[size] for size in needed):
+                    continue
+                chosen.append(board)
+                for width, thickness in needed:
+                    if board.width >= width and board.thickness >= thickness:
+                        supplied[width, thickness] += board.length + KERF
+                if all(supplied[size] >= needed[size] for size in needed) and can_cut(chosen, parts):
+                    volume = sum(b.length * b.width * b.thickness for b in chosen)
+                    return StockMatch(tuple(chosen), round(distance, 1), round(volume))
+                if len(chosen) == MAX_BOARDS:
+                    return None
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {'boards': len(self._boards), 'cells': len(self._grid)}
+
+    def close(self):
+        self._conn.close()
+
+
+def _ring(center, ring):
+    row, col = center
+    if ring == 0:
+        yield center
+        return
+    for dc in range(-ring, ring + 1):
+        yield row - ring, col + dc
+        yield row + ring, col + dc
+    for dr in range(-ring + 1, ring):
+        yield row + dr, col - ring
+        yield row + dr, col + ring
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load reclaimed boards into the IN SPACE inventory")
+    parser.add_argument("command", choices=["import", "stats"])
+    parser.add_argument("files", nargs="*", help="CSV: species,length,width,thickness,condition,lat,lon")
+    args = parser.parse_args(argv)
+
+    inventory = ReclaimedInventory()
+    for path in args.files if args.command == "import" else ():
+        with open(path, newline="", encoding="utf-8") as f:
+            stock = [Stock(uuid.uuid4().hex, row["species"].strip(), float(row["length"]), float(row["width"]),
+                           float(row["thickness"]), int(row["condition"]), float(row["lat"]), float(row["lon"]),
+                           row.get("source"))
+                     for row in csv.DictReader(f)]
+        inventory.insert(stock)
+        print(f"{path}: {len(stock)} boards", file=sys.stderr)
+    print(inventory.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
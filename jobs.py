@@ -0,0 +1,136 @@
+# IN SPACE FURNITURE - BACKGROUND AI JOBS
+#
+# The AI damage analysis in step 7 runs on a bounded, process-wide thread pool
+# instead of inside the script thread. A session submits a job, keeps the job
+# id in `app_state` and polls it on later reruns; nothing waits on the result.
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from cutting import plan_for_product
+from damage import estimate_damage
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+UNKNOWN = "unknown"
+
+# state is one of the constants above; result/error are set once finished
+JobStatus = namedtuple("JobStatus", ["state", "result", "error"])
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class _Job:
+    __slots__ = ("kind", "session_id", "future", "cancel_event", "started", "finished_at")
+
+    def __init__(self, kind, session_id):
+        self.kind = kind
+        self.session_id = session_id
+        self.future = None
+        self.cancel_event = threading.Event()
+        self.started = False
+        self.finished_at = None
+
+
+class JobExecutor:
+    def __init__(self, max_workers=4, max_pending=32, result_ttl=600, on_finish=None):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        # on_finish(kind, seconds, outcome) is called as every job ends
+        self.on_finish = on_finish
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, session_id=None):
+        # `fn` gets a threading.Event as its last argument and should return
+        # early once it is set (the session was reset or the job cancelled)
+        with self._lock:
+            self._purge_expired()
+            if self.pending_count() >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} AI jobs already queued")
+            job_id = uuid.uuid4().hex
+            job = _Job(kind, session_id)
+            self._jobs[job_id] = job
+        job.future = self._pool.submit(self._run, job, fn, args)
+        return job_id
+
+    def _run(self, job, fn, args):
+        job.started = True
+        started = time.monotonic()
+        outcome = FAILED
+        try:
+            result = fn(*args, job.cancel_event)
+            outcome = CANCELLED if job.cancel_event.is_set() else DONE
+            return result
+        finally:
+            job.finished_at = time.monotonic()
+            if self.on_finish is not None:
+                self.on_finish(job.kind, job.finished_at - started, outcome)
+
+    def pending_count(self):
+        return sum(1 for job in self._jobs.values() if job.finished_at is None)
+
+    def poll(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.future is None:
+            return JobStatus(UNKNOWN, None, None)
+        if job.cancel_event.is_set() or job.future.cancelled():
+            return JobStatus(CANCELLED, None, None)
+        if not job.future.done():
+            return JobStatus(RUNNING if job.started else PENDING, None, None)
+        try:
+            return JobStatus(DONE, job.future.result(), None)
+        except CancelledError:
+            return JobStatus(CANCELLED, None, None)
+        except Exception as ex:
+            return JobStatus(FAILED, None, ex)
+
+    def cancel(self, job_id):
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.finished_at = time.monotonic()
+        return True
+
+    def cancel_session(self, session_id):
+        job_ids = [job_id for job_id, job in list(self._jobs.items()) if job.session_id == session_id]
+        for job_id in job_ids:
+            self.cancel(job_id)
+        return len(job_ids)
+
+    def forget(self, job_id):
+        self._jobs.pop(job_id, None)
+
+    def _purge_expired(self):
+        # Results nobody came back for (closed tabs) are dropped after a while
+        cutoff = time.monotonic() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+        self._pool.shutdown(wait=False)
+
+
+# ========== AI JOBS ==========
+def ai_analyze_damage(store, photos, product, wood, cancelled):
+    # photos: {angle: photo hash in `store`}, a photos.PhotoStore
+    if cancelled.is_set():
+        return None
+    report = estimate_damage([store.analysis(digest) for digest in photos.values()], list(photos))
+    plans = plan_for_product(product, report['good_wood_left'], wood)
+    report['possible_products'] = [plan.label for plan in plans]
+    report['reuse_plans'] = {plan.label: list(plan.products) for plan in plans}
+    return report
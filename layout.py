@@ -0,0 +1,195 @@
+# IN SPACE FURNITURE - ROOM LAYOUT ENGINE
+#
+# Step 3 lays the room out on a NumPy occupancy grid (3-inch cells), places
+# the furniture already there and then the new piece, trying both
+# orientations at every free position at once with summed-area tables.
+# Clearance comes from an exact Euclidean distance transform, computed
+# separably with broadcasting: every free cell learns how far it is from the
+# nearest wall or piece of furniture.
+#
+# Layouts are kept in the shared results cache (memo.py) per (room size, new
+# piece, furniture already there), so dragging a slider back to a size seen
+# before - by anyone - is free.
+from collections import namedtuple
+
+import numpy as np
+
+from memo import memoize
+
+CELL = 0.25  # feet per grid cell
+
+# (length, depth) in feet
+FOOTPRINTS = {
+    "Sofa": (7, 3),
+    "Chair": (2, 2),
+    "Bed": (6.5, 5),
+    "Table": (4, 2.5),
+    "Wardrobe": (4, 2),
+    "Desk": (4, 2),
+    "TV Unit": (5, 1.5),
+    "Small Sofa": (5, 2.5),
+    "Bookshelf": (3, 1),
+    "Coffee Table": (3.5, 2),
+    "Stool": (1.5, 1.5),
+    "Small Stool": (1, 1),
+    "Wall Shelf": (3, 1),
+}
+DEFAULT_FOOTPRINT = (2, 2)
+
+# What customers can say is already in the room
+EXISTING_FURNITURE = ["Sofa", "Bed", "Table", "Chair", "Wardrobe", "Desk", "TV Unit"]
+
+Placement = namedtuple("Placement", ["name", "x", "y", "width", "length", "rotated", "wall", "is_new"])
+# walking_space: clear width (ft) of the widest open floor area once the new
+# piece is in; options: alternative spots for the new piece, best first
+Layout = namedtuple("Layout", ["room_width", "room_length", "placements", "unplaced",
+                               "walking_space", "free_share", "options", "grid"])
+
+EMPTY, EXISTING, NEW = 0, 1, 2
+
+# Walking space (ft) that still counts as comfortable / usable
+ROOMY = 4
+TIGHT = 2
+
+
+def _cells(feet):
+    return max(1, int(round(feet / CELL)))
+
+
+def distance_to_obstacles(occupied):
+    # Exact Euclidean distance (feet) from every cell to the nearest occupied
+    # cell, with the walls just outside the grid counting as occupied
+    padded = np.pad(occupied, 1, constant_values=True)
+    rows, cols = padded.shape
+
+    # Squared distance to the nearest obstacle in the same row, from running
+    # "last obstacle seen" indices scanning left to right and right to left
+    # (the padded walls guarantee every row has one at each end)...
+    col_idx = np.arange(cols, dtype=np.int32)
+    left = np.maximum.accumulate(np.where(padded, col_idx, 0), axis=1)
+    right = np.minimum.accumulate(np.where(padded, col_idx, cols - 1)[:, ::-1], axis=1)[:, ::-1]
+    along_row = np.minimum(col_idx - left, right - col_idx) ** 2
+    row_idx = np.arange(rows, dtype=np.int32)
+    row_gap = (row_idx[:, None] - row_idx[None, :]) ** 2
+    # ...then the best row to take it from
+    squared = (along_row[None, :, :] + row_gap[:, :, None]).min(axis=1)
+    return np.sqrt(squared[1:-1, 1:-1]) * CELL
+
+
+def _window_sums(values, height, width):
+    # Sum of `values` under every height x width window, via a summed-area table
+    sat = np.pad(values, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    return sat[height:, width:] - sat[:-height, width:] - sat[height:, :-width] + sat[:-height, :-width]
+
+
+WALLS = ("north", "south", "west", "east")
+
+
+def _nearest_walls(grid_shape, height, width):
+    # For every top-left position of a height x width footprint, the index
+    # into WALLS of the wall it sits closest to
+    rows = np.arange(grid_shape[0] - height + 1)[:, None]
+    cols = np.arange(grid_shape[1] - width + 1)[None, :]
+    gaps = np.broadcast_arrays(rows, grid_shape[0] - height - rows, cols, grid_shape[1] - width - cols)
+    return np.argmin(np.stack(gaps), axis=0)
+
+
+def _candidates(occupied, clearance, footprint):
+    # Best free spot per (orientation, wall) for a (length, depth) footprint,
+    # cheapest first. Spots are scored by how much open floor they cover, so
+    # pieces settle against walls and each other and leave the middle free.
+    length, depth = footprint
+    shapes = [(_cells(depth), _cells(length))]
+    if shapes[0][0] != shapes[0][1]:
+        shapes.append(shapes[0][::-1])
+
+    found = []
+    for rotated, (height, width) in enumerate(shapes):
+        if height > occupied.shape[0] or width > occupied.shape[1]:
+            continue
+        free = _window_sums(occupied.astype(np.int32), height, width) == 0
+        cost = np.where(free, _window_sums(clearance, height, width), np.inf)
+        walls = _nearest_walls(occupied.shape, height, width)
+        for wall in range(len(WALLS)):
+            by_wall = np.where(walls == wall, cost, np.inf)
+            row, col = np.unravel_index(np.argmin(by_wall), by_wall.shape)
+            if np.isfinite(by_wall[row, col]):
+                found.append((by_wall[row, col], bool(rotated), WALLS[wall], row, col, height, width))
+    found.sort(key=lambda spot: spot[0])
+    return found
+
+
+def _walking_space(occupied):
+    if occupied.all():
+        return 0.0
+    clearance = distance_to_obstacles(occupied)
+    return round(max(0.0, 2 * float(clearance.max()) - CELL), 1)
+
+
+def _placement(name, spot, is_new):
+    _, rotated, wall, row, col, height, width = spot
+    return Placement(name, col * CELL, row * CELL, width * CELL, height * CELL, rotated, wall, is_new)
+
+
+def plan_layout(room_width, room_length, new_piece, existing=()):
+    # Shared through memo.py, keyed on the footprints as they are now
+    return _plan_layout(tuple(FOOTPRINTS.items()), room_width, room_length, new_piece, tuple(existing))
+
+
+@memoize()
+def _plan_layout(footprints, room_width, room_length, new_piece, existing):
+    footprints = dict(footprints)
+    grid = np.zeros((_cells(room_length), _cells(room_width)), dtype=np.uint8)
+    placements, unplaced = [], []
+
+    # Bigger pieces first: they have the fewest places to go
+    for name in sorted(existing, key=lambda n: -np.prod(footprints.get(n, DEFAULT_FOOTPRINT))):
+        occupied = grid != EMPTY
+        spots = _candidates(occupied, distance_to_obstacles(occupied), footprints.get(name, DEFAULT_FOOTPRINT))
+        if not spots:
+            unplaced.append(name)
+            continue
+        _, _, _, row, col, height, width = spots[0]
+        grid[row:row + height, col:col + width] = EXISTING
+        placements.append(_placement(name, spots[0], False))
+
+    # The new piece: the few cheapest spots are tried for real and ranked by
+    # the walking space they leave
+    occupied = grid != EMPTY
+    options = []
+    footprint = footprints.get(new_piece, DEFAULT_FOOTPRINT)
+    for spot in _candidates(occupied, distance_to_obstacles(occupied), footprint)[:4]:
+        _, _, _, row, col, height, width = spot
+        trial = occupied.copy()
+        trial[row:row + height, col:col + width] = True
+        options.append((_walking_space(trial), spot))
+    options.sort(key=lambda option: -option[0])
+
+    walking_space = 0.0
+    if options:
+        walking_space, spot = options[0]
+        _, _, _, row, col, height, width = spot
+        grid[row:row + height, col:col + width] = NEW
+        placements.append(_placement(new_piece, spot, True))
+    else:
+        unplaced.append(new_piece)
+
+    grid.setflags(write=False)
+    return Layout(room_width, room_length, tuple(placements), tuple(unplaced), walking_space,
+                  round(100 * float((grid == EMPTY).mean())),
+                  tuple((space, _placement(new_piece, spot, True)) for space, spot in options), grid)
+
+
+def walking_verdict(walking_space):
+    if walking_space >= ROOMY:
+        return "perfect"
+    return "limited" if walking_space >= TIGHT else "cramped"
+
+
+LAYOUT_COLOURS = np.array([[245, 240, 230], [160, 160, 160], [42, 92, 61]], dtype=np.uint8)
+
+
+def layout_image(layout, scale=4):
+    # Top-down floor plan: free floor, furniture already there, the new piece
+    image = LAYOUT_COLOURS[layout.grid]
+    return np.repeat(np.repeat(image, scale, axis=0), scale, axis=1)
@@ -0,0 +1,202 @@
+# IN SPACE FURNITURE - WOOD LINEAGE STORE
+#
+# Append-only record of every piece of furniture and of what it was made
+# from, so "WOOD'S JOURNEY" survives resets and can be queried across
+# customers. Pieces are nodes, Sofa -> Chair -> Frame transitions are edges,
+# and every piece carries the id of the wood batch it ultimately came from.
+#
+# SQLite in WAL mode: readers never wait for the writer. All writes go
+# through one writer thread that commits them in groups (group commit), so a
+# burst of Step 8 clicks costs one fsync rather than one each.
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+LINEAGE_DB_ENV = "INSPACE_LINEAGE_DB"
+DEFAULT_LINEAGE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lineage.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pieces (
+    piece_id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    product TEXT NOT NULL,
+    wood TEXT,
+    created TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pieces_by_batch ON pieces (batch_id, created);
+
+CREATE TABLE IF NOT EXISTS transitions (
+    child_id TEXT PRIMARY KEY,
+    parent_id TEXT NOT NULL,
+    wood_used INTEGER,
+    design TEXT,
+    created TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS transitions_by_parent ON transitions (parent_id, child_id);
+"""
+
+ANCESTRY_SQL = """
+WITH RECURSIVE chain(child_id, parent_id, wood_used, design, created, depth) AS (
+    SELECT child_id, parent_id, wood_used, design, created, 0
+    FROM transitions WHERE child_id = ?
+    UNION ALL
+    SELECT t.child_id, t.parent_id, t.wood_used, t.design, t.created, chain.depth + 1
+    FROM transitions t JOIN chain ON t.child_id = chain.parent_id
+)
+SELECT chain.created, parent.product, child.product, chain.wood_used, chain.design,
+       chain.parent_id, chain.child_id
+FROM chain
+JOIN pieces parent ON parent.piece_id = chain.parent_id
+JOIN pieces child ON child.piece_id = chain.child_id
+ORDER BY chain.depth DESC
+"""
+
+DESCENDANTS_SQL = """
+WITH RECURSIVE tree(piece_id, depth) AS (
+    SELECT child_id, 1 FROM transitions WHERE parent_id = ?
+    UNION ALL
+    SELECT t.child_id, tree.depth + 1 FROM transitions t JOIN tree ON t.parent_id = tree.piece_id
+)
+SELECT pieces.piece_id, pieces.product, pieces.wood, pieces.created, tree.depth
+FROM tree JOIN pieces ON pieces.piece_id = tree.piece_id
+ORDER BY tree.depth, pieces.created
+"""
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class LineageStore:
+    def __init__(self, path=None, batch_size=512, flush_interval=0.005):
+        self.path = path or os.environ.get(LINEAGE_DB_ENV) or DEFAULT_LINEAGE_DB
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_loop, name="lineage-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ========== WRITES ==========
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            error = None
+            try:
+                with conn:
+                    for statements, _ in batch:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+            except sqlite3.Error as ex:
+                error = ex
+            for _, done in batch:
+                if done is not None:
+                    done.error = error
+                    done.set()
+            if stop:
+                break
+        conn.close()
+
+    def _append(self, statements, wait):
+        # The statements of one call always land in the same transaction
+        done = threading.Event() if wait else None
+        self._queue.put((statements, done))
+        if done is not None:
+            done.wait()
+            if done.error is not None:
+                raise done.error
+
+    def add_piece(self, product, wood=None, batch_id=None, wait=True):
+        # A brand-new piece starts its own wood batch unless told otherwise
+        piece_id = uuid.uuid4().hex
+        self._append([(
+            "INSERT INTO pieces (piece_id, batch_id, product, wood, created) VALUES (?, ?, ?, ?, ?)",
+            (piece_id, batch_id or piece_id, product, wood, _now())
+        )], wait)
+        return piece_id
+
+    def add_transition(self, parent_id, product, wood_used=None, design=None, wait=True):
+        parent = self.piece(parent_id)
+        if parent is None:
+            self.flush()
+            parent = self.piece(parent_id)
+        if parent is None:
+            raise KeyError(f"unknown piece {parent_id}")
+        child_id = uuid.uuid4().hex
+        created = _now()
+        self._append([
+            ("INSERT INTO pieces (piece_id, batch_id, product, wood, created) VALUES (?, ?, ?, ?, ?)",
+             (child_id, parent['batch_id'], product, parent['wood'], created)),
+            ("INSERT INTO transitions (child_id, parent_id, wood_used, design, created) VALUES (?, ?, ?, ?, ?)",
+             (child_id, parent_id, wood_used, design, created)),
+        ], wait)
+        return child_id
+
+    def flush(self):
+        self._append([], wait=True)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    # ========== READS ==========
+    def piece(self, piece_id):
+        row = self._reader().execute(
+            "SELECT piece_id, batch_id, product, wood, created FROM pieces WHERE piece_id = ?", (piece_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("piece_id", "batch_id", "product", "wood", "created"), row))
+
+    def ancestry(self, piece_id):
+        # Every transition that led to this piece, oldest first
+        rows = self._reader().execute(ANCESTRY_SQL, (piece_id,)).fetchall()
+        keys = ("date", "from", "to", "wood_used", "design", "from_id", "to_id")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def descendants(self, piece_id):
+        rows = self._reader().execute(DESCENDANTS_SQL, (piece_id,)).fetchall()
+        return [dict(zip(("piece_id", "product", "wood", "created", "generation"), row)) for row in rows]
+
+    def batch_pieces(self, batch_id):
+        # Everything ever made from one batch of wood, the original included
+        rows = self._reader().execute(
+            "SELECT piece_id, product, wood, created FROM pieces WHERE batch_id = ? ORDER BY created", (batch_id,)
+        ).fetchall()
+        return [dict(zip(("piece_id", "product", "wood", "created"), row)) for row in rows]
@@ -0,0 +1,214 @@
+# IN SPACE FURNITURE - CITY LOOKUP INDEX
+#
+# Step 2 resolves whatever the customer types into a known city, its aliases
+# or the closest spelling, and from there into a wood recommendation.
+# The index is built once per process (see `location_index` in app.py) and
+# answers prefix and typo-tolerant lookups without rescanning the city list.
+#
+# Extra cities are read from a CSV with `city,aliases,profile` columns, where
+# `aliases` is `|`-separated and `profile` names one of LOCATION_PROFILES
+# (blank means "no history yet"), plus optional `lat,lon`. Point
+# INSPACE_CITIES_CSV at it, or drop a `cities.csv` next to this file.
+import bisect
+import csv
+import os
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+from memo import changed, frozen, memoize
+
+DEFAULT_WOOD = "**Mango Wood**"
+
+# Built-in location histories and the wood they call for, used until real
+# history has been ingested for the city (see risk.py)
+LOCATION_PROFILES = {
+    "chennai": {"issues": ["High humidity (78%)", "Termite common"], "wood": "**Treated Teak**", "reason": "Water-resistant, termite-proof"},
+    "mumbai": {"issues": ["Bed bugs reported", "High humidity"], "wood": "**Bug-resistant Teak**", "reason": "Special coating prevents bugs"},
+    "delhi": {"issues": ["Dry conditions", "Termites"], "wood": "**Termite-proof Mango**", "reason": "Dense wood, natural resistance"},
+    "bangalore": {"issues": ["Moderate humidity"], "wood": "**Mango Wood**", "reason": "Sustainable, beautiful grain"}
+}
+
+BUILTIN_CITIES = [
+    ("Chennai", ["Madras"], "chennai", (13.08, 80.27)),
+    ("Mumbai", ["Bombay"], "mumbai", (19.08, 72.88)),
+    ("Delhi", ["New Delhi"], "delhi", (28.61, 77.21)),
+    ("Bangalore", ["Bengaluru"], "bangalore", (12.97, 77.59)),
+]
+
+CITIES_CSV_ENV = "INSPACE_CITIES_CSV"
+DEFAULT_CITIES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cities.csv")
+
+# kind is "exact", "alias" or "fuzzy"; profile is None for cities without history
+LocationMatch = namedtuple("LocationMatch", ["city", "profile", "kind"])
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().replace("-", " ").replace(".", " ").split())
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    # Optimal string alignment: Levenshtein plus swapping two neighbouring
+    # letters as one edit ("Dehli"), bailing out once every path is over
+    # `limit`. A swap reaches back two rows, so both are kept.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit and min(previous) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class LocationIndex:
+    # Trigrams shared by more than this share of all names say little about
+    # which city was meant, so they are skipped while gathering candidates.
+    COMMON_TRIGRAM_SHARE = 0.05
+    FUZZY_CANDIDATES = 20
+    CACHE_SIZE = 4096
+
+    def __init__(self):
+        self._keys = []        # normalized names and aliases, sorted
+        self._targets = {}     # normalized key -> (canonical city, is_alias)
+        self._profiles = {}    # canonical city -> profile dict or None
+        self._coords = {}      # canonical city -> (lat, lon)
+        self._postings = {}    # trigram -> list of key ids
+        # Answers are cached per index, so a rebuild or a dropped index
+        # takes its own cache with it
+        self.lookup = lru_cache(maxsize=self.CACHE_SIZE)(self._lookup)
+        self.complete = lru_cache(maxsize=self.CACHE_SIZE)(self._complete)
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def add(self, city, aliases=(), profile=None, coords=None):
+        # First writer wins for a name, so built-in histories loaded first
+        # are never shadowed by a CSV row for the same city
+        if self._profiles.get(city) is None:
+            self._profiles[city] = profile
+        if coords is not None:
+            self._coords.setdefault(city, coords)
+        for name, is_alias in [(city, False)] + [(a, True) for a in aliases]:
+            key = normalize(name)
+            if key and key not in self._targets:
+                self._targets[key] = (city, is_alias)
+
+    def build(self):
+        self._keys = sorted(self._targets)
+        self._postings = {}
+        for key_id, key in enumerate(self._keys):
+            for gram in _trigrams(key):
+                self._postings.setdefault(gram, []).append(key_id)
+        self.lookup.cache_clear()
+        self.complete.cache_clear()
+        changed("locations")
+        return self
+
+    def _lookup(self, query):
+        key = normalize(query)
+        if not key:
+            return None
+        if key in self._targets:
+            city, is_alias = self._targets[key]
+            return LocationMatch(city, self._profiles[city], "alias" if is_alias else "exact")
+        best = self._best_fuzzy(key)
+        if best is None:
+            return None
+        city, _ = self._targets[best]
+        return LocationMatch(city, self._profiles[city], "fuzzy")
+
+    def coords(self, city):
+        # (lat, lon) of a canonical city name, or None
+        return self._coords.get(city)
+
+    def _complete(self, prefix, limit=5):
+        key = normalize(prefix)
+        if not key:
+            return ()
+        cities = []
+        position = bisect.bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position].startswith(key):
+            city = self._targets[self._keys[position]][0]
+            position += 1
+            if city not in cities:
+                cities.append(city)
+                if len(cities) == limit:
+                    break
+        return tuple(cities)
+
+    def _best_fuzzy(self, key):
+        grams = _trigrams(key)
+        common = max(50, int(len(self._keys) * self.COMMON_TRIGRAM_SHARE))
+        postings = [self._postings[g] for g in grams if g in self._postings]
+        informative = [p for p in postings if len(p) <= common] or postings
+
+        shared = {}
+        for posting in informative:
+            for key_id in posting:
+                shared[key_id] = shared.get(key_id, 0) + 1
+        if not shared:
+            return None
+
+        candidates = sorted(shared, key=shared.get, reverse=True)[:self.FUZZY_CANDIDATES]
+        limit = max(1, len(key) // 4)
+        best, best_distance = None, limit + 1
+        for key_id in candidates:
+            distance = _edit_distance(key, self._keys[key_id], limit)
+            if distance < best_distance:
+                best, best_distance = self._keys[key_id], distance
+        return best
+
+
+def load_cities_csv(index, path):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            city = (row.get("city") or "").strip()
+            if not city:
+                continue
+            aliases = [a.strip() for a in (row.get("aliases") or "").split("|") if a.strip()]
+            profile = LOCATION_PROFILES.get((row.get("profile") or "").strip().lower())
+            try:
+                coords = (float(row["lat"]), float(row["lon"]))
+            except (KeyError, TypeError, ValueError):
+                coords = None
+            index.add(city, aliases, profile, coords)
+    return index
+
+
+def load_location_index(path=None):
+    index = LocationIndex()
+    for city, aliases, profile, coords in BUILTIN_CITIES:
+        index.add(city, aliases, LOCATION_PROFILES[profile], coords)
+    path = path or os.environ.get(CITIES_CSV_ENV) or DEFAULT_CITIES_CSV
+    if os.path.exists(path):
+        load_cities_csv(index, path)
+    return index.build()
+
+
+@memoize("locations", "risk")
+def recommend_wood(index, location, risks=None):
+    # (city to show, wood to use, match) for what the customer typed. A
+    # fuzzy guess without a history does not replace the typed name. With a
+    # risk table, ingested history takes over from the built-in profile.
+    match = index.lookup(location)
+    history = risks.profile(match.city if match else location) if risks is not None else None
+    if history:
+        match = (match or LocationMatch(history['city'], None, "exact"))._replace(profile=history)
+    if match and match.profile:
+        return match.city, match.profile['wood'], match._replace(profile=frozen(match.profile))
+    known = match and match.kind != "fuzzy"
+    return (match.city if known else location), DEFAULT_WOOD, match
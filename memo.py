@@ -0,0 +1,120 @@
+# IN SPACE FURNITURE - SHARED RESULTS CACHE
+#
+# The wood recommendation, room layout, price breakdown and reuse plans are
+# pure functions of what the customer chose and of a few lookup tables, so
+# one result serves every session that asks the same question: the third
+# customer from Chennai with a Sofa in a 15x12 room costs a dictionary
+# lookup.
+#
+# One process-wide LRU with a TTL replaces the per-function lru_caches: it
+# is bounded in entries, forgets results after TTL_SECONDS and counts hits
+# and misses per function (exported by metrics.py). Functions name the
+# tables they read; `changed(table)` drops every result built from it, and
+# a result computed while its table changed is not stored. Lookup tables
+# kept as module dicts are instead passed in as a hashable snapshot, so an
+# edited price or footprint is a different key; read-only tables change
+# only when Streamlit reloads their module, which gives the new functions a
+# fresh part of the cache. Results are shared between sessions, so they are
+# immutable: tuples, namedtuples, read-only arrays or `frozen` mappings.
+import functools
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+MAX_ENTRIES = 4096
+TTL_SECONDS = 600
+
+
+class ResultCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (function, args) -> (expires, value)
+        self._readers = {}  # table -> functions that read it
+        self._versions = {}  # table -> times it changed
+        self._counts = {}  # function name -> [hits, misses]
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expired = 0
+        self.invalidated = 0
+
+    def memoize(self, *tables):
+        # Arguments must be hashable and results immutable
+        def decorate(fn):
+            name = fn.__name__.lstrip("_")
+            with self._lock:
+                self._counts.setdefault(name, [0, 0])
+                for table in tables:
+                    self._readers.setdefault(table, set()).add(fn)
+
+            @functools.wraps(fn)
+            def cached(*args, **kwargs):
+                key = (fn, args, tuple(sorted(kwargs.items())))
+                now = time.monotonic()
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        if entry[0] > now:
+                            self._entries.move_to_end(key)
+                            self._counts[name][0] += 1
+                            return entry[1]
+                        del self._entries[key]
+                        self.expired += 1
+                    self._counts[name][1] += 1
+                    versions = tuple(self._versions.get(table, 0) for table in tables)
+
+                value = fn(*args, **kwargs)
+
+                with self._lock:
+                    if versions == tuple(self._versions.get(table, 0) for table in tables):
+                        self._entries[key] = (now + self.ttl, value)
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+                            self.evictions += 1
+                return value
+
+            return cached
+        return decorate
+
+    def changed(self, table):
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            readers = self._readers.get(table, set())
+            stale = [key for key in self._entries if key[0] in readers]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(hits for hits, _ in self._counts.values())
+            misses = sum(misses for _, misses in self._counts.values())
+            stats = {'entries': len(self._entries), 'hits': hits, 'misses': misses,
+                     'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                     'evictions': self.evictions, 'expired': self.expired, 'invalidated': self.invalidated}
+            for name, (hits, misses) in sorted(self._counts.items()):
+                stats[f"{name}_hits"] = hits
+                stats[f"{name}_misses"] = misses
+        return stats
+
+
+def frozen(value):
+    # Read-only copy of nested dicts, lists and sets for a shared result
+    if isinstance(value, dict):
+        return MappingProxyType({key: frozen(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(frozen(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+RESULTS = ResultCache()
+memoize = RESULTS.memoize
+changed = RESULTS.changed
@@ -0,0 +1,315 @@
+# IN SPACE FURNITURE - RUN METRICS
+#
+# Optional instrumentation for app.py: wall time of every script run and of
+# the step block inside it, script runs per trigger (which button, widget or
+# live refresh caused them) and per session, time spent in AI calls and the
+# size of `app_state`. Everything is exported in the Prometheus text format,
+# served on a local port and/or rewritten to a file every few seconds.
+#
+# Profiling mode runs every script run under cProfile, with tracemalloc on,
+# and keeps the profile and a heap snapshot of the N slowest runs on disk -
+# open them with `python -m pstats` and `tracemalloc.Snapshot.load`.
+#
+# All of it is off unless one of the INSPACE_METRICS* / INSPACE_PROFILE
+# variables is set; switched off, every call is a no-op.
+import cProfile
+import heapq
+import json
+import os
+import pickle
+import threading
+import time
+import tracemalloc
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENV = "INSPACE_METRICS"  # "1" records metrics without exporting them
+METRICS_PORT_ENV = "INSPACE_METRICS_PORT"  # serve http://127.0.0.1:<port>/metrics
+METRICS_FILE_ENV = "INSPACE_METRICS_FILE"  # rewrite this file every few seconds
+PROFILE_ENV = "INSPACE_PROFILE"  # keep profiles of this many slowest runs
+PROFILE_DIR_ENV = "INSPACE_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles")
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+RERUN_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# name: (type, help)
+FAMILIES = {
+    'inspace_rerun_seconds': ("histogram", "Wall time of a whole script run, by step"),
+    'inspace_step_block_seconds': ("histogram", "Wall time of the step block inside a script run"),
+    'inspace_reruns_total': ("counter", "Script runs, by what triggered them"),
+    'inspace_session_reruns': ("histogram", "Script runs per session, over recently seen sessions"),
+    'inspace_ai_seconds': ("histogram", "Time spent in AI calls, by kind and outcome"),
+    'inspace_session_state_bytes': ("histogram", "Pickled size of app_state at the end of a script run"),
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _labels(labels, **extra):
+    pairs = sorted(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _histogram_lines(name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+        cumulative += count
+        yield f"{name}_bucket{_labels(labels, le=bound)} {cumulative}"
+    yield f"{name}_sum{_labels(labels)} {histogram.total:.6g}"
+    yield f"{name}_count{_labels(labels)} {histogram.count}"
+
+
+class SlowestRuns:
+    # cProfile + tracemalloc snapshot of the `keep` slowest script runs
+    def __init__(self, keep, path=None):
+        self.keep = keep
+        self.path = path or os.environ.get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+        os.makedirs(self.path, exist_ok=True)
+        self._kept = []  # min-heap of (seconds, stem, details)
+        self._lock = threading.Lock()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(8)
+
+    def start(self):
+        # cProfile follows the calling thread only: the session's script thread
+        profile = cProfile.Profile()
+        # Peak memory is process-wide, so runs overlapping this one count too
+        tracemalloc.reset_peak()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, seconds, details):
+        profile.disable()
+        with self._lock:
+            if len(self._kept) >= self.keep and seconds <= self._kept[0][0]:
+                return
+            stem = os.path.join(self.path, f"step{details['step']}-{seconds * 1000:.0f}ms-{uuid.uuid4().hex[:8]}")
+            profile.dump_stats(stem + ".prof")
+            tracemalloc.take_snapshot().dump(stem + ".tracemalloc")
+            details = dict(details, seconds=round(seconds, 4), peak_bytes=tracemalloc.get_traced_memory()[1],
+                           profile=stem + ".prof", snapshot=stem + ".tracemalloc")
+            heapq.heappush(self._kept, (seconds, stem, details))
+            if len(self._kept) > self.keep:
+                _, evicted, _ = heapq.heappop(self._kept)
+                for suffix in (".prof", ".tracemalloc"):
+                    try:
+                        os.remove(evicted + suffix)
+                    except OSError:
+                        pass
+            self._write_index()
+
+    def _write_index(self):
+        target = os.path.join(self.path, "slowest.json")
+        with open(target + ".tmp", "w", encoding="utf-8") as index:
+            json.dump(self.slowest(), index, indent=2)
+        os.replace(target + ".tmp", target)
+
+    def slowest(self):
+        return [details for _, _, details in sorted(self._kept, reverse=True)]
+
+
+class Rerun:
+    # One script run: app.py calls block() where the step block starts and
+    # finish() from a finally at the end, so runs cut short count too
+    __slots__ = ("metrics", "session_id", "trigger", "started", "step", "block_started", "profile")
+
+    def __init__(self, metrics, session_id, trigger):
+        self.metrics = metrics
+        self.session_id = session_id
+        self.trigger = trigger
+        self.step = None
+        self.block_started = None
+        self.profile = metrics.profiler.start() if metrics.profiler else None
+        self.started = time.perf_counter()
+
+    def block(self, step):
+        self.step = step
+        self.block_started = time.perf_counter()
+
+    def finish(self, state):
+        self.metrics._finish(self, time.perf_counter(), state)
+
+
+class _NoRerun:
+    def block(self, step):
+        pass
+
+    def finish(self, state):
+        pass
+
+
+NO_RERUN = _NoRerun()
+
+
+class Metrics:
+    def __init__(self, enabled=True, profile_slowest=0, profile_dir=None, max_sessions=10000):
+        self.enabled = enabled
+        self.max_sessions = max_sessions
+        self.profiler = SlowestRuns(profile_slowest, profile_dir) if enabled and profile_slowest else None
+        self._histograms = {}  # (name, labels) -> _Histogram
+        self._counters = {}  # (name, labels) -> value
+        self._session_reruns = OrderedDict()  # session id -> runs, most recent last
+        self._collectors = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls):
+        port = os.environ.get(METRICS_PORT_ENV)
+        path = os.environ.get(METRICS_FILE_ENV)
+        profile_slowest = int(os.environ.get(PROFILE_ENV) or 0)
+        metrics = cls(enabled=bool(os.environ.get(METRICS_ENV) == "1" or port or path or profile_slowest),
+                      profile_slowest=profile_slowest)
+        if port:
+            metrics.serve(int(port))
+        if path:
+            metrics.write_every(path)
+        return metrics
+
+    # ========== RECORDING ==========
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def start_rerun(self, session_id, trigger):
+        return Rerun(self, session_id, trigger) if self.enabled else NO_RERUN
+
+    def _finish(self, run, finished, state):
+        seconds = finished - run.started
+        step = str(run.step or "none")
+        if run.block_started is not None:
+            self.observe('inspace_step_block_seconds', finished - run.block_started, step=step)
+        self.observe('inspace_rerun_seconds', seconds, step=step)
+        self.inc('inspace_reruns_total', trigger=run.trigger)
+        with self._lock:
+            self._session_reruns[run.session_id] = self._session_reruns.pop(run.session_id, 0) + 1
+            if len(self._session_reruns) > self.max_sessions:
+                self._session_reruns.popitem(last=False)
+        # Sized after the clock stops, so pickling does not count as app time
+        self.observe('inspace_session_state_bytes', len(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)),
+                     BYTES_BUCKETS)
+        if run.profile is not None:
+            self.profiler.finish(run.profile, seconds,
+                                 {'step': step, 'trigger': run.trigger, 'session_id': run.session_id})
+
+    def observe_ai(self, kind, seconds, outcome="done"):
+        self.observe('inspace_ai_seconds', seconds, kind=kind, outcome=outcome)
+
+    @contextmanager
+    def ai_call(self, kind):
+        started = time.perf_counter()
+        outcome = "failed"
+        try:
+            yield
+            outcome = "done"
+        finally:
+            self.observe_ai(kind, time.perf_counter() - started, outcome)
+
+    def register(self, prefix, collect):
+        # collect() returns {name: number}; exported as inspace_<prefix>_<name>
+        self._collectors[prefix] = collect
+
+    def session_reruns(self, session_id):
+        with self._lock:
+            return self._session_reruns.get(session_id, 0)
+
+    # ========== EXPORT ==========
+    def render(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            per_session = _Histogram(RERUN_BUCKETS)
+            for runs in self._session_reruns.values():
+                per_session.observe(runs)
+        histograms.append((('inspace_session_reruns', ()), per_session))
+
+        lines = []
+        described = set()
+        for (name, labels), value in counters + histograms:
+            if name not in described:
+                described.add(name)
+                kind, text = FAMILIES[name]
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+            if isinstance(value, _Histogram):
+                lines.extend(_histogram_lines(name, labels, value))
+            else:
+                lines.append(f"{name}{_labels(labels)} {value}")
+        for prefix, collect in sorted(self._collectors.items()):
+            for key, value in collect().items():
+                if isinstance(value, (int, float)):
+                    lines += [f"# TYPE inspace_{prefix}_{key} gauge", f"inspace_{prefix}_{key} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server.server_address
+
+    def write_every(self, path, interval=5):
+        def write_loop():
+            while not self._stop.wait(interval):
+                self.write(path)
+
+        threading.Thread(target=write_loop, name="metrics-file", daemon=True).start()
+
+    def write(self, path):
+        with open(path + ".tmp", "w", encoding="utf-8") as out:
+            out.write(self.render())
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
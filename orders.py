@@ -0,0 +1,260 @@
+# IN SPACE FURNITURE - ORDER INTAKE
+#
+# PLACE ORDER hands the order to this queue and returns at once; the order
+# counts as placed only once it is on disk. Every order carries an
+# idempotency key (made once per order attempt and kept in `app_state`), so
+# a double click, a rerun or a session restored from disk can submit it
+# again without creating a second order.
+#
+# SQLite in WAL mode with synchronous=FULL. One writer thread commits
+# whatever is queued in one transaction (group commit): a burst of thousands
+# of orders costs a handful of fsyncs, and `submit` never waits for any of
+# them. The app polls `status` on later reruns.
+#
+# A consumer thread turns committed orders into fulfilment records - which
+# workshop makes the piece, how much wood it needs and when it is ready -
+# and marks them as in fulfilment, in batches of its own.
+import json
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from cutting import cut_list, species_of
+
+ORDERS_DB_ENV = "INSPACE_ORDERS_DB"
+DEFAULT_ORDERS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "orders.db")
+
+QUEUED = "queued"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+UNKNOWN = "unknown"
+
+# Order status on disk
+ACCEPTED = "accepted"
+IN_FULFILMENT = "in_fulfilment"
+
+WORKSHOPS = {"Teak": "Teak workshop", "Mango": "Mango workshop"}
+DEFAULT_WORKSHOP = "Main workshop"
+LEAD_TIME_DAYS = 21  # 3-4 weeks, quoted as the earlier end
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_key TEXT NOT NULL UNIQUE,
+    session_id TEXT,
+    product TEXT NOT NULL,
+    wood TEXT,
+    design TEXT,
+    total INTEGER NOT NULL,
+    reclaimed TEXT,
+    placed TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_by_status ON orders (status, seq);
+
+CREATE TABLE IF NOT EXISTS fulfilment (
+    order_key TEXT PRIMARY KEY,
+    workshop TEXT NOT NULL,
+    strips INTEGER NOT NULL,
+    wood_cm3 INTEGER NOT NULL,
+    reclaimed_boards INTEGER NOT NULL,
+    ready_by TEXT NOT NULL,
+    created TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+ORDER_FIELDS = ("session_id", "product", "wood", "design", "total", "reclaimed")
+REQUIRED_FIELDS = ("product", "total")  # NOT NULL on disk
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _workshop(wood):
+    species = species_of(wood)
+    return next((name for key, name in WORKSHOPS.items() if key in species), DEFAULT_WORKSHOP)
+
+
+class OrderIntake:
+    def __init__(self, path=None, batch_size=1024, flush_interval=0.002, consume=True):
+        self.path = path or os.environ.get(ORDERS_DB_ENV) or DEFAULT_ORDERS_DB
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._status = {}  # order key -> QUEUED or FAILED; disk has the rest
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._committed = threading.Event()
+        self._stop = threading.Event()
+        self.committed = 0
+        self.duplicates = 0
+        self.fulfilled = 0
+        self.last_error = None
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_loop, name="order-writer", daemon=True)
+        self._writer.start()
+        self._consumer = None
+        if consume:
+            self._consumer = threading.Thread(target=self._consume_loop, name="order-fulfilment", daemon=True)
+            self._consumer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ========== INTAKE ==========
+    def submit(self, order_key, order):
+        # Never blocks. order: {session_id, product, wood, design, total,
+        # reclaimed}; a key already submitted is not queued again.
+        missing = [name for name in REQUIRED_FIELDS if order.get(name) is None]
+        if missing:
+            raise ValueError(f"order {order_key} has no {', '.join(missing)}")
+        with self._lock:
+            if self._status.get(order_key) == QUEUED:
+                self.duplicates += 1
+                return QUEUED
+            self._status[order_key] = QUEUED
+        self._queue.put((order_key, tuple(order.get(name) for name in ORDER_FIELDS), _now()))
+        return QUEUED
+
+    def status(self, order_key):
+        # QUEUED, CONFIRMED (on disk), FAILED (may be submitted again) or UNKNOWN.
+        # FAILED is reported once; after that the key is UNKNOWN.
+        with self._lock:
+            state = self._status.get(order_key)
+            if state == FAILED:
+                del self._status[order_key]
+            if state is not None:
+                return state
+        row = self._reader().execute("SELECT 1 FROM orders WHERE order_key = ?", (order_key,)).fetchone()
+        return CONFIRMED if row else UNKNOWN
+
+    def _write_loop(self):
+        conn = self._connect()
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch, flushed = [], []
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    flushed.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._commit(conn, batch)
+            for done in flushed:
+                done.set()
+        conn.close()
+
+    def _commit(self, conn, batch):
+        error = None
+        try:
+            with conn:
+                # Keys already on disk (another process, a restored session) are
+                # skipped; any other constraint fails the batch
+                inserted = conn.executemany(
+                    "INSERT INTO orders (order_key, session_id, product, wood, design, total, "
+                    "reclaimed, placed, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(order_key) DO NOTHING",
+                    [(key, session_id, product, wood, design, total,
+                      json.dumps(reclaimed) if reclaimed is not None else None, placed, ACCEPTED)
+                     for key, (session_id, product, wood, design, total, reclaimed), placed in batch]
+                ).rowcount
+        except sqlite3.Error as ex:
+            error = ex
+        with self._lock:
+            for key, _, _ in batch:
+                if error:
+                    self._status[key] = FAILED
+                elif self._status.get(key) == QUEUED:
+                    del self._status[key]
+            if error:
+                self.last_error = str(error)
+            else:
+                self.committed += inserted
+                self.duplicates += len(batch) - inserted
+        self._committed.set()
+
+    def flush(self, timeout=None):
+        # Waits until everything submitted so far is on disk (scripts, shutdown)
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    # ========== FULFILMENT ==========
+    def _consume_loop(self):
+        conn = self._connect()
+        while not self._stop.is_set():
+            self._committed.wait(1.0)
+            self._committed.clear()
+            while self._consume_batch(conn):
+                pass
+        conn.close()
+
+    def _consume_batch(self, conn, limit=1000):
+        # BEGIN IMMEDIATE: consumers in other processes take turns
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT order_key, product, wood, reclaimed, placed FROM orders "
+                "WHERE status = ? ORDER BY seq LIMIT ?", (ACCEPTED, limit)
+            ).fetchall()
+            records = []
+            for order_key, product, wood, reclaimed, placed in rows:
+                parts = cut_list(product)
+                ready_by = datetime.fromisoformat(placed) + timedelta(days=LEAD_TIME_DAYS)
+                records.append((order_key, _workshop(wood), len(parts),
+                                round(sum(p.length * p.width * p.thickness for p in parts)),
+                                len(json.loads(reclaimed)["boards"]) if reclaimed else 0,
+                                ready_by.date().isoformat(), _now()))
+            conn.executemany("INSERT OR IGNORE INTO fulfilment VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+            conn.executemany("UPDATE orders SET status = ? WHERE order_key = ?",
+                             [(IN_FULFILMENT, record[0]) for record in records])
+        self.fulfilled += len(records)
+        return len(records) == limit
+
+    def fulfilment(self, order_key):
+        row = self._reader().execute(
+            "SELECT workshop, strips, wood_cm3, reclaimed_boards, ready_by FROM fulfilment WHERE order_key = ?",
+            (order_key,)
+        ).fetchone()
+        return dict(zip(("workshop", "strips", "wood_cm3", "reclaimed_boards", "ready_by"), row)) if row else None
+
+    def stats(self):
+        with self._lock:
+            pending = sum(1 for state in self._status.values() if state == QUEUED)
+        return {'queued': pending, 'committed': self.committed, 'duplicates': self.duplicates,
+                'fulfilled': self.fulfilled}
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._stop.set()
+        self._committed.set()
+        if self._consumer is not None:
+            self._consumer.join()
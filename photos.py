@@ -0,0 +1,207 @@
+# IN SPACE FURNITURE - DAMAGE PHOTO STORE
+#
+# Step 7 photos go to disk, not into the session: an upload is copied to a
+# temporary file a chunk at a time while it is hashed, then renamed to its
+# SHA-256. The same photo uploaded twice - by anyone - is stored once, and
+# `app_state` only keeps {angle: hash}.
+#
+# A small thread pool (Pillow releases the GIL) makes two variants of every
+# new photo: a JPEG thumbnail for Steps 7 and 8 to show, and the photo
+# decoded at damage.ANALYSIS_SIZE, saved as a .npy file that the damage
+# analysis maps straight into memory instead of decoding the original again.
+# A variant asked for before the pool got to it is made on the spot.
+#
+# A photo nobody has uploaded again for `keep_for` seconds is removed with
+# its variants; the store sweeps itself from the pool about once an hour.
+#
+#   objects/ab/<hash>          the photo as uploaded
+#   thumbs/ab/<hash>.jpg       THUMB_SIZE px on the long side
+#   analysis/ab/<hash>.npy     ANALYSIS_SIZE x ANALYSIS_SIZE x 3 uint8
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from damage import load_photo
+
+PHOTO_DIR_ENV = "INSPACE_PHOTO_DIR"
+DEFAULT_PHOTO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "photos")
+
+CHUNK_BYTES = 1024 * 1024
+THUMB_SIZE = 240
+THUMB_QUALITY = 80
+FOLDERS = (("objects", ""), ("thumbs", ".jpg"), ("analysis", ".npy"))
+
+
+class PhotoStore:
+    def __init__(self, path=None, workers=2, keep_for=30 * 86400, sweep_every=3600):
+        self.path = path or os.environ.get(PHOTO_DIR_ENV) or DEFAULT_PHOTO_DIR
+        for folder in ("objects", "thumbs", "analysis", "tmp"):
+            os.makedirs(os.path.join(self.path, folder), exist_ok=True)
+        self.keep_for = keep_for
+        self.sweep_every = sweep_every
+        self._next_sweep = time.monotonic() + sweep_every
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="photo-variants")
+        self._making = {}  # hash -> future of its variants
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.duplicates = 0
+        self.bytes_written = 0
+        self.variants_made = 0
+        self.removed = 0
+
+    def _file(self, folder, digest, suffix=""):
+        return os.path.join(self.path, folder, digest[:2], digest + suffix)
+
+    # ========== UPLOAD ==========
+    def put(self, upload):
+        # upload: a file object (Streamlit UploadedFile) or bytes; returns its hash
+        if isinstance(upload, (bytes, bytearray, memoryview)):
+            upload = io.BytesIO(upload)
+        upload.seek(0)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp = tempfile.mkstemp(dir=os.path.join(self.path, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := upload.read(CHUNK_BYTES):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = digest.hexdigest()
+            target = self._file("objects", digest)
+            if os.path.exists(target):
+                os.remove(temp)
+                # Uploaded again: the photo is in use, keep it longer
+                os.utime(target)
+                with self._lock:
+                    self.duplicates += 1
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp, target)
+                with self._lock:
+                    self.stored += 1
+                    self.bytes_written += size
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        self._schedule(digest)
+        with self._lock:
+            sweep = time.monotonic() >= self._next_sweep
+            if sweep:
+                self._next_sweep = time.monotonic() + self.sweep_every
+        if sweep:
+            self._pool.submit(self.sweep)
+        return digest
+
+    def _schedule(self, digest):
+        with self._lock:
+            if digest in self._making or os.path.exists(self._file("analysis", digest, ".npy")):
+                return
+            future = self._making[digest] = self._pool.submit(self._make_variants, digest)
+        future.add_done_callback(lambda _: self._done(digest))
+
+    def _done(self, digest):
+        with self._lock:
+            self._making.pop(digest, None)
+
+    def _make_variants(self, digest):
+        with open(self._file("objects", digest), "rb") as f:
+            image = Image.open(f)
+            image.draft("RGB", (THUMB_SIZE, THUMB_SIZE))
+            thumb = ImageOps.exif_transpose(image).convert("RGB")
+        thumb.thumbnail((THUMB_SIZE, THUMB_SIZE))
+        out = io.BytesIO()
+        thumb.save(out, "JPEG", quality=THUMB_QUALITY)
+        self._write("thumbs", digest, ".jpg", out.getbuffer())
+
+        out = io.BytesIO()
+        np.save(out, load_photo(self._file("objects", digest)))
+        self._write("analysis", digest, ".npy", out.getbuffer())
+        with self._lock:
+            self.variants_made += 1
+
+    def _write(self, folder, digest, suffix, data):
+        target = self._file(folder, digest, suffix)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.join(self.path, "tmp"))
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.replace(temp, target)
+
+    def _variant(self, folder, digest, suffix):
+        target = self._file(folder, digest, suffix)
+        if not os.path.exists(target):
+            with self._lock:
+                future = self._making.get(digest)
+            if future is not None:
+                future.result()
+            else:
+                self._make_variants(digest)
+        return target
+
+    # ========== READS ==========
+    def thumbnail(self, digest):
+        # Path of the thumbnail, for st.image to send as it is; None if the
+        # upload is not a picture Pillow can read
+        try:
+            return self._variant("thumbs", digest, ".jpg")
+        except OSError:
+            return None
+
+    def analysis(self, digest):
+        # The photo at analysis size, mapped from disk rather than read
+        return np.load(self._variant("analysis", digest, ".npy"), mmap_mode="r")
+
+    # ========== RETENTION ==========
+    def sweep(self, now=None):
+        # Removes photos last uploaded before `keep_for` ago with their
+        # variants, variants whose photo is gone and abandoned temp files;
+        # returns how many photos went
+        cutoff = (now or time.time()) - self.keep_for
+        removed = 0
+        for folder, suffix in FOLDERS:
+            for prefix in os.listdir(os.path.join(self.path, folder)):
+                for name in os.listdir(os.path.join(self.path, folder, prefix)):
+                    digest = name[:len(name) - len(suffix)] if suffix else name
+                    with self._lock:
+                        making = self._making.get(digest)
+                    # Variants still being made; a finished job may not have left _making yet
+                    if making is not None and not making.done():
+                        continue
+                    target = os.path.join(self.path, folder, prefix, name)
+                    try:
+                        if folder == "objects":
+                            if os.path.getmtime(target) >= cutoff:
+                                continue
+                            os.remove(target)
+                            removed += 1
+                        elif not os.path.exists(self._file("objects", digest)):
+                            os.remove(target)
+                    except FileNotFoundError:
+                        pass
+        for name in os.listdir(os.path.join(self.path, "tmp")):
+            target = os.path.join(self.path, "tmp", name)
+            try:
+                if os.path.getmtime(target) < cutoff:
+                    os.remove(target)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.removed += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {'stored': self.stored, 'duplicates': self.duplicates, 'bytes_written': self.bytes_written,
+                    'variants_made': self.variants_made, 'pending': len(self._making), 'removed': self.removed}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,283 @@
+# IN SPACE FURNITURE - AR PREVIEW RENDERER
+#
+# CPU-only previews for Step 5: a top-down plan and a perspective view of the
+# room with the furniture from the Step 3 layout, in the customer's wood and
+# design colours. Everything in the scene is a box; faces are projected with
+# a pinhole camera, drawn back to front and filled with vectorized half-plane
+# tests, so a frame costs about ten milliseconds.
+#
+# Frames are PNG-encoded into one process-wide LRU cache bounded by bytes and
+# keyed by everything that changes the picture, so popular rooms and repeat
+# views are served without rendering again.
+import io
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from PIL import Image
+
+from cutting import species_of
+from layout import plan_layout
+
+FRAME_WIDTH = 360
+FRAME_HEIGHT = 240
+ORBIT_STEP = 45  # degrees per "Walk Around"
+
+TOP_DOWN = "top"
+PERSPECTIVE = "perspective"
+
+# (colour tint, sun direction) - the sun moves across the room during the day
+LIGHTING = {
+    "Morning": ((1.0, 0.96, 0.88), (-0.6, -0.3, 0.75)),
+    "Afternoon": ((1.0, 1.0, 1.0), (0.1, -0.2, 0.97)),
+    "Evening": ((1.0, 0.78, 0.58), (0.7, 0.2, 0.55)),
+}
+LIGHTING_ORDER = list(LIGHTING)
+
+HEIGHTS = {"Sofa": 3, "Chair": 3, "Bed": 2, "Table": 2.5, "Wardrobe": 6.5, "Desk": 2.5, "TV Unit": 1.8,
+           "Bookshelf": 5, "Coffee Table": 1.5, "Stool": 1.5, "Small Stool": 1.2, "Small Sofa": 3}
+DEFAULT_HEIGHT = 2.5
+
+WOOD_COLOURS = {"Treated Teak": (150, 100, 55), "Bug-resistant Teak": (140, 92, 50),
+                "Termite-proof Mango": (185, 135, 80), "Mango Wood": (195, 145, 85)}
+DESIGN_COLOURS = {"Peacock": (20, 110, 140), "Lion": (200, 150, 40), "Flowers": (200, 80, 120),
+                  "Tree": (60, 120, 60), "Geometric": (90, 90, 110), "Birds": (110, 160, 200),
+                  "Moon & Stars": (230, 220, 150), "Waves": (40, 90, 170)}
+FLOOR = (225, 215, 195)
+WALL = (238, 234, 226)
+OTHER_FURNITURE = (165, 165, 170)
+BACKGROUND = (40, 40, 48)
+
+# One scene: everything that decides what a frame looks like
+Scene = namedtuple("Scene", ["room_width", "room_length", "existing", "product", "wood", "designs",
+                             "view", "angle", "lighting", "turned", "spot"])
+
+
+class FrameCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, render):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+            self.misses += 1
+        # Rendered outside the lock; two sessions asking for the same new
+        # frame at once both render it, which is cheaper than serializing
+        frame = render()
+        with self._lock:
+            if key not in self._frames:
+                self._frames[key] = frame
+                self.bytes += len(frame)
+            while self.bytes > self.max_bytes and len(self._frames) > 1:
+                _, old = self._frames.popitem(last=False)
+                self.bytes -= len(old)
+                self.evictions += 1
+        return frame
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'frames': len(self._frames),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# ========== SCENE ==========
+def spot_count(room_width, room_length, product, existing):
+    # How many places "Adjust" cycles the new piece through
+    return len(plan_layout(room_width, room_length, product, existing).options) or 1
+
+
+def _boxes(scene):
+    # (x0, y0, x1, y1, height, colour, is_new) in feet
+    layout = plan_layout(scene.room_width, scene.room_length, scene.product, scene.existing)
+    boxes = []
+    for place in layout.placements:
+        if place.is_new:
+            options = [spot for _, spot in layout.options] or [place]
+            place = options[scene.spot % len(options)]
+            colour = WOOD_COLOURS.get(species_of(scene.wood), WOOD_COLOURS["Mango Wood"])
+        else:
+            colour = OTHER_FURNITURE
+        x0, y0, width, length = place.x, place.y, place.width, place.length
+        if place.is_new and scene.turned % 2:
+            # Turned a quarter round its own centre
+            cx, cy = x0 + width / 2, y0 + length / 2
+            width, length = length, width
+            x0 = min(max(0, cx - width / 2), max(0, scene.room_width - width))
+            y0 = min(max(0, cy - length / 2), max(0, scene.room_length - length))
+        boxes.append((x0, y0, x0 + width, y0 + length, HEIGHTS.get(place.name, DEFAULT_HEIGHT), colour, place.is_new))
+    return boxes
+
+
+def _accents(designs):
+    return np.array([DESIGN_COLOURS[name] for name in designs if name in DESIGN_COLOURS] or [], dtype=np.float32)
+
+
+def _paint(image, mask, colour, shade, accents=None, bands=None):
+    # Fill `mask` with the shaded colour; design pieces get bands of accent
+    # colour mixed in
+    base = np.asarray(colour, dtype=np.float32)
+    if accents is None or not len(accents):
+        image[mask] = base * shade
+        return
+    marked = mask & (bands % 2 == 1)
+    image[mask & ~marked] = base * shade
+    mixed = 0.55 * base + 0.45 * accents[(bands[marked] // 2) % len(accents)]
+    image[marked] = mixed * shade
+
+
+def _shade(normal, lighting):
+    tint, sun = LIGHTING[lighting]
+    sun = np.asarray(sun) / np.linalg.norm(sun)
+    return np.asarray(tint, dtype=np.float32) * (0.45 + 0.55 * max(0.0, float(np.dot(normal, sun))))
+
+
+# ========== TOP-DOWN ==========
+def render_top_down(scene):
+    scale = min((FRAME_WIDTH - 20) / scene.room_width, (FRAME_HEIGHT - 20) / scene.room_length)
+    image = np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.float32)
+    image[:] = BACKGROUND
+    left = (FRAME_WIDTH - scene.room_width * scale) / 2
+    top = (FRAME_HEIGHT - scene.room_length * scale) / 2
+    cols = (np.arange(FRAME_WIDTH) + 0.5 - left) / scale
+    rows = (np.arange(FRAME_HEIGHT) + 0.5 - top) / scale
+    x, y = np.meshgrid(cols, rows)
+    bands = (x * 2).astype(np.int32)
+    accents = _accents(scene.designs)
+    up = np.array([0.0, 0.0, 1.0])
+
+    floor = (x >= 0) & (x < scene.room_width) & (y >= 0) & (y < scene.room_length)
+    _paint(image, floor, FLOOR, _shade(up, scene.lighting))
+    for x0, y0, x1, y1, _, colour, is_new in _boxes(scene):
+        window = (slice(int(top + y0 * scale), int(np.ceil(top + y1 * scale))),
+                  slice(int(left + x0 * scale), int(np.ceil(left + x1 * scale))))
+        wx, wy = x[window], y[window]
+        inside = (wx >= x0) & (wx < x1) & (wy >= y0) & (wy < y1)
+        _paint(image[window], inside, colour, _shade(up, scene.lighting), accents if is_new else None, bands[window])
+        # Outline so neighbouring pieces stay apart
+        rim = 1 / scale
+        edge = inside & ~((wx >= x0 + rim) & (wx < x1 - rim) & (wy >= y0 + rim) & (wy < y1 - rim))
+        image[window][edge] *= 0.5
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+# ========== PERSPECTIVE ==========
+def _camera(scene):
+    cx, cy = scene.room_width / 2, scene.room_length / 2
+    theta = np.radians(scene.angle)
+    reach = 1.1 * np.hypot(scene.room_width, scene.room_length)
+    eye = np.array([cx - reach * np.sin(theta), cy + reach * np.cos(theta), 0.6 * reach])
+    forward = np.array([cx, cy, 0.5]) - eye
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, [0.0, 0.0, 1.0])
+    right /= np.linalg.norm(right)
+    return eye, forward, right, np.cross(right, forward)
+
+
+def _project(points, camera):
+    eye, forward, right, up = camera
+    rel = np.asarray(points, dtype=np.float64) - eye
+    depth = rel @ forward
+    focal = 0.75 * FRAME_WIDTH
+    u = FRAME_WIDTH / 2 + focal * (rel @ right) / depth
+    v = FRAME_HEIGHT / 2 - focal * (rel @ up) / depth
+    return np.stack([u, v], axis=1), depth
+
+
+def _fill_polygon(shape, corners):
+    # (window, mask): the polygon's bounding box as slices and which pixels
+    # in it are inside, tested against every edge of the convex polygon at once
+    lo = np.floor(corners.min(axis=0)).astype(int).clip(0, [shape[1], shape[0]])
+    hi = np.ceil(corners.max(axis=0)).astype(int).clip(0, [shape[1], shape[0]])
+    window = (slice(lo[1], hi[1]), slice(lo[0], hi[0]))
+    if (hi <= lo).any():
+        return window, np.zeros((0, 0), dtype=bool)
+    u, v = np.meshgrid(np.arange(lo[0], hi[0]) + 0.5, np.arange(lo[1], hi[1]) + 0.5)
+    start = corners
+    end = np.roll(corners, -1, axis=0)
+    cross = ((end[:, 0] - start[:, 0])[:, None, None] * (v - start[:, 1][:, None, None])
+             - (end[:, 1] - start[:, 1])[:, None, None] * (u - start[:, 0][:, None, None]))
+    return window, (cross >= 0).all(axis=0) | (cross <= 0).all(axis=0)
+
+
+def _fill(image, corners, colour, shade, accents=None, bands=None):
+    window, mask = _fill_polygon(image.shape[:2], corners)
+    if mask.any():
+        _paint(image[window], mask, colour, shade, accents, None if bands is None else bands[window])
+
+
+def _box_faces(x0, y0, x1, y1, height):
+    # (corners, outward normal) for the five faces that can ever be seen
+    z = height
+    return [
+        ([(x0, y0, z), (x1, y0, z), (x1, y1, z), (x0, y1, z)], (0, 0, 1)),
+        ([(x0, y0, 0), (x1, y0, 0), (x1, y0, z), (x0, y0, z)], (0, -1, 0)),
+        ([(x1, y1, 0), (x0, y1, 0), (x0, y1, z), (x1, y1, z)], (0, 1, 0)),
+        ([(x0, y1, 0), (x0, y0, 0), (x0, y0, z), (x0, y1, z)], (-1, 0, 0)),
+        ([(x1, y0, 0), (x1, y1, 0), (x1, y1, z), (x1, y0, z)], (1, 0, 0)),
+    ]
+
+
+def render_perspective(scene):
+    camera = _camera(scene)
+    eye = camera[0]
+    image = np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.float32)
+    image[:] = BACKGROUND
+    width, length, wall_height = scene.room_width, scene.room_length, 8.0
+    accents = _accents(scene.designs)
+    rows = np.arange(FRAME_HEIGHT)[:, None].repeat(FRAME_WIDTH, axis=1)
+    bands = rows // 6
+
+    # Floor, then the walls on the far side (the near ones are cut away)
+    floor, _ = _project([(0, 0, 0), (width, 0, 0), (width, length, 0), (0, length, 0)], camera)
+    _fill(image, floor, FLOOR, _shade(np.array([0, 0, 1.0]), scene.lighting))
+    walls = [
+        ([(0, 0, 0), (width, 0, 0), (width, 0, wall_height), (0, 0, wall_height)], (0, 1, 0), eye[1] > 0),
+        ([(width, length, 0), (0, length, 0), (0, length, wall_height), (width, length, wall_height)], (0, -1, 0), eye[1] < length),
+        ([(0, length, 0), (0, 0, 0), (0, 0, wall_height), (0, length, wall_height)], (1, 0, 0), eye[0] > 0),
+        ([(width, 0, 0), (width, length, 0), (width, length, wall_height), (width, 0, wall_height)], (-1, 0, 0), eye[0] < width),
+    ]
+    for corners, normal, far in walls:
+        if far:
+            points, _ = _project(corners, camera)
+            _fill(image, points, WALL, _shade(np.array(normal, dtype=float), scene.lighting))
+
+    # Furniture back to front; within a box only faces turned to the camera
+    boxes = sorted(_boxes(scene), key=lambda box: -np.linalg.norm(
+        np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2, box[4] / 2]) - eye))
+    for x0, y0, x1, y1, height, colour, is_new in boxes:
+        for corners, normal in _box_faces(x0, y0, x1, y1, height):
+            normal = np.array(normal, dtype=float)
+            if np.dot(normal, eye - np.asarray(corners[0])) <= 0:
+                continue
+            points, _ = _project(corners, camera)
+            _fill(image, points, colour, _shade(normal, scene.lighting), accents if is_new else None, bands)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def render_frame(scene):
+    pixels = render_top_down(scene) if scene.view == TOP_DOWN else render_perspective(scene)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG", optimize=False, compress_level=1)
+    return buffer.getvalue()
+
+
+def preview_frame(cache, scene):
+    return cache.get(scene, lambda: render_frame(scene))
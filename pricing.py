@@ -0,0 +1,111 @@
+# IN SPACE FURNITURE - PRICING
+#
+# Step 6 prices: the product, the wood it is made from, the design work and
+# the circular service package every order includes. Orders filled from
+# reclaimed stock (see inventory.py) pay a cut wood premium plus haulage.
+# Quotes are shared between sessions through memo.py, keyed on a snapshot
+# of the price tables, so a changed price is never quoted from an old entry.
+#
+# The same tables also make a price matrix: every product x wood x design
+# tier x service package as one NumPy array, built by broadcasting the four
+# tables against each other. It is rebuilt only when a table's contents
+# change, backs the Step 6 comparison grid and answers bulk quotes for
+# analytics with a single fancy-indexing read per batch.
+from collections import namedtuple
+
+import numpy as np
+
+from memo import memoize
+
+# items: ((line, price), ...)
+Quote = namedtuple("Quote", ["items", "total"])
+
+BASE_PRICES = {"Sofa": 800, "Chair": 300, "Bed": 1200, "Table": 500}
+DEFAULT_BASE_PRICE = 600
+WOOD_PREMIUM = {"**Treated Teak**": 400, "**Bug-resistant Teak**": 450, "**Termite-proof Mango**": 350, "**Mango Wood**": 300}
+DEFAULT_WOOD_PREMIUM = 300
+DESIGN_PREMIUM = {True: 200, False: 100}  # transformed design or not
+CIRCULAR_SERVICE = 150
+SERVICE_PACKAGES = {"Circular Service Package": CIRCULAR_SERVICE}  # every order includes one
+RECLAIMED_DISCOUNT = 0.5  # share of the wood premium saved on reclaimed stock
+HAULAGE_PER_KM = 0.5
+
+
+def _price_tables():
+    # Hashable snapshot of everything a price depends on
+    return (tuple(BASE_PRICES.items()), DEFAULT_BASE_PRICE, tuple(WOOD_PREMIUM.items()), DEFAULT_WOOD_PREMIUM,
+            tuple(DESIGN_PREMIUM.items()), tuple(SERVICE_PACKAGES.items()))
+
+
+def _reclaimed_premium(premium, reclaimed):
+    if reclaimed is None:
+        return premium
+    return round(premium * (1 - RECLAIMED_DISCOUNT) + HAULAGE_PER_KM * reclaimed.distance_km)
+
+
+def wood_premium(wood, reclaimed=None):
+    return _reclaimed_premium(WOOD_PREMIUM.get(wood, DEFAULT_WOOD_PREMIUM), reclaimed)
+
+
+def quote(product, wood, transformed, reclaimed=None):
+    # Quote; reclaimed is an inventory.StockMatch the order will be made from
+    return _quote(_price_tables(), product, wood, bool(transformed), reclaimed)
+
+
+@memoize()
+def _quote(tables, product, wood, transformed, reclaimed):
+    base, default_base, woods, default_wood, design, services = tables
+    wood_line = f"Wood: {wood}"
+    if reclaimed is not None:
+        wood_line = (f"Wood: reclaimed {wood} ({len(reclaimed.boards)} boards, "
+                     f"within {reclaimed.distance_km:.0f} km)")
+    items = (
+        (f"Custom {product}", dict(base).get(product, default_base)),
+        (wood_line, _reclaimed_premium(dict(woods).get(wood, default_wood), reclaimed)),
+        ("AI Design Transformation", dict(design)[transformed]),
+        ("Circular Service Package", dict(services)["Circular Service Package"]),
+    )
+    return Quote(items, sum(price for _, price in items))
+
+
+# ========== PRICE MATRIX ==========
+# Axis labels; the last product and wood stand for anything not in the
+# tables, priced at the defaults
+OTHER = "Other"
+# totals[product, wood, design, service]; designs are (False, True)
+PriceMatrix = namedtuple("PriceMatrix", ["products", "woods", "designs", "services", "totals"])
+
+
+@memoize()
+def _build_matrix(tables):
+    base, default_base, wood, default_wood, design, services = tables
+    products = tuple(name for name, _ in base) + (OTHER,)
+    woods = tuple(name for name, _ in wood) + (OTHER,)
+    base = np.array([price for _, price in base] + [default_base], dtype=np.int32)
+    wood = np.array([price for _, price in wood] + [default_wood], dtype=np.int32)
+    design = np.array([dict(design)[False], dict(design)[True]], dtype=np.int32)
+    service = np.array([price for _, price in services], dtype=np.int32)
+    totals = (base[:, None, None, None] + wood[None, :, None, None]
+              + design[None, None, :, None] + service[None, None, None, :])
+    totals.setflags(write=False)
+    return PriceMatrix(products, woods, (False, True), tuple(name for name, _ in services), totals)
+
+
+def price_matrix():
+    return _build_matrix(_price_tables())
+
+
+def codes(values, labels):
+    # Names -> positions on a matrix axis; unknown names get the OTHER slot
+    position = {label: i for i, label in enumerate(labels)}
+    other = position.get(OTHER, len(labels) - 1)
+    return np.fromiter((position.get(value, other) for value in values), dtype=np.intp, count=len(values))
+
+
+def bulk_quote(products, woods, transformed, services=0):
+    # Totals for many orders at once. Arguments are integer codes (see
+    # `codes`) or booleans for `transformed`, as arrays or scalars of any
+    # broadcastable shape; reclaimed stock is priced per order by `quote`.
+    totals = price_matrix().totals
+    return totals[np.asarray(products), np.asarray(woods), np.asarray(transformed, dtype=np.intp),
+                  np.asarray(services)]
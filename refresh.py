@@ -0,0 +1,25 @@
+# IN SPACE FURNITURE - LIVE REFRESH
+#
+# Replaces the old timed full-page reload. While background work is in
+# flight the page asks for a normal rerun over its open connection, so the
+# session (and `app_state`) survives and Streamlit only redraws the elements
+# whose output changed. A real reload is left to the explicit sidebar button.
+import os
+
+import streamlit.components.v1 as components
+
+REFRESH_INTERVAL_MS = 1000
+
+_auto_refresh = components.declare_component(
+    "auto_refresh",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "auto_refresh"),
+)
+
+
+def live_refresh(interval_ms=REFRESH_INTERVAL_MS, key="live_refresh"):
+    # Renders nothing visible; returns the timestamp of the last tick
+    return _auto_refresh(interval_ms=interval_ms, key=key, default=0)
+
+
+def full_reload():
+    components.html("<script>window.parent.location.reload();</script>", height=0)
@@ -0,0 +1,339 @@
+# IN SPACE FURNITURE - LOCATION RISK HISTORY
+#
+# What Step 2 knows about a city: humidity, temperature extremes, termite
+# and bed bug reports, and the wood they call for. Historical climate
+# readings and pest reports are streamed in from CSV and appended, a chunk at
+# a time, to one raw NumPy column file per field, read back memory-mapped:
+#
+#   climate: city,date,humidity,temperature   (humidity in %, temperature in C)
+#   pests:   city,date,pest[,count]           (pest is "bed bugs" or "termites")
+#
+# Risk is rolling: every row counts with an exponentially decaying weight
+# (half-life HALF_LIFE_DAYS, measured back from the newest row), kept as a
+# handful of running sums per city. New rows are folded into the sums and
+# the rest of the history is never read again, so a refresh costs the new
+# data only, and the per-city profiles are precomputed into a dict - a rerun
+# looks its city up in O(1) however long the history gets.
+#
+#   python risk.py climate readings.csv
+#   python risk.py pests reports.csv
+#   python risk.py show Chennai
+#
+# One ingest at a time; the app picks up new rows by itself (see `watch`).
+import argparse
+import csv
+import math
+import os
+import sys
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from locations import load_location_index, normalize
+from memo import changed
+
+RISK_DIR_ENV = "INSPACE_RISK_DIR"
+DEFAULT_RISK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "risk")
+
+HALF_LIFE_DAYS = 365
+CHUNK_ROWS = 65536
+
+HUMID_AT = 75  # % relative humidity that counts as a humid day
+DRY_BELOW = 40  # average humidity that counts as dry
+HOT_AT = 40  # degrees C
+COLD_AT = 5
+
+HAZARDS = ("bed_bugs", "humidity", "termites", "temperature")
+PESTS = ("bed_bugs", "termites")
+# Where a hazard's score reaches 1.0: reports per year for pests, share of
+# humid / extreme days for the climate
+RISK_SCALE = {'bed_bugs': 12, 'termites': 12, 'humidity': 0.5, 'temperature': 0.25}
+HIGH_RISK = 0.5
+
+# First rule whose hazards are all high risk wins
+WOOD_RULES = [
+    (("termites", "humidity"), "**Treated Teak**", "Water-resistant, termite-proof"),
+    (("bed_bugs",), "**Bug-resistant Teak**", "Special coating prevents bugs"),
+    (("humidity",), "**Treated Teak**", "Water-resistant, stays stable when damp"),
+    (("termites",), "**Termite-proof Mango**", "Dense wood, natural resistance"),
+    (("temperature",), "**Termite-proof Mango**", "Dense wood, moves little in heat and cold"),
+    ((), "**Mango Wood**", "Sustainable, beautiful grain"),
+]
+
+# (column, dtype) per table, one raw file each
+TABLES = {
+    'climate': (('day', np.int32), ('city', np.int32), ('humidity', np.float32), ('temperature', np.float32)),
+    'pests': (('day', np.int32), ('city', np.int32), ('kind', np.uint8), ('count', np.float32)),
+}
+
+# Decayed running sums kept per city
+SUMS = ('humidity_weight', 'humidity_sum', 'humid', 'temperature_weight', 'extreme') + PESTS
+SUM_ROW = {name: row for row, name in enumerate(SUMS)}
+
+EPOCH = date(1970, 1, 1)
+
+
+def _pest_kind(text):
+    key = normalize(text).replace(" ", "_")
+    key = key if key.endswith("s") else key + "s"
+    return PESTS.index(key) if key in PESTS else None
+
+
+class RiskHistory:
+    # The column files and the city names they refer to by id
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(RISK_DIR_ENV) or DEFAULT_RISK_DIR
+        os.makedirs(self.path, exist_ok=True)
+        self.cities = []
+        self._city_ids = {}
+        self.reload_cities()
+
+    def reload_cities(self):
+        target = os.path.join(self.path, "cities.txt")
+        if os.path.exists(target):
+            with open(target, encoding="utf-8") as f:
+                for name in f.read().splitlines()[len(self.cities):]:
+                    self._city_ids[normalize(name)] = len(self.cities)
+                    self.cities.append(name)
+        return self.cities
+
+    def _city_id(self, name):
+        key = normalize(name)
+        if key not in self._city_ids:
+            # Written before any row that refers to it
+            with open(os.path.join(self.path, "cities.txt"), "a", encoding="utf-8") as f:
+                f.write(name + "\n")
+            self._city_ids[key] = len(self.cities)
+            self.cities.append(name)
+        return self._city_ids[key]
+
+    def columns(self, table):
+        # Read-only memory maps, cut to the rows every column has (an ingest
+        # may be halfway through appending a chunk)
+        fields = TABLES[table]
+        sizes = []
+        for name, dtype in fields:
+            target = os.path.join(self.path, f"{table}.{name}")
+            sizes.append(os.path.getsize(target) // np.dtype(dtype).itemsize if os.path.exists(target) else 0)
+        rows = min(sizes)
+        return {
+            name: (np.memmap(os.path.join(self.path, f"{table}.{name}"), dtype=dtype, mode="r", shape=(rows,))
+                   if rows else np.empty(0, dtype=dtype))
+            for name, dtype in fields
+        }
+
+    def _append(self, table, values):
+        for name, dtype in TABLES[table]:
+            with open(os.path.join(self.path, f"{table}.{name}"), "ab") as f:
+                np.asarray(values[name], dtype=dtype).tofile(f)
+
+    def _ingest(self, table, stream, parse, resolve):
+        # Returns (rows added, rows rejected)
+        added = rejected = 0
+        names = [name for name, _ in TABLES[table]][2:]
+        city_ids = {}  # as written in the CSV -> id
+        rows = csv.DictReader(stream)
+        while True:
+            chunk = [row for _, row in zip(range(CHUNK_ROWS), rows)]
+            if not chunk:
+                return added, rejected
+            values = {name: [] for name, _ in TABLES[table]}
+            for row in chunk:
+                try:
+                    parsed = parse(row)
+                    day = (date.fromisoformat((row.get("date") or "").strip()) - EPOCH).days
+                    city = (row.get("city") or "").strip()
+                    if parsed is None or not city:
+                        raise ValueError(row)
+                except ValueError:
+                    rejected += 1
+                    continue
+                if city not in city_ids:
+                    city_ids[city] = self._city_id(resolve(city))
+                values['day'].append(day)
+                values['city'].append(city_ids[city])
+                for name, value in zip(names, parsed):
+                    values[name].append(value)
+            self._append(table, values)
+            added += len(values['day'])
+
+    def ingest_climate(self, stream, resolve=str):
+        def parse(row):
+            humidity, temperature = (_reading(row.get(name)) for name in ("humidity", "temperature"))
+            return None if math.isnan(humidity) and math.isnan(temperature) else (humidity, temperature)
+        return self._ingest('climate', stream, parse, resolve)
+
+    def ingest_pests(self, stream, resolve=str):
+        def parse(row):
+            kind = _pest_kind(row.get("pest") or "")
+            return None if kind is None else (kind, float(row.get("count") or 1))
+        return self._ingest('pests', stream, parse, resolve)
+
+
+def _reading(text):
+    text = (text or "").strip()
+    return float(text) if text else math.nan
+
+
+class RiskTable:
+    # Rolling risk per city, folded in from RiskHistory as rows arrive
+    def __init__(self, history):
+        self.history = history
+        self.as_of = None  # day number of the newest row
+        self.folded = {table: 0 for table in TABLES}
+        self.sums = np.zeros((len(SUMS), 0))
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def profile(self, city):
+        # {'city', 'issues', 'wood', 'reason', 'scores', 'as_of'} or None
+        return self._profiles.get(normalize(city or ""))
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def refresh(self):
+        # Folds in rows added since the last refresh; returns how many
+        with self._lock:
+            # Columns before names: a city is written before its first row
+            tables = {table: self.history.columns(table) for table in TABLES}
+            cities = self.history.reload_cities()
+            if self.sums.shape[1] < len(cities):
+                self.sums = np.pad(self.sums, ((0, 0), (0, len(cities) - self.sums.shape[1])))
+            added = 0
+            for table, columns in tables.items():
+                rows = len(columns['day'])
+                for start in range(self.folded[table], rows, CHUNK_ROWS):
+                    self._fold(table, {name: np.asarray(col[start:start + CHUNK_ROWS]) for name, col in columns.items()})
+                added += rows - self.folded[table]
+                self.folded[table] = rows
+            if added or not self._profiles:
+                self._profiles = self._build_profiles(cities)
+                changed("risk")
+            return added
+
+    def _fold(self, table, chunk):
+        day = chunk['day']
+        newest = int(day.max())
+        if self.as_of is None:
+            self.as_of = newest
+        elif newest > self.as_of:
+            # Everything already folded ages by the gap
+            self.sums *= 2.0 ** (-(newest - self.as_of) / HALF_LIFE_DAYS)
+            self.as_of = newest
+        weight = 2.0 ** (-(self.as_of - day) / HALF_LIFE_DAYS)
+        city = chunk['city']
+        cities = self.sums.shape[1]
+
+        def add(name, weights):
+            self.sums[SUM_ROW[name]] += np.bincount(city, weights=weights, minlength=cities)
+
+        if table == 'climate':
+            humidity, temperature = chunk['humidity'], chunk['temperature']
+            has_humidity, has_temperature = ~np.isnan(humidity), ~np.isnan(temperature)
+            add('humidity_weight', weight * has_humidity)
+            add('humidity_sum', weight * np.where(has_humidity, humidity, 0))
+            add('humid', weight * (humidity >= HUMID_AT))
+            add('temperature_weight', weight * has_temperature)
+            add('extreme', weight * ((temperature >= HOT_AT) | (temperature <= COLD_AT)))
+        else:
+            for kind, name in enumerate(PESTS):
+                add(name, weight * chunk['count'] * (chunk['kind'] == kind))
+
+    def _build_profiles(self, cities):
+        sums = dict(zip(SUMS, self.sums))
+        # A steady rate of r reports a day sums to r * HALF_LIFE_DAYS / ln 2
+        per_year = 365 * math.log(2) / HALF_LIFE_DAYS
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = {
+                'humidity': np.nan_to_num(sums['humid'] / sums['humidity_weight']),
+                'temperature': np.nan_to_num(sums['extreme'] / sums['temperature_weight']),
+                'bed_bugs': sums['bed_bugs'] * per_year,
+                'termites': sums['termites'] * per_year,
+            }
+            average_humidity = sums['humidity_sum'] / sums['humidity_weight']
+        scores = {hazard: np.clip(values[hazard] / RISK_SCALE[hazard], 0, 1) for hazard in HAZARDS}
+        has_data = self.sums.any(axis=0)
+        as_of = str(EPOCH + timedelta(days=self.as_of)) if self.as_of is not None else None
+
+        profiles = {}
+        for city_id in np.flatnonzero(has_data):
+            score = {hazard: round(float(scores[hazard][city_id]), 2) for hazard in HAZARDS}
+            high = {hazard for hazard in HAZARDS if score[hazard] >= HIGH_RISK}
+            _, wood, reason = next(rule for rule in WOOD_RULES if set(rule[0]) <= high)
+            issues = _issues(score, {hazard: float(values[hazard][city_id]) for hazard in HAZARDS},
+                             float(average_humidity[city_id]))
+            profiles[normalize(cities[city_id])] = {
+                'city': cities[city_id], 'issues': issues, 'wood': wood, 'reason': reason,
+                'scores': score, 'as_of': as_of,
+            }
+        return profiles
+
+    def watch(self, every=60):
+        # Background refresh, so new history shows up without a restart
+        def watch_loop():
+            while not self._stop.wait(every):
+                self.refresh()
+
+        self.refresh()
+        threading.Thread(target=watch_loop, name="risk-refresh", daemon=True).start()
+        return self
+
+    def close(self):
+        self._stop.set()
+
+
+def _issues(score, value, average_humidity):
+    issues = []
+    if score['humidity'] >= HIGH_RISK:
+        issues.append(f"High humidity ({average_humidity:.0f}%)")
+    elif score['humidity'] >= 0.2:
+        issues.append(f"Moderate humidity ({average_humidity:.0f}%)")
+    elif average_humidity < DRY_BELOW:
+        issues.append(f"Dry conditions ({average_humidity:.0f}% humidity)")
+    if value['termites'] >= 1:
+        issues.append(f"Termites ({value['termites']:.0f} reports a year)")
+    if value['bed_bugs'] >= 1:
+        issues.append(f"Bed bugs reported ({value['bed_bugs']:.0f} a year)")
+    if value['temperature'] >= 0.05:
+        issues.append(f"Temperature extremes ({value['temperature']:.0%} of days)")
+    return issues or ["No major issues on record"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest and query IN SPACE location risk history")
+    parser.add_argument("command", choices=["climate", "pests", "show"])
+    parser.add_argument("args", nargs="+", help="CSV files (- for stdin), or cities to show")
+    args = parser.parse_args(argv)
+
+    history = RiskHistory()
+    table = RiskTable(history)
+    if args.command == "show":
+        table.refresh()
+        for city in args.args:
+            print(city, table.profile(city))
+        return 0
+
+    # File the rows under the canonical city names Step 2 uses
+    index = load_location_index()
+
+    def resolve(name):
+        match = index.lookup(name)
+        return match.city if match and match.kind != "fuzzy" else name
+
+    ingest = history.ingest_climate if args.command == "climate" else history.ingest_pests
+    for path in args.args:
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            added, rejected = ingest(stream, resolve)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        print(f"{path}: {added} rows added, {rejected} rejected", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,585 @@
+# IN SPACE FURNITURE - SESSION STATE
+#
+# Every customer's `app_state` is an AppState: one slot per field of a fixed,
+# versioned schema instead of a free-form dict. It still reads like a dict
+# (`app_state['current_step']`), but unknown keys are an error rather than a
+# silent new entry, and the whole state packs into one small tuple.
+#
+# Tabs left open cost memory until Streamlit drops them. SessionSpill writes
+# sessions that have been idle for a while to disk and empties their slots;
+# the first access after the customer comes back loads them again. Each
+# process spills into its own folder under INSPACE_SESSION_DIR, so workers
+# sharing a node never sweep each other's files; a spill file that is gone
+# anyway is reloaded from the SessionStore.
+#
+# SessionStore keeps every session in a store all workers on the node share
+# (SQLite, or one file per field), keyed by session id and field name. After
+# each rerun only the fields whose pickled form changed are written, so a
+# worker restart or a customer landing on another worker picks the journey
+# up where it was. Fields are stored by name, so the store outlives schema
+# changes the same way FIELD_HISTORY does for spill files.
+#
+# The id in the URL is all it takes to open a journey, and a copied link
+# opens it in two tabs at once. Every save therefore names the version it
+# started from and fails if someone else wrote in between; the loser forks
+# a new id with its own fields instead of mixing them with the other tab's.
+# Loading an id that was saved within `live_for` seconds forks straight away.
+#
+#   INSPACE_SESSION_STORE=sqlite:/path/sessions.db | file:/path/dir | off
+import os
+import pickle
+import re
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+
+SESSION_DIR_ENV = "INSPACE_SESSION_DIR"
+DEFAULT_SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions")
+SESSION_STORE_ENV = "INSPACE_SESSION_STORE"
+DEFAULT_SESSION_STORE = "sqlite:" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.db")
+
+SCHEMA_VERSION = 4
+
+# (field, default); list and dict defaults are made fresh for every session
+FIELDS = (
+    ('current_step', 1),
+    ('selected_product', None),
+    ('user_location', None),
+    ('recommended_wood', None),
+    ('room_width', 15),
+    ('room_length', 12),
+    ('existing_furniture', list),
+    ('ar_angle', 0),
+    ('ar_lighting', "Afternoon"),
+    ('ar_turned', 0),
+    ('ar_spot', 0),
+    ('selected_designs', list),
+    ('ai_transformation', None),
+    ('current_design', None),
+    ('order_placed', False),
+    ('order_date', None),
+    ('order_total', None),
+    ('order_reclaimed', None),
+    ('order_key', None),
+    ('damage_percentage', 0),
+    ('good_wood_left', 0),
+    ('damage_breakdown', dict),
+    ('good_wood_by_angle', dict),
+    ('possible_products', list),
+    ('reuse_plans', dict),
+    ('last_created', None),
+    ('damage_photos', dict),
+    ('photo_angle', None),
+    ('damage_job', None),
+    ('piece_id', None),
+    ('session_id', None),
+)
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+
+# Field order of every schema version ever written to disk, so old spill
+# files still load after fields are added, removed or reordered
+FIELD_HISTORY = {
+    1: ('current_step', 'selected_product', 'user_location', 'recommended_wood', 'room_width',
+        'room_length', 'existing_furniture', 'ar_angle', 'ar_lighting', 'ar_turned', 'ar_spot',
+        'selected_designs', 'ai_transformation', 'current_design', 'order_placed', 'order_date',
+        'order_total', 'damage_percentage', 'good_wood_left', 'damage_breakdown', 'good_wood_by_angle',
+        'possible_products', 'reuse_plans', 'damage_photos', 'photo_angle', 'damage_job', 'piece_id',
+        'session_id'),
+    2: ('current_step', 'selected_product', 'user_location', 'recommended_wood', 'room_width',
+        'room_length', 'existing_furniture', 'ar_angle', 'ar_lighting', 'ar_turned', 'ar_spot',
+        'selected_designs', 'ai_transformation', 'current_design', 'order_placed', 'order_date',
+        'order_total', 'damage_percentage', 'good_wood_left', 'damage_breakdown', 'good_wood_by_angle',
+        'possible_products', 'reuse_plans', 'last_created', 'damage_photos', 'photo_angle', 'damage_job',
+        'piece_id', 'session_id'),
+    3: ('current_step', 'selected_product', 'user_location', 'recommended_wood', 'room_width',
+        'room_length', 'existing_furniture', 'ar_angle', 'ar_lighting', 'ar_turned', 'ar_spot',
+        'selected_designs', 'ai_transformation', 'current_design', 'order_placed', 'order_date',
+        'order_total', 'order_reclaimed', 'damage_percentage', 'good_wood_left', 'damage_breakdown',
+        'good_wood_by_angle', 'possible_products', 'reuse_plans', 'last_created', 'damage_photos',
+        'photo_angle', 'damage_job', 'piece_id', 'session_id'),
+    4: FIELD_NAMES,
+}
+
+_lock = threading.RLock()
+
+
+def _default(value):
+    return value() if callable(value) else value
+
+
+class AppState:
+    __slots__ = FIELD_NAMES + ('_spilled', '_stored', '_version', '__weakref__')
+
+    def __init__(self, **values):
+        self._spilled = None
+        self._stored = {}  # field -> pickled value last written to the SessionStore
+        self._version = 0  # SessionStore version those fields belong to
+        for name, default in FIELDS:
+            setattr(self, name, values.pop(name) if name in values else _default(default))
+        if values:
+            raise KeyError(f"not in the session schema: {', '.join(values)}")
+
+    def _load(self, restore=None):
+        # `restore(session_id)` stands in for a spill file that is gone
+        with _lock:
+            if self._spilled is not None:
+                try:
+                    with open(self._spilled, "rb") as spill:
+                        record = pickle.load(spill)
+                    os.remove(self._spilled)
+                except FileNotFoundError:
+                    self._refill(restore(self.session_id) if restore else None)
+                    return
+                self._fill(record)
+
+    def _refill(self, saved):
+        # Takes over the fields of `saved`, or starts over if there is none.
+        # Either way the version matches what is stored, so the next save
+        # can never write defaults over a stored journey.
+        session_id = self.session_id
+        if saved is None:
+            self._fill((SCHEMA_VERSION, ()))
+            self._version = 0
+        else:
+            self._fill(saved.to_record())
+            self._stored = saved._stored
+            self._version = saved._version
+        self.session_id = session_id
+
+    def _fill(self, record):
+        version, values = record
+        saved = dict(zip(FIELD_HISTORY[version], values))
+        for name, default in FIELDS:
+            setattr(self, name, saved[name] if name in saved else _default(default))
+        self._spilled = None
+        self._stored = {}
+
+    def __getitem__(self, key):
+        if key not in FIELD_NAMES:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            # Spilled to disk while idle
+            self._load()
+            return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELD_NAMES:
+            raise KeyError(f"not in the session schema: {key}")
+        if self._spilled is not None:
+            self._load()
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in FIELD_NAMES
+
+    def __reduce__(self):
+        return (_from_record, (self.to_record(),))
+
+    def get(self, key, default=None):
+        return self[key] if key in FIELD_NAMES else default
+
+    def setdefault(self, key, default=None):
+        if self[key] is None:
+            self[key] = default
+        return self[key]
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def reset(self, *names):
+        # Back to the schema defaults
+        defaults = dict(FIELDS)
+        for name in names:
+            self[name] = _default(defaults[name])
+
+    def keys(self):
+        return FIELD_NAMES
+
+    def items(self):
+        return [(name, self[name]) for name in FIELD_NAMES]
+
+    def to_record(self):
+        # (schema version, values in field order) - the compact on-disk form
+        if self._spilled is not None:
+            self._load()
+        return (SCHEMA_VERSION, tuple(getattr(self, name) for name in FIELD_NAMES))
+
+    @classmethod
+    def from_record(cls, record):
+        state = cls.__new__(cls)
+        state._fill(record)
+        state._version = 0
+        return state
+
+
+def _from_record(record):
+    return AppState.from_record(record)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class SessionSpill:
+    def __init__(self, path=None, idle_after=600, sweep_every=60, keep_for=86400, store=None):
+        self.root = path or os.environ.get(SESSION_DIR_ENV) or DEFAULT_SESSION_DIR
+        self.host = socket.gethostname()
+        self.path = os.path.join(self.root, f"{self.host}-{os.getpid()}")
+        os.makedirs(self.path, exist_ok=True)
+        self.store = store
+        self.idle_after = idle_after
+        self.keep_for = keep_for
+        self._sessions = weakref.WeakValueDictionary()
+        self._last_seen = {}
+        self.spilled = 0
+        self.restored = 0
+        self.reloaded = 0
+
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, args=(sweep_every,),
+                                         name="session-spill", daemon=True)
+        self._sweeper.start()
+
+    def touch(self, state):
+        # Called once per rerun: the session is in use again
+        with _lock:
+            session_id = state.session_id
+            self._sessions[session_id] = state
+            self._last_seen[session_id] = time.monotonic()
+            if state._spilled is not None:
+                state._load(self._reload)
+                self.restored += 1
+
+    def _reload(self, session_id):
+        # The last save of a session whose spill file is gone, or None
+        with _lock:
+            self.reloaded += 1
+        return self.store.load(session_id, fork=False) if self.store is not None else None
+
+    def spill(self, state):
+        with _lock:
+            if state._spilled is not None:
+                return
+            target = os.path.join(self.path, f"{state.session_id}.state")
+            with open(target + ".tmp", "wb") as spill:
+                pickle.dump(state.to_record(), spill, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(target + ".tmp", target)
+            # The id stays so the session can still be found
+            for name in FIELD_NAMES:
+                if name != 'session_id':
+                    delattr(state, name)
+            state._spilled = target
+            self.spilled += 1
+
+    def sweep(self, now=None):
+        now = now or time.monotonic()
+        with _lock:
+            for session_id, seen in list(self._last_seen.items()):
+                state = self._sessions.get(session_id)
+                if state is None or state.session_id != session_id:
+                    # Streamlit dropped the session, or it forked a new id; forget it
+                    del self._last_seen[session_id]
+                    self._sessions.pop(session_id, None)
+                elif now - seen >= self.idle_after and state._spilled is None:
+                    self.spill(state)
+
+            # Spill files of sessions that never came back; a session
+            # Streamlit still holds will load its file when it does
+            cutoff = time.time() - self.keep_for
+            for name in os.listdir(self.path):
+                if name.split(".")[0] in self._sessions:
+                    continue
+                target = os.path.join(self.path, name)
+                try:
+                    if os.path.getmtime(target) < cutoff:
+                        os.remove(target)
+                except OSError:
+                    pass
+            self._sweep_orphans()
+
+    def _sweep_orphans(self):
+        # Folders of processes on this host that have exited
+        for name in os.listdir(self.root):
+            host, _, pid = name.rpartition("-")
+            if host != self.host or not pid.isdigit() or int(pid) == os.getpid() or _process_alive(int(pid)):
+                continue
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _sweep_loop(self, sweep_every):
+        while not self._stop.wait(sweep_every):
+            self.sweep()
+
+    def stats(self):
+        with _lock:
+            sessions = list(self._sessions.values())
+            on_disk = sum(1 for state in sessions if state._spilled is not None)
+            return {
+                'sessions': len(sessions),
+                'resident': len(sessions) - on_disk,
+                'on_disk': on_disk,
+                'spilled': self.spilled,
+                'restored': self.restored,
+                'reloaded': self.reloaded,
+            }
+
+    def close(self):
+        self._stop.set()
+        self._sweeper.join()
+
+
+# ========== SHARED STORE ==========
+SESSION_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _pack(value):
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class SqliteSessionBackend:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS session_fields (
+        session_id TEXT NOT NULL,
+        field TEXT NOT NULL,
+        value BLOB NOT NULL,
+        PRIMARY KEY (session_id, field)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        updated REAL NOT NULL,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS sessions_by_updated ON sessions (updated);
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A crash may lose the last rerun or two, never corrupt a session
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def read(self, session_id):
+        # (fields, version, time of the last write)
+        with self._lock:
+            fields = dict(self._conn.execute(
+                "SELECT field, value FROM session_fields WHERE session_id = ?", (session_id,)))
+            row = self._conn.execute("SELECT version, updated FROM sessions WHERE session_id = ?",
+                                     (session_id,)).fetchone()
+        return (fields,) + (row or (0, 0.0))
+
+    def write(self, session_id, fields, version):
+        # The new version, or None if the session is no longer at `version`
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if (row[0] if row else 0) != version:
+                return None
+            self._conn.executemany("INSERT OR REPLACE INTO session_fields VALUES (?, ?, ?)",
+                                   [(session_id, name, value) for name, value in fields.items()])
+            self._conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                               (session_id, time.time(), version + 1))
+        return version + 1
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_fields WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self, cutoff):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_fields WHERE session_id IN "
+                               "(SELECT session_id FROM sessions WHERE updated < ?)", (cutoff,))
+            self._conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+
+    def close(self):
+        self._conn.close()
+
+
+class FileSessionBackend:
+    # One directory per session, one file per field. The version is an empty
+    # file "@<n>": a writer claims the next one with O_EXCL, so of two
+    # writers starting from the same version only one gets through.
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _version(self, names):
+        return max((int(name[1:]) for name in names if name.startswith("@")), default=0)
+
+    def read(self, session_id):
+        folder = os.path.join(self.path, session_id)
+        fields = {}
+        try:
+            names = os.listdir(folder)
+            updated = os.path.getmtime(folder)
+        except FileNotFoundError:
+            return fields, 0, 0.0
+        for name in names:
+            if not name.endswith(".tmp") and not name.startswith("@"):
+                with open(os.path.join(folder, name), "rb") as f:
+                    fields[name] = f.read()
+        return fields, self._version(names), updated
+
+    def write(self, session_id, fields, version):
+        folder = os.path.join(self.path, session_id)
+        os.makedirs(folder, exist_ok=True)
+        if self._version(os.listdir(folder)) != version:
+            return None
+        try:
+            os.close(os.open(os.path.join(folder, f"@{version + 1}"), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        for name, value in fields.items():
+            target = os.path.join(folder, name)
+            with open(target + ".tmp", "wb") as f:
+                f.write(value)
+            os.replace(target + ".tmp", target)
+        if version:
+            try:
+                os.remove(os.path.join(folder, f"@{version}"))
+            except FileNotFoundError:
+                pass
+        os.utime(folder)
+        return version + 1
+
+    def delete(self, session_id):
+        shutil.rmtree(os.path.join(self.path, session_id), ignore_errors=True)
+
+    def sweep(self, cutoff):
+        for session_id in os.listdir(self.path):
+            try:
+                if os.path.getmtime(os.path.join(self.path, session_id)) < cutoff:
+                    self.delete(session_id)
+            except OSError:
+                pass
+
+    def close(self):
+        pass
+
+
+BACKENDS = {'sqlite': SqliteSessionBackend, 'file': FileSessionBackend}
+
+
+class SessionStore:
+    def __init__(self, backend, keep_for=86400, sweep_every=3600, live_for=300):
+        self.backend = backend
+        self.keep_for = keep_for
+        self.sweep_every = sweep_every
+        self.live_for = live_for
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+        self.loaded = 0
+        self.forked = 0
+        self.conflicts = 0
+        self.saves = 0
+        self.fields_written = 0
+        self.save_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, url=None):
+        # None when switched off
+        url = url or os.environ.get(SESSION_STORE_ENV) or DEFAULT_SESSION_STORE
+        kind, _, path = url.partition(":")
+        if kind == "off":
+            return None
+        if kind not in BACKENDS or not path:
+            raise ValueError(f"{SESSION_STORE_ENV} must be sqlite:<path>, file:<dir> or off, not {url!r}")
+        return cls(BACKENDS[kind](path))
+
+    def load(self, session_id, fork=True):
+        # The AppState saved under `session_id`, or None. A session someone
+        # saved within `live_for` comes back as a copy under a new id,
+        # unless `fork` is off because the caller owns the session.
+        if not session_id or not SESSION_ID.fullmatch(session_id):
+            return None
+        fields, version, updated = self.backend.read(session_id)
+        stored = {name: value for name, value in fields.items() if name in FIELD_NAMES}
+        if not stored:
+            return None
+        values = {}
+        for name, value in list(stored.items()):
+            try:
+                values[name] = pickle.loads(value)
+            except Exception:
+                # Written by code that no longer exists; the default stands in
+                del stored[name]
+        state = AppState(**values)
+        state.session_id = session_id
+        state._stored = stored
+        state._version = version
+        with self._lock:
+            self.loaded += 1
+        if fork and time.time() - updated < self.live_for:
+            self._fork(state)
+        return state
+
+    def _fork(self, state):
+        # The state carries on under a new id; everything is written afresh
+        state.session_id = uuid.uuid4().hex
+        state._stored = {}
+        state._version = 0
+        with self._lock:
+            self.forked += 1
+
+    def save(self, state):
+        # Writes the fields changed since the last save; returns how many
+        if state._spilled is not None:
+            return 0
+        started = time.perf_counter()
+        changed = {}
+        for name in FIELD_NAMES:
+            value = _pack(getattr(state, name))
+            if state._stored.get(name) != value:
+                changed[name] = value
+        if changed:
+            version = self.backend.write(state.session_id, changed, state._version)
+            if version is None:
+                # Another tab saved this session since: keep ours apart
+                with self._lock:
+                    self.conflicts += 1
+                self._fork(state)
+                changed = {name: _pack(getattr(state, name)) for name in FIELD_NAMES}
+                version = self.backend.write(state.session_id, changed, 0)
+            state._stored.update(changed)
+            state._version = version
+        with self._lock:
+            self.saves += 1
+            self.fields_written += len(changed)
+            self.save_seconds += time.perf_counter() - started
+            sweep = time.monotonic() >= self._next_sweep
+            if sweep:
+                self._next_sweep = time.monotonic() + self.sweep_every
+        if sweep:
+            self.backend.sweep(time.time() - self.keep_for)
+        return len(changed)
+
+    def forget(self, session_id):
+        if session_id and SESSION_ID.fullmatch(session_id):
+            self.backend.delete(session_id)
+
+    def stats(self):
+        with self._lock:
+            return {'loaded': self.loaded, 'forked': self.forked, 'conflicts': self.conflicts, 'saves': self.saves,
+                    'fields_written': self.fields_written, 'save_seconds': round(self.save_seconds, 6)}
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def scratch_data(tmp_path_factory):
+    # Stores default to data/ in the checkout; tests keep theirs elsewhere
+    root = tmp_path_factory.mktemp("data")
+    os.environ.update({
+        "INSPACE_INVENTORY_DB": str(root / "inventory.db"),
+        "INSPACE_LINEAGE_DB": str(root / "lineage.db"),
+        "INSPACE_ORDERS_DB": str(root / "orders.db"),
+        "INSPACE_PHOTO_DIR": str(root / "photos"),
+        "INSPACE_RISK_DIR": str(root / "risk"),
+        "INSPACE_SESSION_DIR": str(root / "sessions"),
+        "INSPACE_SESSION_STORE": "sqlite:" + str(root / "sessions.db"),
+    })
+    return root
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from batch import run_lines
+
+
+def run(**scenario):
+    lines, errors = run_lines([json.dumps({'id': "s1", 'product': "Sofa", **scenario})])
+    return json.loads(lines[0]), errors
+
+
+@pytest.mark.parametrize("bad", [
+    {'existing': 5},
+    {'existing': "Bed"},
+    {'city': 123},
+    {'designs': "Peacock"},
+    {'photos': ["front.jpg"]},
+    {'room_width': True},
+    {'make': 7, 'good_wood': 70},
+    {'product': ["Sofa"]},
+])
+def test_wrong_types_become_error_records(bad):
+    result, errors = run(**bad)
+    assert errors == 1
+    assert result['id'] == "s1" and result['error']
+
+
+def test_stream_goes_on_after_a_bad_scenario():
+    lines, errors = run_lines([json.dumps({'product': "Sofa", 'existing': 5}),
+                               json.dumps({'product': "Chair", 'city': "Madras"})])
+    assert errors == 1
+    assert json.loads(lines[1])['location'] == "Chennai"
+
+
+def test_price_lines_are_plain_text():
+    result, errors = run(city="Chennai")
+    assert errors == 0
+    assert "Wood: Treated Teak" in result['price']
+    assert not any("*" in line for line in result['price'])
@@ -0,0 +1,102 @@
+import pytest
+
+import cutting
+from cutting import (CATALOG, FURNITURE_BOARDS, KERF, Board, Part, can_cut, leftover_boards, plan_reuse,
+                     recovered_boards)
+
+
+def volume(pieces):
+    return sum(piece.length * piece.width * piece.thickness for piece in pieces)
+
+
+def placement(boards, parts):
+    # Board index for every part, by exhaustive search, or None
+    remaining = [board.length for board in boards]
+    chosen = []
+
+    def place(i, first_board):
+        if i == len(parts):
+            return True
+        part = parts[i]
+        tried = set()
+        # Tightest board first; boards left in the same shape are interchangeable,
+        # and so are identical strips, which keep to board order
+        for idx in sorted(range(first_board, len(boards)), key=remaining.__getitem__):
+            board = boards[idx]
+            state = (remaining[idx], board.width, board.thickness)
+            if state in tried:
+                continue
+            tried.add(state)
+            if part.width <= board.width and part.thickness <= board.thickness and part.length <= remaining[idx]:
+                remaining[idx] -= part.length + KERF
+                chosen.append(idx)
+                same_next = i + 1 < len(parts) and parts[i + 1] == part
+                if place(i + 1, idx if same_next else 0):
+                    return True
+                chosen.pop()
+                remaining[idx] += part.length + KERF
+        return False
+
+    return chosen if place(0, 0) else None
+
+
+def board_holds(board, strips):
+    # Every cut costs a kerf except after the last strip, which is what is left
+    return (all(s.width <= board.width and s.thickness <= board.thickness for s in strips)
+            and sum(s.length for s in strips) + KERF * (len(strips) - 1) <= board.length)
+
+
+@pytest.mark.parametrize("product", sorted(FURNITURE_BOARDS))
+@pytest.mark.parametrize("good_wood", [45, 70, 100])
+def test_every_planned_cut_fits_its_board(product, good_wood):
+    boards = recovered_boards(product, good_wood)
+    for plan in plan_reuse(boards):
+        parts = sorted((part for name in plan.products for part in CATALOG[name]), reverse=True)
+        chosen = placement(boards, parts)
+        assert chosen is not None, plan.label
+        for idx, board in enumerate(boards):
+            assert board_holds(board, [part for part, home in zip(parts, chosen) if home == idx])
+
+
+@pytest.mark.parametrize("product", sorted(FURNITURE_BOARDS))
+def test_wood_is_counted_once(product):
+    boards = recovered_boards(product, 70)
+    for plan in plan_reuse(boards):
+        assert plan.wood_used == sum(volume(CATALOG[name]) for name in plan.products)
+        assert plan.utilisation == round(100 * plan.wood_used / volume(boards)) <= 100
+        assert volume(leftover_boards(boards, plan.products)) + plan.wood_used <= volume(boards)
+
+
+def test_kerf_counts_between_strips_only():
+    assert can_cut([Board(36, 5, 5, "Teak")], [Part(20, 5, 5), Part(15.7, 5, 5)])
+    assert not can_cut([Board(36, 5, 5, "Teak")], [Part(20, 5, 5), Part(15.8, 5, 5)])
+
+
+# Best fit decreasing puts the 20 on the 30 board and strands the 11;
+# the only packing is 20 + 14 on the 36 board and 14 + 11 on the 30 board
+TIGHT_BOARDS = [Board(36, 5, 5, "Teak"), Board(30, 5, 5, "Teak")]
+TIGHT_PARTS = [Part(20, 5, 5), Part(14, 5, 5), Part(14, 5, 5), Part(11, 5, 5)]
+
+
+def test_exact_search_finds_the_packing_best_fit_misses():
+    assert can_cut(TIGHT_BOARDS, TIGHT_PARTS)
+    assert not can_cut(TIGHT_BOARDS, TIGHT_PARTS + [Part(5, 5, 5)])
+
+
+def test_known_best_combination_is_chosen():
+    boards = [Board(80, 12, 2, "Teak"), Board(80, 12, 2, "Teak"), Board(81, 8, 2, "Teak")]
+    plans = plan_reuse(boards, catalog=["Wall Shelf", "Picture Frame", "Small Frame"])
+    assert plans[0].products == ("Wall Shelf",)
+    assert plans[0].utilisation == round(100 * volume(CATALOG["Wall Shelf"]) / volume(boards))
+    # Four 20 cm strips and three cuts need 80.9 cm
+    boards[2] = Board(80, 8, 2, "Teak")
+    assert ("Wall Shelf",) not in [plan.products for plan in plan_reuse(boards, catalog=["Wall Shelf"])]
+
+
+def test_search_that_runs_out_of_budget_counts_as_no_fit(monkeypatch):
+    monkeypatch.setattr(cutting, "PACKING_BUDGET", 0)
+    cutting._fits.cache_clear()
+    try:
+        assert not can_cut(TIGHT_BOARDS, TIGHT_PARTS)
+    finally:
+        cutting._fits.cache_clear()
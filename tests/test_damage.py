@@ -0,0 +1,60 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+from damage import BACKGROUND, SOUND, STAINED, NoWoodVisible, classify_tiles, estimate_damage, load_photo
+
+WOOD = (170, 110, 60)
+STAIN = (40, 25, 15)
+WALL = (128, 128, 128)
+
+
+def png(pixels):
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "PNG")
+    return out.getvalue()
+
+
+def stained_board():
+    # 512 px square, decoded at 256: 16x16 tiles of 16 px. Wall above
+    # (4 tile rows), then wood with a stain over the last 4 tile columns
+    pixels = np.empty((512, 512, 3), dtype=np.uint8)
+    pixels[:] = WOOD
+    pixels[:128] = WALL
+    pixels[128:, 384:] = STAIN
+    return png(pixels)
+
+
+def test_tiles_of_a_known_photo():
+    labels = classify_tiles(load_photo(stained_board())[None])[0]
+    assert labels.shape == (16, 16)
+    assert (labels[:4] == BACKGROUND).all()
+    assert (labels[4:, :12] == SOUND).all()
+    assert (labels[4:, 12:] == STAINED).all()
+
+
+def test_damage_of_a_known_photo_set():
+    sound = np.empty((512, 512, 3), dtype=np.uint8)
+    sound[:] = WOOD
+    report = estimate_damage([stained_board(), png(sound)], ["front", "back"])
+    # 144 sound and 48 stained tiles in front, 256 sound at the back
+    assert report['good_wood_by_angle'] == {"front": 75, "back": 100}
+    assert report['good_wood_left'] == round(100 * 400 / 448)
+    assert report['damage_percentage'] == 100 - report['good_wood_left']
+    assert report['damage_breakdown'] == {"stained": round(100 * 48 / 448), "cracked": 0, "infested": 0}
+
+
+def test_unreadable_photo_is_an_error():
+    with pytest.raises(UnidentifiedImageError):
+        estimate_damage([b"not a photo"])
+
+
+def test_photo_without_wood_is_an_error():
+    wall = np.empty((256, 256, 3), dtype=np.uint8)
+    wall[:] = WALL
+    with pytest.raises(NoWoodVisible):
+        estimate_damage([png(wall)])
+    with pytest.raises(NoWoodVisible):
+        estimate_damage([])
@@ -0,0 +1,23 @@
+import pytest
+
+from flow import InvalidTransition, advance
+from session import AppState
+
+
+def test_allowed_move_applies_its_fields():
+    state = AppState()
+    assert advance(state, "choose_product", {'selected_product': "Sofa"}) == 2
+    assert (state['current_step'], state['selected_product']) == (2, "Sofa")
+
+
+@pytest.mark.parametrize("step, action, updates", [
+    (1, "choose_product", {'selected_product': None}),
+    (3, "choose_product", {'selected_product': "Sofa"}),
+    (1, "fly_away", {'selected_product': "Sofa"}),
+])
+def test_refused_move_changes_nothing(step, action, updates):
+    state = AppState(current_step=step)
+    before = state.to_record()
+    with pytest.raises(InvalidTransition):
+        advance(state, action, updates)
+    assert state.to_record() == before
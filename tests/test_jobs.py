@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from jobs import CANCELLED, DONE, UNKNOWN, JobExecutor, JobQueueFull
+
+
+def wait_for_cancel(started, cancelled):
+    started.set()
+    cancelled.wait(5)
+    return "stopped early" if cancelled.is_set() else "ran out"
+
+
+def answer(value, cancelled):
+    return value
+
+
+@pytest.fixture
+def executor():
+    finished = []
+    executor = JobExecutor(max_workers=1, max_pending=3,
+                           on_finish=lambda kind, seconds, outcome: finished.append((kind, outcome)))
+    executor.finished = finished
+    yield executor
+    executor.shutdown()
+
+
+def test_reset_cancels_the_sessions_jobs_only(executor):
+    started = threading.Event()
+    running = executor.submit("damage", wait_for_cancel, started, session_id="a")
+    queued = executor.submit("damage", answer, 1, session_id="a")
+    other = executor.submit("damage", answer, 2, session_id="b")
+    assert started.wait(5)
+
+    assert executor.cancel_session("a") == 2
+    assert executor.poll(running).state == UNKNOWN
+    assert executor.poll(queued).state == UNKNOWN
+    executor._jobs[other].future.result(5)
+    assert executor.poll(other) == (DONE, 2, None)
+    # The running job stopped at its next check; the queued one never ran
+    assert sorted(executor.finished) == [("damage", CANCELLED), ("damage", DONE)]
+
+
+def test_job_from_before_a_restart_is_unknown(executor):
+    job_id = executor.submit("damage", answer, 1, session_id="a")
+    executor._jobs[job_id].future.result(5)
+    restarted = JobExecutor(max_workers=1)
+    try:
+        assert restarted.poll(job_id) == (UNKNOWN, None, None)
+        assert restarted.cancel_session("a") == 0
+    finally:
+        restarted.shutdown()
+
+
+def test_full_queue_refuses_new_jobs(executor):
+    started = threading.Event()
+    executor.submit("damage", wait_for_cancel, started, session_id="a")
+    for _ in range(2):
+        executor.submit("damage", answer, 1, session_id="a")
+    with pytest.raises(JobQueueFull):
+        executor.submit("damage", answer, 1, session_id="b")
+    executor.cancel_session("a")
+    assert executor.poll(executor.submit("damage", answer, 3, session_id="b")).state != UNKNOWN
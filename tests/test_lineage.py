@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+
+import pytest
+
+from lineage import LineageStore
+
+
+def journey(store, results):
+    # Sofa -> Chair -> Picture Frame without waiting for any write
+    sofa = store.add_piece("Sofa", "**Treated Teak**", wait=False)
+    chair = store.add_transition(sofa, "Chair", wood_used=60, design="Peacock", wait=False)
+    frame = store.add_transition(chair, "Picture Frame", wood_used=20, wait=False)
+    results.append((sofa, chair, frame))
+
+
+def test_journeys_written_from_many_threads_survive_a_reopen(tmp_path):
+    path = str(tmp_path / "lineage.db")
+    store = LineageStore(path, batch_size=4)
+    results = []
+    threads = [threading.Thread(target=journey, args=(store, results)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    store = LineageStore(path)
+    try:
+        assert len(results) == 8
+        for sofa, chair, frame in results:
+            steps = store.ancestry(frame)
+            assert [(step['from'], step['to']) for step in steps] == [("Sofa", "Chair"), ("Chair", "Picture Frame")]
+            assert [(step['from_id'], step['to_id']) for step in steps] == [(sofa, chair), (chair, frame)]
+            assert (steps[0]['wood_used'], steps[0]['design']) == (60, "Peacock")
+            assert [piece['generation'] for piece in store.descendants(sofa)] == [1, 2]
+            assert {piece['piece_id'] for piece in store.batch_pieces(sofa)} == {sofa, chair, frame}
+            assert store.piece(frame)['wood'] == "**Treated Teak**"
+    finally:
+        store.close()
+
+
+def test_waiting_write_is_readable_at_once(tmp_path):
+    store = LineageStore(str(tmp_path / "lineage.db"))
+    try:
+        piece_id = store.add_piece("Table", "**Mango Wood**")
+        assert store.piece(piece_id)['product'] == "Table"
+    finally:
+        store.close()
+
+
+def test_waiting_write_raises_what_the_commit_raised(tmp_path):
+    store = LineageStore(str(tmp_path / "lineage.db"))
+    try:
+        with pytest.raises(sqlite3.IntegrityError):
+            store.add_piece(None)
+        with pytest.raises(KeyError):
+            store.add_transition("no such piece", "Chair")
+    finally:
+        store.close()
+
+
+def test_pieces_queued_without_waiting_are_all_committed(tmp_path):
+    store = LineageStore(str(tmp_path / "lineage.db"), batch_size=16)
+    try:
+        batch_id = store.add_piece("Bed")
+        for _ in range(100):
+            store.add_piece("Stool", batch_id=batch_id, wait=False)
+        store.flush()
+        assert len(store.batch_pieces(batch_id)) == 101
+    finally:
+        store.close()
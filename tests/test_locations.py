@@ -0,0 +1,51 @@
+import pytest
+
+from locations import _edit_distance, load_location_index
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("delhi", "delhi", 0),
+    ("dehli", "delhi", 1),
+    ("mumbia", "mumbai", 1),
+    ("chenani", "chennai", 1),
+    ("pune", "puen", 1),
+    ("kolkata", "kolkta", 1),
+    ("ca", "abc", 3),
+])
+def test_swapped_letters_are_one_edit(a, b, distance):
+    assert _edit_distance(a, b, 3) == distance
+
+
+def test_distance_stops_past_the_limit():
+    assert _edit_distance("ahmedabad", "hyderabad", 1) == 2
+
+
+@pytest.mark.parametrize("typed, city", [
+    ("Dehli", "Delhi"),
+    ("Mumbia", "Mumbai"),
+    ("Chenani", "Chennai"),
+    ("Banglaore", "Bangalore"),
+])
+def test_transposed_city_names_are_found(typed, city):
+    match = load_location_index().lookup(typed)
+    assert match is not None
+    assert (match.city, match.kind) == (city, "fuzzy")
+
+
+def test_each_index_keeps_its_own_answers():
+    first, second = load_location_index(), load_location_index()
+    second.add("Patna", coords=(25.59, 85.14))
+    second.build()
+    assert first.lookup("Patna") is None
+    assert second.lookup("Patna").kind == "exact"
+    assert first.complete("Pat") == ()
+    assert second.complete("Pat") == ("Patna",)
+    assert first.lookup.cache_info().currsize == 1
+
+
+def test_rebuild_drops_cached_answers():
+    index = load_location_index()
+    assert index.complete("Pat") == ()
+    index.add("Patna")
+    index.build()
+    assert index.complete("Pat") == ("Patna",)
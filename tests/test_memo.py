@@ -0,0 +1,32 @@
+import pytest
+
+import layout
+import pricing
+from locations import load_location_index, recommend_wood
+
+
+def test_quote_follows_price_changes(monkeypatch):
+    before = pricing.quote("Chair", "**Mango Wood**", False)
+    monkeypatch.setitem(pricing.BASE_PRICES, "Chair", 350)
+    after = pricing.quote("Chair", "**Mango Wood**", False)
+    assert after.total == before.total + 50
+    matrix = pricing.price_matrix()
+    chair, mango = matrix.products.index("Chair"), matrix.woods.index("**Mango Wood**")
+    assert matrix.totals[chair, mango, 0, 0] == after.total
+
+
+def test_layout_follows_footprint_changes(monkeypatch):
+    before = layout.plan_layout(15, 12, "Chair")
+    monkeypatch.setitem(layout.FOOTPRINTS, "Chair", (3, 3))
+    after = layout.plan_layout(15, 12, "Chair")
+    assert before.placements[-1].width * before.placements[-1].length == 4
+    assert after.placements[-1].width * after.placements[-1].length == 9
+
+
+def test_shared_results_are_read_only():
+    price = pricing.quote("Sofa", "**Treated Teak**", True)
+    with pytest.raises((TypeError, AttributeError)):
+        price.items.append(("Extra", 1))
+    _, _, match = recommend_wood(load_location_index(), "Chennai")
+    with pytest.raises(TypeError):
+        match.profile['wood'] = "Pine"
@@ -0,0 +1,65 @@
+import sqlite3
+import uuid
+
+import pytest
+
+from orders import CONFIRMED, FAILED, QUEUED, UNKNOWN, OrderIntake
+
+
+def order(**values):
+    return {'session_id': "s1", 'product': "Sofa", 'wood': "Teak", 'design': None, 'total': 1200,
+            'reclaimed': None, **values}
+
+
+@pytest.fixture
+def intake(tmp_path):
+    intake = OrderIntake(str(tmp_path / "orders.db"), consume=False)
+    yield intake
+    intake.close()
+
+
+def rename_orders(intake, old, new):
+    with sqlite3.connect(intake.path) as conn:
+        conn.execute(f"ALTER TABLE {old} RENAME TO {new}")
+
+
+def test_submitted_order_is_confirmed_once_on_disk(intake):
+    key = uuid.uuid4().hex
+    assert intake.submit(key, order()) == QUEUED
+    assert intake.flush(5)
+    assert intake.status(key) == CONFIRMED
+    assert intake.stats()['committed'] == 1
+
+
+def test_same_key_is_written_once(intake):
+    key = uuid.uuid4().hex
+    intake.submit(key, order())
+    intake.submit(key, order())
+    intake.flush(5)
+    intake.submit(key, order())
+    intake.flush(5)
+    rows = intake._reader().execute("SELECT COUNT(*) FROM orders WHERE order_key = ?", (key,)).fetchone()
+    assert rows == (1,)
+    assert intake.stats()['committed'] == 1
+    assert intake.stats()['duplicates'] == 2
+
+
+def test_order_without_a_total_is_refused(intake):
+    with pytest.raises(ValueError):
+        intake.submit(uuid.uuid4().hex, order(total=None))
+    assert intake.stats()['queued'] == 0
+
+
+def test_failed_batch_is_reported_once_and_can_be_retried(intake):
+    key = uuid.uuid4().hex
+    rename_orders(intake, "orders", "orders_away")
+    intake.submit(key, order())
+    intake.flush(5)
+    assert intake.last_error is not None
+    assert intake.status(key) == FAILED
+    rename_orders(intake, "orders_away", "orders")
+    assert intake.status(key) == UNKNOWN
+
+    intake.submit(key, order())
+    intake.flush(5)
+    assert intake.status(key) == CONFIRMED
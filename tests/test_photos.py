@@ -0,0 +1,44 @@
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from photos import PhotoStore
+
+
+def jpeg(seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (300, 400, 3), dtype=np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "JPEG")
+    return out.getvalue()
+
+
+def files(root):
+    return sorted(name for _, _, names in os.walk(root) for name in names)
+
+
+def test_sweep_removes_old_photos_with_their_variants(tmp_path):
+    store = PhotoStore(str(tmp_path), keep_for=60)
+    try:
+        old, new = store.put(jpeg(1)), store.put(jpeg(2))
+        assert store.thumbnail(old) and store.analysis(new).shape[2] == 3
+        os.utime(store._file("objects", old), (time.time() - 120,) * 2)
+        assert store.sweep() == 1
+        assert not any(name.startswith(old) for name in files(tmp_path))
+        assert store.thumbnail(new) is not None
+        assert store.stats()['removed'] == 1
+    finally:
+        store.close()
+
+
+def test_uploading_again_keeps_a_photo(tmp_path):
+    store = PhotoStore(str(tmp_path), keep_for=60)
+    try:
+        digest = store.put(jpeg(3))
+        os.utime(store._file("objects", digest), (time.time() - 120,) * 2)
+        assert store.put(jpeg(3)) == digest
+        assert store.sweep() == 0
+    finally:
+        store.close()
@@ -0,0 +1,37 @@
+from preview import FrameCache
+
+
+def renderer(rendered):
+    def render(key):
+        def draw():
+            rendered.append(key)
+            return key.encode() * 10
+        return draw
+    return render
+
+
+def test_least_recently_used_frames_go_first_by_size():
+    rendered = []
+    render = renderer(rendered)
+    cache = FrameCache(max_bytes=25)
+    cache.get("a", render("a"))
+    cache.get("b", render("b"))
+    assert cache.get("a", render("a")) == b"a" * 10
+    cache.get("c", render("c"))
+    assert rendered == ["a", "b", "c"]
+
+    # "b" was the least recently used of the three and made room for "c"
+    cache.get("a", render("a"))
+    cache.get("b", render("b"))
+    assert rendered == ["a", "b", "c", "b"]
+    assert cache.stats() == {'frames': 2, 'bytes': 20, 'max_bytes': 25, 'hits': 2, 'misses': 4,
+                             'evictions': 2, 'hit_rate': round(2 / 6, 3)}
+
+
+def test_frame_larger_than_the_cache_is_still_kept_alone():
+    cache = FrameCache(max_bytes=5)
+    cache.get("big", lambda: b"x" * 10)
+    assert cache.stats()['frames'] == 1
+    cache.get("next", lambda: b"y" * 10)
+    assert cache.stats()['frames'] == 1
+    assert cache.get("next", lambda: b"") == b"y" * 10
@@ -0,0 +1,24 @@
+import itertools
+
+import numpy as np
+
+from pricing import BASE_PRICES, OTHER, WOOD_PREMIUM, bulk_quote, codes, price_matrix, quote
+
+# Every priced name, plus one of each the tables do not know
+PRODUCTS = list(BASE_PRICES) + ["Bookshelf"]
+WOODS = list(WOOD_PREMIUM) + ["**Oak**", None]
+
+
+def test_bulk_totals_match_single_quotes():
+    matrix = price_matrix()
+    orders = list(itertools.product(PRODUCTS, WOODS, (False, True)))
+    products, woods, designs = zip(*orders)
+    totals = bulk_quote(codes(products, matrix.products), codes(woods, matrix.woods), np.array(designs))
+    assert totals.tolist() == [quote(product, wood, design).total for product, wood, design in orders]
+
+
+def test_names_outside_the_tables_are_priced_as_other():
+    matrix = price_matrix()
+    other = bulk_quote(codes(["Bookshelf"], matrix.products), codes(["**Oak**"], matrix.woods), False)
+    named = bulk_quote(codes([OTHER], matrix.products), codes([OTHER], matrix.woods), False)
+    assert other.tolist() == named.tolist() == [quote("Bookshelf", "**Oak**", False).total]
@@ -0,0 +1,37 @@
+from cutting import can_cut, cut_list, leftover_boards, recovered_boards, species_of
+from inventory import ReclaimedInventory
+
+CHENNAI = (13.08, 80.27)
+
+
+def stock_from_return(path, product, good_wood, wood, plan=()):
+    # What Step 7-8 puts into stock when `product` comes back
+    inventory = ReclaimedInventory(str(path / "inventory.db"))
+    boards = leftover_boards(recovered_boards(product, good_wood, wood), list(plan))
+    inventory.add(boards, good_wood, *CHENNAI, source="returned")
+    return inventory
+
+
+def test_board_reused_whole_needs_no_kerf():
+    assert can_cut(recovered_boards("Chair", 100), cut_list("Chair"))
+
+
+def test_recovered_stock_fills_an_order(tmp_path):
+    inventory = stock_from_return(tmp_path, "Table", 60, "**Treated Teak**")
+    match = inventory.match("Coffee Table", species_of("**Treated Teak**"), *CHENNAI)
+    assert match is not None
+    assert can_cut(match.boards, cut_list("Coffee Table"))
+
+
+def test_whole_piece_returned_in_full_fills_the_same_order(tmp_path):
+    inventory = stock_from_return(tmp_path, "Chair", 100, "Mango Wood")
+    assert inventory.match("Chair", "Mango Wood", *CHENNAI) is not None
+
+
+def test_released_boards_can_be_matched_again(tmp_path):
+    inventory = stock_from_return(tmp_path, "Table", 60, "Mango Wood")
+    match = inventory.match("Coffee Table", "Mango Wood", *CHENNAI)
+    inventory.take(board.board_id for board in match.boards)
+    assert inventory.match("Coffee Table", "Mango Wood", *CHENNAI) is None
+    inventory.insert(match.boards)
+    assert inventory.match("Coffee Table", "Mango Wood", *CHENNAI) is not None
@@ -0,0 +1,75 @@
+import io
+
+import pytest
+
+from risk import HALF_LIFE_DAYS, SUM_ROW, RiskHistory, RiskTable
+
+CLIMATE = """city,date,humidity,temperature
+Chennai,2024-01-01,80,31
+Chennai,2024-01-02,82,
+Chennai,not a date,80,30
+Delhi,2024-01-01,30,42
+,2024-01-01,50,20
+"""
+
+
+def csv(text):
+    return io.StringIO(text)
+
+
+def pests(*rows):
+    return csv("city,date,pest,count\n" + "".join(f"{row}\n" for row in rows))
+
+
+def test_ingest_appends_columns_and_rejects_bad_rows(tmp_path):
+    history = RiskHistory(str(tmp_path))
+    assert history.ingest_climate(csv(CLIMATE)) == (3, 2)
+    columns = history.columns('climate')
+    assert [history.cities[city] for city in columns['city']] == ["Chennai", "Chennai", "Delhi"]
+    assert list(columns['humidity']) == [80, 82, 30]
+    assert history.ingest_pests(pests("Chennai,2024-01-01,termite,3", "Chennai,2024-01-01,ants")) == (1, 1)
+    assert list(history.columns('pests')['count']) == [3]
+
+
+def test_old_reports_count_for_less(tmp_path):
+    history = RiskHistory(str(tmp_path))
+    history.ingest_pests(pests("Pune,2022-01-01,bed bugs", "Pune,2023-01-01,bed bugs"))
+    table = RiskTable(history)
+    table.refresh()
+    assert table.sums[SUM_ROW['bed_bugs'], 0] == pytest.approx(1 + 2 ** (-365 / HALF_LIFE_DAYS))
+
+    # A newer row ages everything folded in before it
+    history.ingest_pests(pests("Pune,2024-01-01,bed bugs"))
+    table.refresh()
+    assert table.sums[SUM_ROW['bed_bugs'], 0] == pytest.approx(1 + 2 ** (-365 / HALF_LIFE_DAYS)
+                                                               + 2 ** (-730 / HALF_LIFE_DAYS))
+
+
+def test_refresh_folds_in_new_rows_only(tmp_path):
+    history = RiskHistory(str(tmp_path))
+    history.ingest_climate(csv(CLIMATE))
+    table = RiskTable(history)
+    assert table.refresh() == 3
+    assert table.profile("Mumbai") is None
+    assert table.refresh() == 0
+
+    history.ingest_climate(csv("city,date,humidity,temperature\nMumbai,2024-01-02,90,30\n"))
+    assert table.refresh() == 1
+    assert table.profile("mumbai")['scores']['humidity'] == 1.0
+    assert table.profile("Chennai")['as_of'] == "2024-01-02"
+
+
+def test_reopened_history_gives_the_same_profiles(tmp_path):
+    history = RiskHistory(str(tmp_path))
+    history.ingest_climate(csv(CLIMATE))
+    history.ingest_pests(pests("Chennai,2024-01-01,termites,20"))
+    table = RiskTable(history)
+    table.refresh()
+
+    reopened = RiskHistory(str(tmp_path))
+    assert reopened.cities == history.cities
+    again = RiskTable(reopened)
+    assert again.refresh() == 4
+    for city in ("Chennai", "Delhi"):
+        assert again.profile(city) == table.profile(city)
+    assert again.profile("Chennai")['wood'] == "**Treated Teak**"
@@ -0,0 +1,150 @@
+import os
+import pickle
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from session import BACKENDS, AppState, SessionSpill, SessionStore, SqliteSessionBackend
+
+
+def idle_session(spill, **values):
+    state = AppState(session_id=uuid.uuid4().hex, **values)
+    spill.touch(state)
+    spill.spill(state)
+    return state
+
+
+def test_sweep_keeps_spill_files_of_live_sessions(tmp_path):
+    spill = SessionSpill(str(tmp_path), keep_for=0)
+    try:
+        state = idle_session(spill, current_step=5, user_location="Chennai")
+        spill.sweep()
+        spill.touch(state)
+        assert state['current_step'] == 5
+        assert state['user_location'] == "Chennai"
+    finally:
+        spill.close()
+
+
+def test_sweep_removes_spill_files_of_dropped_sessions(tmp_path):
+    spill = SessionSpill(str(tmp_path), keep_for=0)
+    try:
+        idle_session(spill, current_step=5)
+        spill.sweep()
+        assert os.listdir(spill.path) == []
+    finally:
+        spill.close()
+
+
+def test_sweep_leaves_other_workers_spill_files(tmp_path):
+    first, second = SessionSpill(str(tmp_path), keep_for=0), SessionSpill(str(tmp_path), keep_for=0)
+    second.path = os.path.join(str(tmp_path), f"{second.host}-1")
+    os.makedirs(second.path)
+    try:
+        state = idle_session(second, current_step=5)
+        first.sweep()
+        second.touch(state)
+        assert state['current_step'] == 5
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sweep_removes_folders_of_exited_workers(tmp_path):
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True).stdout.strip()
+    spill = SessionSpill(str(tmp_path))
+    try:
+        orphan = os.path.join(str(tmp_path), f"{spill.host}-{exited}")
+        os.makedirs(orphan)
+        spill.sweep()
+        assert not os.path.exists(orphan)
+        assert os.path.isdir(spill.path)
+    finally:
+        spill.close()
+
+
+def test_missing_spill_file_reloads_the_stored_session(tmp_path):
+    store = SessionStore(SqliteSessionBackend(str(tmp_path / "sessions.db")))
+    spill = SessionSpill(str(tmp_path), store=store)
+    try:
+        state = AppState(session_id=uuid.uuid4().hex, current_step=5)
+        store.save(state)
+        spill.touch(state)
+        spill.spill(state)
+        os.remove(state._spilled)
+        spill.touch(state)
+        assert state['current_step'] == 5
+        state['current_step'] = 6
+        store.save(state)
+        assert store.load(state.session_id, fork=False)['current_step'] == 6
+        assert spill.stats()['reloaded'] == 1
+    finally:
+        spill.close()
+        store.close()
+
+
+def test_missing_spill_file_without_a_store_starts_over(tmp_path):
+    spill = SessionSpill(str(tmp_path))
+    try:
+        state = idle_session(spill, current_step=5)
+        os.remove(state._spilled)
+        spill.touch(state)
+        assert state['current_step'] == 1
+        assert state['session_id'] is not None
+    finally:
+        spill.close()
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def store(request, tmp_path):
+    store = SessionStore(BACKENDS[request.param](str(tmp_path / "sessions")))
+    yield store
+    store.close()
+
+
+def test_reload_after_the_tab_went_quiet_keeps_the_id(store):
+    state = AppState(session_id=uuid.uuid4().hex, current_step=3)
+    store.save(state)
+    store.live_for = 0
+    restored = store.load(state.session_id)
+    assert restored.session_id == state.session_id
+    assert restored['current_step'] == 3
+    restored['current_step'] = 4
+    assert store.save(restored) == 1
+
+
+def test_second_tab_on_a_live_session_gets_its_own_id(store):
+    state = AppState(session_id=uuid.uuid4().hex, current_step=3)
+    store.save(state)
+    copy = store.load(state.session_id)
+    assert copy.session_id != state.session_id
+    assert copy['current_step'] == 3
+    copy['current_step'] = 5
+    store.save(copy)
+    assert store.load(state.session_id)['current_step'] == 3
+
+
+def test_concurrent_saves_never_mix_fields(store):
+    state = AppState(session_id=uuid.uuid4().hex, current_step=3)
+    store.save(state)
+    store.live_for = 0
+    first, second = store.load(state.session_id), store.load(state.session_id)
+    first['current_step'] = 4
+    store.save(first)
+    second['user_location'] = "Delhi"
+    store.save(second)
+    assert second.session_id != state.session_id
+    kept = store.load(state.session_id)
+    assert (kept['current_step'], kept['user_location']) == (4, None)
+    forked = store.load(second.session_id)
+    assert (forked['current_step'], forked['user_location']) == (3, "Delhi")
+    assert store.stats()['conflicts'] == 1
+
+
+def test_unpickled_state_can_be_saved(store):
+    state = pickle.loads(pickle.dumps(AppState(session_id=uuid.uuid4().hex, current_step=3)))
+    assert store.save(state) == len(state.keys())
+    assert store.load(state.session_id, fork=False)['current_step'] == 3